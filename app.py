@@ -1,15 +1,387 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import altair as alt
 import sqlite3
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 import calendar
+import csv
+import functools
 import hashlib
+import heapq
+import html
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+
+# Configuration
+DB_PATH = os.environ.get("LEAVE_PLANNER_DB", "leave_planner.db")
+DB_POOL_SIZE = int(os.environ.get("LEAVE_PLANNER_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("LEAVE_PLANNER_DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("LEAVE_PLANNER_DB_BUSY_TIMEOUT_MS", "5000"))
+# "sqlite" (the DB_PATH file) or "postgres" (POSTGRES_DSN, for several app replicas sharing one database)
+STORAGE_BACKEND = os.environ.get("LEAVE_PLANNER_BACKEND", "sqlite")
+POSTGRES_DSN = os.environ.get("LEAVE_PLANNER_POSTGRES_DSN", "dbname=leave_planner")
+READ_CACHE_TTL = float(os.environ.get("LEAVE_PLANNER_READ_CACHE_TTL", "300"))
+READ_CACHE_MAX_ENTRIES = int(os.environ.get("LEAVE_PLANNER_READ_CACHE_MAX_ENTRIES", "256"))
+# How often the read cache checks the shared data version for writes made by other processes
+CHANGE_TOKEN_POLL_SECONDS = float(os.environ.get("LEAVE_PLANNER_CHANGE_TOKEN_POLL_SECONDS", "1"))
+# Share of a department already off above which approving more leave shows a warning
+COVERAGE_WARNING_RATIO = float(os.environ.get("LEAVE_PLANNER_COVERAGE_WARNING_RATIO", "0.2"))
+# Leave types whose approved working days are deducted from the annual balance
+BALANCE_LEAVE_TYPES = tuple(os.environ.get("LEAVE_PLANNER_BALANCE_LEAVE_TYPES", "Annual Leave").split(","))
+MANAGE_REQUESTS_PAGE_SIZE = int(os.environ.get("LEAVE_PLANNER_PAGE_SIZE", "25"))
+PAGE_SIZE_OPTIONS = sorted({10, 25, 50, 100, MANAGE_REQUESTS_PAGE_SIZE})
+# Latency samples kept per instrumented function for the percentile summaries
+METRICS_WINDOW = int(os.environ.get("LEAVE_PLANNER_METRICS_WINDOW", "1000"))
+# When set, span timings are written here in Prometheus text format after every rerun
+METRICS_FILE = os.environ.get("LEAVE_PLANNER_METRICS_FILE", "")
+# Leave ending in the last N calendar years or later is served from the in-memory active-leave snapshot
+ACTIVE_LEAVE_YEARS_BACK = int(os.environ.get("LEAVE_PLANNER_ACTIVE_LEAVE_YEARS_BACK", "1"))
+# How often the snapshot checks the change log for writes made by other processes
+ACTIVE_LEAVE_POLL_SECONDS = float(os.environ.get("LEAVE_PLANNER_ACTIVE_LEAVE_POLL_SECONDS", "2"))
+LEAVE_CHANGES_RETAINED = int(os.environ.get("LEAVE_PLANNER_LEAVE_CHANGES_RETAINED", "10000"))
+# Decided leave ending before 1 January N years ago can be moved into per-year archive tables
+ARCHIVE_AFTER_YEARS = int(os.environ.get("LEAVE_PLANNER_ARCHIVE_AFTER_YEARS", "2"))
+# Search results counted, ranked and paged through; broader searches list their newest matches unranked
+SEARCH_RESULT_LIMIT = int(os.environ.get("LEAVE_PLANNER_SEARCH_RESULT_LIMIT", "1000"))
+# Set to 1 to seed the demo accounts (with well-known passwords) and advertise them on the login page
+SEED_DEMO_DATA = os.environ.get("LEAVE_PLANNER_SEED_DEMO", "0") == "1"
+
+# Connection management
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared by all sessions"""
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -16000")
+        conn.execute("PRAGMA mmap_size = 134217728")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            self._checkouts += 1
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        self._created -= 1
+                        raise
+            if conn is not None:
+                self._in_use += 1
+                self._peak_in_use = max(self._peak_in_use, self._in_use)
+                return conn
+
+        # Pool exhausted: wait for another session to hand a connection back
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        finally:
+            with self._lock:
+                self._waits += 1
+                self._wait_time += time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'pool_size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_seconds': round(self._wait_time, 6),
+            }
+
+@st.cache_resource
+def get_db_pool(db_path=DB_PATH, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+    return ConnectionPool(db_path, size, timeout)
+
+def db_connection():
+    """Borrow a pooled connection for the duration of a with-block"""
+    return get_db_pool(DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT).connection()
+
+def db_pool_stats():
+    return leave_repository().stats()
+
+# Instrumentation
+class SpanRecorder:
+    """Process-wide latency samples per span, plus the spans of the rerun running on each thread"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._calls = {}
+        self._seconds = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start_rerun(self):
+        self._local.spans = []
+        self._local.depth = 0
+
+    def finish_rerun(self):
+        spans = getattr(self._local, 'spans', None) or []
+        self._local.spans = None
+        return spans
+
+    @contextmanager
+    def span(self, name):
+        depth = getattr(self._local, 'depth', 0)
+        # Entries are appended on entry so the rerun trace reads in call order
+        spans = getattr(self._local, 'spans', None)
+        entry = {'span': name, 'depth': depth, 'ms': None}
+        if spans is not None:
+            spans.append(entry)
+        self._local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.depth = depth
+            entry['ms'] = round(elapsed * 1000, 3)
+            self.record(name, elapsed)
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._calls[name] = 0
+                self._seconds[name] = 0.0
+            self._samples[name].append(seconds)
+            self._calls[name] += 1
+            self._seconds[name] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._calls.clear()
+            self._seconds.clear()
+
+    def summary(self):
+        """Calls, p50/p95/max over the sample window and total time per span, slowest total first"""
+        with self._lock:
+            snapshot = {name: (np.array(samples), self._calls[name], self._seconds[name])
+                        for name, samples in self._samples.items()}
+        rows = []
+        for name, (samples, calls, seconds) in snapshot.items():
+            p50, p95 = np.percentile(samples, [50, 95]) * 1000
+            rows.append({'span': name, 'calls': calls, 'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3),
+                         'max_ms': round(samples.max() * 1000, 3), 'total_seconds': round(seconds, 6)})
+        summary = pd.DataFrame(rows, columns=['span', 'calls', 'p50_ms', 'p95_ms', 'max_ms', 'total_seconds'])
+        return summary.sort_values('total_seconds', ascending=False, ignore_index=True)
+
+    def prometheus(self):
+        """Span latencies as a Prometheus summary in the text exposition format"""
+        lines = ["# HELP leave_planner_span_seconds Time spent in instrumented functions and views",
+                 "# TYPE leave_planner_span_seconds summary"]
+        for row in self.summary().itertuples(index=False):
+            label = row.span.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'leave_planner_span_seconds{{span="{label}",quantile="0.5"}} {row.p50_ms / 1000:.6f}')
+            lines.append(f'leave_planner_span_seconds{{span="{label}",quantile="0.95"}} {row.p95_ms / 1000:.6f}')
+            lines.append(f'leave_planner_span_seconds_sum{{span="{label}"}} {row.total_seconds:.6f}')
+            lines.append(f'leave_planner_span_seconds_count{{span="{label}"}} {row.calls}')
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource
+def get_span_recorder(window=METRICS_WINDOW):
+    return SpanRecorder(window)
+
+# Resolved once per script run: a cache_resource lookup costs more than the span it would time
+@functools.lru_cache(maxsize=None)
+def span_recorder():
+    return get_span_recorder(METRICS_WINDOW)
+
+def timed_span(name):
+    """Time a with-block under the given span name"""
+    return span_recorder().span(name)
+
+def timed(func):
+    """Record every call of a function as a span named after it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed_span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def write_metrics_file(path=None):
+    """Replace the metrics file with the current Prometheus text dump"""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as handle:
+        handle.write(span_recorder().prometheus())
+    os.replace(handle.name, path)
+
+@contextmanager
+def rerun_spans():
+    """Collect the spans of one script run into session state and refresh the metrics file"""
+    recorder = span_recorder()
+    recorder.start_rerun()
+    try:
+        with recorder.span("rerun"):
+            yield
+    finally:
+        st.session_state.last_rerun_spans = recorder.finish_rerun()
+        write_metrics_file()
+
+# Read cache
+class ReadCache:
+    """Process-wide LRU/TTL cache of query results, invalidated by a data-version counter"""
+
+    def __init__(self, max_entries=READ_CACHE_MAX_ENTRIES, ttl=READ_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data_version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._token = None
+
+    def get(self, key):
+        """Return (found, value) for a key, dropping it if it has outlived the TTL"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[1]
+
+    def put(self, key, value, data_version):
+        with self._lock:
+            # A write committed while the query was running, so the result may already be stale
+            if data_version != self.data_version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def sync(self, token):
+        """Drop every entry when another process reports a different data version token"""
+        with self._lock:
+            if token == self._token:
+                return
+            self._token = token
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self.data_version += 1
+            self._entries.clear()
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'data_version': self.data_version,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
+
+@st.cache_resource
+def get_read_cache(db_path, max_entries=READ_CACHE_MAX_ENTRIES, ttl=READ_CACHE_TTL):
+    return ReadCache(max_entries, ttl)
+
+def _read_cache():
+    return get_read_cache(DB_PATH, READ_CACHE_MAX_ENTRIES, READ_CACHE_TTL)
+
+def cached_read(func):
+    """Serve repeated reads from the shared cache until a write in any process bumps the data version; calls are timed"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = _read_cache()
+        cache.sync(leave_repository().change_token())
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        with timed_span(func.__name__):
+            found, value = cache.get(key)
+            if not found:
+                data_version = cache.data_version
+                value = func(*args, **kwargs)
+                cache.put(key, value, data_version)
+            # Callers are free to mutate what they get back
+            return value.copy() if isinstance(value, pd.DataFrame) else value
+    return wrapper
+
+def invalidate_read_cache():
+    _read_cache().invalidate()
+
+def read_cache_stats():
+    return _read_cache().stats()
 
 # Database setup
-def init_db():
-    conn = sqlite3.connect('leave_planner.db')
-    c = conn.cursor()
-    
+def _migration_initial_schema(c):
     # Users table
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -38,194 +410,2735 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
+
+def _migration_leave_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_user_dates ON leave_requests (user_id, start_date, end_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_dates ON leave_requests (start_date, end_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_status ON leave_requests (status, request_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_department_role ON users (department, role)")
     
-    # Create default admin user
-    admin_password = hashlib.md5("admin123".encode()).hexdigest()
-    c.execute("INSERT OR IGNORE INTO users (username, password, full_name, role, department) VALUES (?, ?, ?, ?, ?)",
-              ("admin", admin_password, "System Administrator", "admin", "IT"))
-    
-    # Create sample users
-    sample_users = [
-        ("ahmed.ali", hashlib.md5("password123".encode()).hexdigest(), "Ahmed Ali", "employee", "HR"),
-        ("sara.hassan", hashlib.md5("password123".encode()).hexdigest(), "Sara Hassan", "employee", "Finance"),
-        ("omar.khalil", hashlib.md5("password123".encode()).hexdigest(), "Omar Khalil", "manager", "Operations"),
-        ("fatima.noor", hashlib.md5("password123".encode()).hexdigest(), "Fatima Noor", "employee", "Marketing"),
-        ("mohammed.salem", hashlib.md5("password123".encode()).hexdigest(), "Mohammed Salem", "employee", "IT"),
-        ("layla.ahmed", hashlib.md5("password123".encode()).hexdigest(), "Layla Ahmed", "employee", "Sales")
+    # Month buckets: one row per calendar month touched by each request
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leave_request_months (
+            month INTEGER,
+            request_id INTEGER,
+            PRIMARY KEY (month, request_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_request_months_request ON leave_request_months (request_id)")
+    rebuild_leave_month_buckets(c)
+
+def _migration_request_date_index(c):
+    # The implicit rowid suffix makes this a (request_date, id) index for keyset paging
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_request_date ON leave_requests (request_date)")
+
+def _migration_leave_coverage(c):
+    # Headcount off per department, day and status, maintained incrementally by the write paths
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leave_coverage (
+            department TEXT,
+            day TEXT,
+            status TEXT,
+            headcount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department, day, status)
+        ) WITHOUT ROWID
+    ''')
+    rebuild_leave_coverage(c)
+
+def _migration_leave_ledger(c):
+    # Debits/credits of working days per request, and the running total they add up to
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leave_ledger (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            request_id INTEGER,
+            year INTEGER,
+            days INTEGER,
+            entry_type TEXT,
+            posted_at TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_ledger_user_year ON leave_ledger (user_id, year)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leave_balances (
+            user_id INTEGER,
+            year INTEGER,
+            used_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, year)
+        ) WITHOUT ROWID
+    ''')
+    query = "SELECT id, user_id, start_date, end_date, leave_type FROM leave_requests WHERE status = 'approved'"
+    for chunk in pd.read_sql_query(query, c.connection, chunksize=50000):
+        post_leave_debits(c, chunk)
+
+def _migration_recount_holiday_balances(c):
+    # Years outside 2024-2025 counted every holiday as a working day before the holiday calendar
+    _reconcile_leave_balances(c)
+
+def _migration_leave_day_ordinals(c):
+    # Integer day numbers beside the ISO dates, so range checks compare integers and date maths skips parsing
+    for column in LEAVE_DAY_COLUMNS.values():
+        c.execute(f"ALTER TABLE leave_requests ADD COLUMN {column} INTEGER")
+    assignments = ", ".join(f"{day} = {_day_ordinal_sql(text)}" for text, day in LEAVE_DAY_COLUMNS.items())
+    c.execute(f"UPDATE leave_requests SET {assignments}")
+    
+    # Writers that already supply matching day numbers skip the extra UPDATE
+    stale = " OR ".join(f"NEW.{day} IS NOT {_day_ordinal_sql('NEW.' + text)}" for text, day in LEAVE_DAY_COLUMNS.items())
+    for event in ("INSERT", "UPDATE OF start_date, end_date, request_date"):
+        name = "trg_leave_requests_days_" + event.split()[0].lower()
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON leave_requests
+            WHEN {stale}
+            BEGIN
+                UPDATE leave_requests SET {assignments} WHERE id = NEW.id;
+            END
+        """)
+    
+    # Integer indexes replace the text ones; the rowid suffix keeps (request_day, id) keyset paging indexed
+    for name in ("idx_leave_requests_user_dates", "idx_leave_requests_dates", "idx_leave_requests_status",
+                 "idx_leave_requests_request_date"):
+        c.execute(f"DROP INDEX IF EXISTS {name}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_user_days ON leave_requests (user_id, start_day, end_day)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_days ON leave_requests (start_day, end_day)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_status_day ON leave_requests (status, request_day)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_requests_request_day ON leave_requests (request_day)")
+
+# Columns whose changes the active-leave snapshot has to replay
+LEAVE_CHANGE_COLUMNS = ('user_id', 'start_date', 'end_date', 'leave_type', 'reason', 'status', 'request_date',
+                        'approved_by')
+
+def _migration_leave_changes(c):
+    # Monotonic change feed for the active-leave snapshot; AUTOINCREMENT never reuses a pruned seq
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS leave_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL
+        )
+    """)
+    for event, row in (("INSERT", "NEW"), (f"UPDATE OF {', '.join(LEAVE_CHANGE_COLUMNS)}", "NEW"), ("DELETE", "OLD")):
+        name = "trg_leave_changes_" + event.split()[0].lower()
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON leave_requests
+            BEGIN
+                INSERT INTO leave_changes (request_id) VALUES ({row}.id);
+            END
+        """)
+
+def _migration_leave_search(c):
+    # Full-text index over who, why and what; each row's rowid is its leave request id
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS leave_search USING fts5(
+            full_name, reason, leave_type,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    c.execute("""
+        INSERT INTO leave_search (rowid, full_name, reason, leave_type)
+        SELECT lr.id, u.full_name, lr.reason, lr.leave_type
+        FROM leave_requests lr
+        LEFT JOIN users u ON lr.user_id = u.id
+    """)
+    
+    index_row = """
+        INSERT INTO leave_search (rowid, full_name, reason, leave_type)
+        VALUES (NEW.id, (SELECT full_name FROM users WHERE id = NEW.user_id), NEW.reason, NEW.leave_type);
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_search_insert AFTER INSERT ON leave_requests
+        BEGIN {index_row} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_search_update AFTER UPDATE OF user_id, reason, leave_type ON leave_requests
+        BEGIN
+            DELETE FROM leave_search WHERE rowid = OLD.id;
+            {index_row}
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_search_delete AFTER DELETE ON leave_requests
+        BEGIN
+            DELETE FROM leave_search WHERE rowid = OLD.id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_search_rename AFTER UPDATE OF full_name ON users
+        BEGIN
+            UPDATE leave_search SET full_name = NEW.full_name
+            WHERE rowid IN (SELECT id FROM leave_requests WHERE user_id = NEW.id);
+        END
+    """)
+
+def _migration_leave_rollups(c):
+    # When a request was approved or rejected, for decision latency; archives keep the leave_requests columns
+    for table in leave_history_tables(c):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN decided_date TEXT")
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS leave_rollups (
+            month INTEGER,
+            department TEXT,
+            leave_type TEXT,
+            status TEXT,
+            {', '.join(f'{measure} INTEGER NOT NULL DEFAULT 0' for measure in LEAVE_ROLLUP_MEASURES)},
+            PRIMARY KEY (month, department, leave_type, status)
+        ) WITHOUT ROWID
+    """)
+    rebuild_leave_rollups_table(c)
+
+def _migration_prune_leave_coverage(c):
+    # Earlier releases kept a row at zero once the last person's leave on a day moved status
+    c.execute("DELETE FROM leave_coverage WHERE headcount = 0")
+
+def _migration_prune_leave_rollups(c):
+    c.execute(f"DELETE FROM leave_rollups WHERE {EMPTY_LEAVE_ROLLUP}")
+
+def _migration_data_version(c):
+    # Bumped by every write so other processes can tell when their read cache is stale
+    c.execute("CREATE TABLE IF NOT EXISTS leave_planner_meta (id INTEGER PRIMARY KEY CHECK (id = 1), data_version INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO leave_planner_meta (id, data_version) VALUES (1, 0)")
+
+def bump_data_version(c):
+    """Mark the write transaction on cursor c as changing data other processes may have cached"""
+    c.execute("UPDATE leave_planner_meta SET data_version = data_version + 1 WHERE id = 1")
+
+# Versioned schema migrations, applied in order and recorded in schema_version
+MIGRATIONS = [
+    (1, "Create users and leave_requests tables", _migration_initial_schema),
+    (2, "Index leave_requests and add month buckets", _migration_leave_indexes),
+    (3, "Index leave_requests by request date for paging", _migration_request_date_index),
+    (4, "Add per-department daily coverage aggregate", _migration_leave_coverage),
+    (5, "Add leave balance ledger", _migration_leave_ledger),
+    (6, "Recount leave balances with multi-year holidays", _migration_recount_holiday_balances),
+    (7, "Add integer day-number columns to leave_requests", _migration_leave_day_ordinals),
+    (8, "Add leave change log", _migration_leave_changes),
+    (9, "Add full-text search over leave requests", _migration_leave_search),
+    (10, "Add decision dates and monthly leave rollups", _migration_leave_rollups),
+    (11, "Drop zero-headcount coverage rows", _migration_prune_leave_coverage),
+    (12, "Drop empty monthly rollup rows", _migration_prune_leave_rollups),
+    (13, "Add data version counter for cross-process cache invalidation", _migration_data_version),
+]
+
+def get_schema_version(c):
+    c.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)")
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return c.fetchone()[0]
+
+def apply_migrations(conn):
+    c = conn.cursor()
+    current_version = get_schema_version(c)
+    if current_version >= MIGRATIONS[-1][0]:
+        return current_version
+    
+    # Take the write lock up front so concurrent processes migrate one at a time
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        current_version = get_schema_version(c)
+        for version, description, migrate in MIGRATIONS:
+            if version > current_version:
+                migrate(c)
+                c.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                          (version, description, datetime.now().isoformat(timespec="seconds")))
+                current_version = version
+        bump_data_version(c)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return current_version
+
+def demo_users():
+    """Demo accounts as (username, hashed password, full name, role, department) rows"""
+    admin_password = hash_password("admin123")
+    sample_password = hash_password("password123")
+    return [
+        ("admin", admin_password, "System Administrator", "admin", "IT"),
+        ("ahmed.ali", sample_password, "Ahmed Ali", "employee", "HR"),
+        ("sara.hassan", sample_password, "Sara Hassan", "employee", "Finance"),
+        ("omar.khalil", sample_password, "Omar Khalil", "manager", "Operations"),
+        ("fatima.noor", sample_password, "Fatima Noor", "employee", "Marketing"),
+        ("mohammed.salem", sample_password, "Mohammed Salem", "employee", "IT"),
+        ("layla.ahmed", sample_password, "Layla Ahmed", "employee", "Sales")
     ]
+
+# (user_id, start, end, leave type, reason, status, request date, approved by)
+DEMO_LEAVE_REQUESTS = [
+    (2, "2024-10-15", "2024-10-17", "Annual Leave", "Family vacation", "approved", "2024-10-01", "admin"),
+    (3, "2024-11-10", "2024-11-12", "Annual Leave", "Personal matters", "pending", "2024-10-25", ""),
+    (4, "2024-11-05", "2024-11-07", "Sick Leave", "Medical appointment", "approved", "2024-10-28", "admin"),
+    (2, "2024-12-20", "2024-12-22", "Annual Leave", "Wedding", "pending", "2024-11-01", ""),
+    (5, "2024-11-15", "2024-11-16", "Annual Leave", "Personal", "approved", "2024-11-01", "admin"),
+    (6, "2024-12-01", "2024-12-03", "Annual Leave", "Holiday", "pending", "2024-11-15", "")
+]
+
+def seed_demo_data(conn):
+    c = conn.cursor()
+    
+    # Create the default admin and sample users
+    c.executemany("INSERT OR IGNORE INTO users (username, password, full_name, role, department) VALUES (?, ?, ?, ?, ?)", demo_users())
+    
+    # Add sample leave requests, only into an empty table so restarts don't duplicate them
+    c.execute("SELECT EXISTS (SELECT 1 FROM leave_requests)")
+    if not c.fetchone()[0]:
+        c.executemany("INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, status, request_date, approved_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", DEMO_LEAVE_REQUESTS)
+        rebuild_derived_tables(c)
+    
+    bump_data_version(c)
+    conn.commit()
+
+@st.cache_resource
+def bootstrap_db(db_path, seed_demo):
+    """Migrate (and optionally seed) a database file once per process"""
+    with get_db_pool(db_path, DB_POOL_SIZE, DB_POOL_TIMEOUT).connection() as conn:
+        version = apply_migrations(conn)
+        if seed_demo:
+            seed_demo_data(conn)
+    get_read_cache(db_path, READ_CACHE_MAX_ENTRIES, READ_CACHE_TTL).invalidate()
+    return version
+
+@timed
+def init_db():
+    return leave_repository().bootstrap(SEED_DEMO_DATA)
+
+# Day numbers
+# leave_requests stores date.toordinal() beside each ISO date column
+LEAVE_DAY_COLUMNS = {'start_date': 'start_day', 'end_date': 'end_day', 'request_date': 'request_day'}
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Calendar reads carry day numbers only; ISO dates are formatted when a view displays them
+CALENDAR_LEAVE_COLUMNS = "lr.id, lr.user_id, lr.leave_type, lr.reason, lr.status, lr.start_day, lr.end_day"
+
+def _day_ordinal_sql(column):
+    # julianday('0001-01-01') is 1721425.5, which date.toordinal() numbers as day 1
+    return f"CAST(julianday({column}) - 1721424.5 AS INTEGER)"
+
+def day_ordinal(day):
+    """date.toordinal() of a date or an ISO date string"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day.toordinal()
+
+def ordinals_to_days(ordinals):
+    return (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+
+def format_leave_days(ordinals):
+    return np.datetime_as_string(ordinals_to_days(ordinals), unit='D')
+
+def leave_days(requests, column):
+    """datetime64[D] values of a leave date column, taken from its day-number twin when the frame has one"""
+    day_column = LEAVE_DAY_COLUMNS[column]
+    if day_column in requests:
+        return ordinals_to_days(requests[day_column].to_numpy(dtype=np.int64))
+    return np.asarray(requests[column], dtype='datetime64[D]')
+
+# Month buckets for date-range lookups
+def month_key(day):
+    return day.year * 12 + day.month - 1
+
+def _month_bucket_rows(requests):
+    if not requests:
+        return []
+    request_ids, start_dates, end_dates = zip(*requests)
+    # datetime64[M] counts months from 1970-01, month_key counts them from year 0
+    first = np.asarray(start_dates, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    last = np.asarray(end_dates, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    rows, months = expand_intervals(first, last)
+    return list(zip(months.tolist(), np.asarray(request_ids)[rows].tolist()))
+
+def sync_leave_month_buckets(c, request_ids):
+    """Re-bucket the given requests after an insert or a date change"""
+    request_ids = list(request_ids)
+    c.executemany("DELETE FROM leave_request_months WHERE request_id = ?", [(rid,) for rid in request_ids])
+    placeholders = ",".join("?" * len(request_ids))
+    c.execute(f"SELECT id, start_date, end_date FROM leave_requests WHERE id IN ({placeholders})", request_ids)
+    c.executemany("INSERT OR IGNORE INTO leave_request_months (month, request_id) VALUES (?, ?)",
+                  _month_bucket_rows(c.fetchall()))
+
+def rebuild_leave_month_buckets(c):
+    c.execute("DELETE FROM leave_request_months")
+    c.execute("SELECT id, start_date, end_date FROM leave_requests")
+    while True:
+        batch = c.fetchmany(50000)
+        if not batch:
+            break
+        c.connection.executemany("INSERT OR IGNORE INTO leave_request_months (month, request_id) VALUES (?, ?)",
+                                 _month_bucket_rows(batch))
+
+# Daily staffing coverage per department
+def expand_intervals(starts, ends):
+    """Expand inclusive [start, end] integer intervals into parallel (interval index, day) arrays"""
+    lengths = np.clip(ends - starts + 1, 0, None)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    days = np.repeat(starts, lengths) + np.arange(rows.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, days
+
+def _coverage_deltas(requests, delta):
+    """Per (department, day, status) headcount changes for a frame of start_date/end_date/department/status rows"""
+    if requests.empty:
+        return []
+    starts = leave_days(requests, 'start_date').astype(np.int64)
+    ends = leave_days(requests, 'end_date').astype(np.int64)
+    rows, days = expand_intervals(starts, ends)
+    expanded = pd.DataFrame({
+        'department': requests['department'].to_numpy()[rows],
+        'day': days,
+        'status': requests['status'].to_numpy()[rows]
+    })
+    counts = expanded.groupby(['department', 'day', 'status'], dropna=False).size().reset_index(name='headcount')
+    day_strings = np.datetime_as_string(counts['day'].to_numpy().astype('datetime64[D]'), unit='D')
+    return list(zip(counts['department'].tolist(), day_strings.tolist(), counts['status'].tolist(),
+                    (counts['headcount'] * delta).tolist()))
+
+def adjust_leave_coverage(c, requests, delta):
+    """Add (delta=1) or remove (delta=-1) the requests' days from the coverage aggregate"""
+    deltas = _coverage_deltas(requests, delta)
+    c.executemany('''
+        INSERT INTO leave_coverage (department, day, status, headcount) VALUES (?, ?, ?, ?)
+        ON CONFLICT (department, day, status) DO UPDATE SET headcount = headcount + excluded.headcount
+    ''', deltas)
+    if delta < 0:
+        # Days nobody is off any more are dropped, so the table holds what a rebuild would
+        c.executemany("DELETE FROM leave_coverage WHERE department = ? AND day = ? AND status = ? AND headcount = 0",
+                      [(department, day, status) for department, day, status, _ in deltas])
+
+def rebuild_leave_coverage(c):
+    c.execute("DELETE FROM leave_coverage")
+    query, params = union_leave_tables("""
+    SELECT lr.start_date, lr.end_date, u.department, lr.status
+    FROM {table} lr
+    JOIN users u ON lr.user_id = u.id
+    """, (), leave_history_tables(c))
+    for chunk in pd.read_sql_query(query, c.connection, params=params, chunksize=50000):
+        adjust_leave_coverage(c, chunk, 1)
+
+# Leave balance ledger
+def _ledger_postings(requests):
+    """Working days per (user, year) for the balance-bearing requests in a frame, split at year boundaries"""
+    requests = requests[requests['leave_type'].isin(BALANCE_LEAVE_TYPES)]
+    if requests.empty:
+        return pd.DataFrame(columns=['user_id', 'request_id', 'year', 'days'])
+    starts = leave_days(requests, 'start_date')
+    ends = leave_days(requests, 'end_date')
+    rows, years = expand_intervals(starts.astype('datetime64[Y]').astype(np.int64),
+                                   ends.astype('datetime64[Y]').astype(np.int64))
+    year_starts = years.astype('datetime64[Y]').astype('datetime64[D]')
+    year_ends = (years + 1).astype('datetime64[Y]').astype('datetime64[D]') - 1
+    days = calculate_working_days_many(np.maximum(starts[rows], year_starts), np.minimum(ends[rows], year_ends))
+    return pd.DataFrame({
+        'user_id': requests['user_id'].to_numpy()[rows],
+        'request_id': requests['id'].to_numpy()[rows],
+        'year': years + 1970,
+        'days': days
+    })
+
+def _post_ledger_entries(c, entries, entry_type, placeholder="?"):
+    """Append ledger entries and fold them into the per-user, per-year running totals"""
+    entries = entries[entries['days'] != 0]
+    if entries.empty:
+        return
+    posted_at = datetime.now().isoformat(timespec="seconds")
+    values = ", ".join([placeholder] * 6)
+    c.executemany(f"INSERT INTO leave_ledger (user_id, request_id, year, days, entry_type, posted_at) VALUES ({values})",
+                  [(int(user_id), None if pd.isna(request_id) else int(request_id), int(year), int(days), entry_type, posted_at)
+                   for user_id, request_id, year, days in entries[['user_id', 'request_id', 'year', 'days']].itertuples(index=False)])
+    totals = entries.groupby(['user_id', 'year'])['days'].sum()
+    c.executemany(f'''
+        INSERT INTO leave_balances (user_id, year, used_days) VALUES ({placeholder}, {placeholder}, {placeholder})
+        ON CONFLICT (user_id, year) DO UPDATE SET used_days = leave_balances.used_days + excluded.used_days
+    ''', [(int(user_id), int(year), int(days)) for (user_id, year), days in totals.items()])
+
+def post_leave_debits(c, requests, placeholder="?"):
+    _post_ledger_entries(c, _ledger_postings(requests), 'debit', placeholder)
+
+def post_leave_credits(c, requests, placeholder="?"):
+    postings = _ledger_postings(requests)
+    _post_ledger_entries(c, postings.assign(days=-postings['days']), 'credit', placeholder)
+
+def _reconcile_leave_balances(c):
+    expected = []
+    query, params = union_leave_tables(
+        "SELECT id, user_id, start_date, end_date, leave_type FROM {table} WHERE status = 'approved'", (),
+        leave_history_tables(c))
+    for chunk in pd.read_sql_query(query, c.connection, params=params, chunksize=50000):
+        expected.append(_ledger_postings(chunk).groupby(['user_id', 'year'])['days'].sum())
+    expected = pd.concat(expected).groupby(level=[0, 1]).sum() if expected else pd.Series(dtype=np.int64)
+    
+    recorded = pd.read_sql_query("SELECT user_id, year, used_days FROM leave_balances", c.connection)
+    recorded = recorded.set_index(['user_id', 'year'])['used_days']
+    
+    # Post the difference as adjustments so the ledger always sums to the running totals
+    difference = expected.sub(recorded, fill_value=0)
+    difference = difference[difference != 0]
+    adjustments = difference.rename('days').reset_index()
+    adjustments.columns = ['user_id', 'year', 'days']
+    adjustments['request_id'] = None
+    _post_ledger_entries(c, adjustments, 'adjustment')
+    return len(adjustments)
+
+def reconcile_leave_balances():
+    """Rebuild the running totals from approved request history; returns the number of totals corrected"""
+    require_sqlite_backend("Balance reconciliation")
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            corrected = _reconcile_leave_balances(c)
+            bump_data_version(c)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    invalidate_read_cache()
+    return corrected
+
+# Monthly leave rollups
+# Per month, department, leave type and status: the requests overlapping the month, those starting in it, their
+# calendar and working days inside it, and the requests decided in it with their total days from submission
+LEAVE_ROLLUP_KEYS = ['month', 'department', 'leave_type', 'status']
+LEAVE_ROLLUP_MEASURES = ['requests', 'started', 'calendar_days', 'working_days', 'decisions', 'decision_days']
+# Rows with every measure at zero are deleted, so the table holds exactly what a rebuild would
+EMPTY_LEAVE_ROLLUP = " AND ".join(f"{measure} = 0" for measure in LEAVE_ROLLUP_MEASURES)
+
+def leave_rollup_frame(requests):
+    """Rollup rows (LEAVE_ROLLUP_KEYS and measures) for a frame of requests with their department"""
+    parts = []
+    if not requests.empty:
+        starts = leave_days(requests, 'start_date')
+        ends = leave_days(requests, 'end_date')
+        first_months = starts.astype('datetime64[M]').astype(np.int64)
+        rows, months = expand_intervals(first_months, ends.astype('datetime64[M]').astype(np.int64))
+        month_starts = months.astype('datetime64[M]').astype('datetime64[D]')
+        month_ends = (months + 1).astype('datetime64[M]').astype('datetime64[D]') - 1
+        clipped_starts = np.maximum(starts[rows], month_starts)
+        clipped_ends = np.minimum(ends[rows], month_ends)
+        parts.append(pd.DataFrame({
+            'month': months + 1970 * 12,
+            'department': requests['department'].to_numpy()[rows],
+            'leave_type': requests['leave_type'].to_numpy()[rows],
+            'status': requests['status'].to_numpy()[rows],
+            'requests': 1,
+            'started': (months == first_months[rows]).astype(np.int64),
+            'calendar_days': (clipped_ends - clipped_starts).astype(np.int64) + 1,
+            'working_days': calculate_working_days_many(clipped_starts, clipped_ends),
+        }))
+    
+    if 'decided_date' in requests:
+        decided = requests[requests['decided_date'].notna() & requests['status'].isin(DECIDED_LEAVE_STATUSES)]
+        if not decided.empty:
+            decided_days = np.asarray(decided['decided_date'], dtype='datetime64[D]')
+            parts.append(pd.DataFrame({
+                'month': decided_days.astype('datetime64[M]').astype(np.int64) + 1970 * 12,
+                'department': decided['department'].to_numpy(),
+                'leave_type': decided['leave_type'].to_numpy(),
+                'status': decided['status'].to_numpy(),
+                'decisions': 1,
+                'decision_days': (decided_days - leave_days(decided, 'request_date')).astype(np.int64),
+            }))
+    
+    if not parts:
+        return pd.DataFrame(columns=LEAVE_ROLLUP_KEYS + LEAVE_ROLLUP_MEASURES)
+    frame = pd.concat(parts, ignore_index=True)
+    frame[LEAVE_ROLLUP_MEASURES] = frame.reindex(columns=LEAVE_ROLLUP_MEASURES).fillna(0).astype(np.int64)
+    return frame.groupby(LEAVE_ROLLUP_KEYS, dropna=False, as_index=False)[LEAVE_ROLLUP_MEASURES].sum()
+
+def adjust_leave_rollups(c, requests, delta, placeholder="?"):
+    """Add (delta=1) or remove (delta=-1) the requests from the monthly rollups"""
+    rollups = leave_rollup_frame(requests)
+    if rollups.empty:
+        return
+    columns = LEAVE_ROLLUP_KEYS + LEAVE_ROLLUP_MEASURES
+    updates = ", ".join(f"{measure} = leave_rollups.{measure} + excluded.{measure}" for measure in LEAVE_ROLLUP_MEASURES)
+    values = [rollups[key].tolist() for key in LEAVE_ROLLUP_KEYS]
+    values += [(rollups[measure] * delta).tolist() for measure in LEAVE_ROLLUP_MEASURES]
+    c.executemany(f"""
+        INSERT INTO leave_rollups ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})
+        ON CONFLICT ({', '.join(LEAVE_ROLLUP_KEYS)}) DO UPDATE SET {updates}
+    """, list(zip(*values)))
+    if delta < 0:
+        keys = " AND ".join(f"{key} = {placeholder}" for key in LEAVE_ROLLUP_KEYS)
+        c.executemany(f"DELETE FROM leave_rollups WHERE {keys} AND {EMPTY_LEAVE_ROLLUP}",
+                      list(zip(*values[:len(LEAVE_ROLLUP_KEYS)])))
+
+def rollup_request_counts(rollups, first_month, by):
+    """Requests overlapping the rolled-up months: those overlapping the first month plus those starting later"""
+    counts = np.where(rollups['month'] == first_month, rollups['requests'], rollups['started'])
+    return rollups.assign(count=counts).groupby(by)['count'].sum()
+
+def rebuild_leave_rollups_table(c):
+    c.execute("DELETE FROM leave_rollups")
+    query, params = union_leave_tables("""
+    SELECT lr.start_date, lr.end_date, lr.start_day, lr.end_day, lr.request_date, lr.request_day, lr.decided_date,
+           lr.leave_type, lr.status, u.department
+    FROM {table} lr
+    JOIN users u ON lr.user_id = u.id
+    """, (), leave_history_tables(c))
+    for chunk in pd.read_sql_query(query, c.connection, params=params, chunksize=50000):
+        adjust_leave_rollups(c, chunk, 1)
+
+def rebuild_derived_tables(c):
+    """Recompute every table derived from leave_requests after a bulk load"""
+    rebuild_leave_month_buckets(c)
+    rebuild_leave_coverage(c)
+    _reconcile_leave_balances(c)
+    rebuild_leave_rollups_table(c)
+
+def hash_password(password):
+    return hashlib.md5(password.encode()).hexdigest()
+
+@timed
+def authenticate_user(username, password):
+    return leave_repository().authenticate(username, hash_password(password))
+
+@cached_read
+def get_user_leave_requests(user_id, include_history=False):
+    """The user's requests, newest first; include_history adds the archived ones"""
+    return leave_repository().user_leave_requests(user_id, include_history)
+
+@cached_read
+def get_all_leave_requests(include_history=False):
+    return leave_repository().all_leave_requests(include_history)
+
+def _leave_request_filters(status=None, department=None, placeholder="?"):
+    clauses, params = [], []
+    if status:
+        clauses.append(f"lr.status = {placeholder}")
+        params.append(status)
+    if department:
+        clauses.append(f"u.department = {placeholder}")
+        params.append(department)
+    return clauses, params
+
+@cached_read
+def count_leave_requests(status=None, department=None, include_history=False):
+    return leave_repository().count_leave_requests(status, department, include_history)
+
+@cached_read
+def get_leave_requests_page(status=None, department=None, page_size=25, after=None, include_history=False):
+    """One page of requests, newest first, continuing after a (request_date, id) keyset cursor"""
+    return leave_repository().leave_requests_page(status, department, page_size, after, include_history)
+
+@cached_read
+def get_departments():
+    return leave_repository().departments()
+
+@cached_read
+def get_leave_years():
+    """First and last year any leave starts in (both indexed lookups), or None when there is no leave"""
+    return leave_repository().leave_years()
+
+@cached_read
+def get_max_concurrent_absences(department, start_date, end_date, statuses=('approved',)):
+    """Peak headcount off in a department on any single day of the range, as (count, day)"""
+    return leave_repository().max_concurrent_absences(department, start_date, end_date, tuple(statuses))
+
+@cached_read
+def get_leave_balance(user_id, year):
+    """Entitlement, approved working days used and remaining balance for one user and year"""
+    entitlement, used = leave_repository().leave_balance(user_id, year)
+    return {'entitlement': entitlement, 'used': used, 'remaining': entitlement - used}
+
+@cached_read
+def get_department_headcount(department):
+    return leave_repository().department_headcount(department)
+
+@cached_read
+def get_team_leave_requests(manager_department, include_history=False):
+    return leave_repository().team_leave_requests(manager_department, include_history)
+
+@cached_read
+def get_leave_rollups(first_month, last_month):
+    """Monthly rollup rows for month_key values first_month through last_month"""
+    return leave_repository().leave_rollups(first_month, last_month)
+
+@timed
+def rebuild_leave_rollups():
+    """Recompute the monthly rollups from the whole leave history; returns the number of rollup rows"""
+    count = leave_repository().rebuild_leave_rollups()
+    invalidate_read_cache()
+    return count
+
+# Requests in these statuses block overlapping submissions
+ACTIVE_LEAVE_STATUSES = ('pending', 'approved')
+
+class LeaveConflictError(Exception):
+    """Raised when a new request overlaps the user's existing pending or approved leave"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"Leave overlaps {len(conflicts)} existing request(s)")
+
+def _select_leave_conflicts(c, user_id, overlap, params, columns="id, start_date, end_date", placeholder="?"):
+    """The user's pending or approved requests passing a backend's overlap test, as dicts in start order"""
+    statuses = ",".join([placeholder] * len(ACTIVE_LEAVE_STATUSES))
+    c.execute(f"""
+        SELECT {columns}, leave_type, status
+        FROM leave_requests
+        WHERE user_id = {placeholder} AND {overlap} AND status IN ({statuses})
+        ORDER BY start_date, id
+    """, (user_id, *params, *ACTIVE_LEAVE_STATUSES))
+    columns = [column[0] for column in c.description]
+    return [dict(zip(columns, row)) for row in c.fetchall()]
+
+def _find_leave_conflicts(c, user_id, start_date, end_date):
+    return _select_leave_conflicts(c, user_id, "start_day <= ? AND end_day >= ?",
+                                   (day_ordinal(end_date), day_ordinal(start_date)))
+
+def find_leave_conflicts(user_id, start_date, end_date):
+    """The user's pending or approved requests overlapping [start_date, end_date]"""
+    return leave_repository().find_leave_conflicts(user_id, start_date, end_date)
+
+@timed
+def submit_leave_request(user_id, start_date, end_date, leave_type, reason, allow_overlap=False):
+    request_id = leave_repository().submit_leave_request(user_id, start_date, end_date, leave_type, reason,
+                                                         allow_overlap)
+    invalidate_read_cache()
+    active_leave_store().mark_stale()
+    return request_id
+
+@timed
+def audit_leave_overlaps(statuses=ACTIVE_LEAVE_STATUSES):
+    """Every pair of overlapping requests per user, found in one sweep over requests ordered by (user, start)"""
+    require_sqlite_backend("The overlap audit")
+    placeholders = ",".join("?" * len(statuses))
+    query = f"""
+    SELECT lr.user_id, u.full_name, lr.id, lr.start_date, lr.end_date, lr.status, lr.start_day, lr.end_day
+    FROM leave_requests lr
+    LEFT JOIN users u ON lr.user_id = u.id
+    WHERE lr.status IN ({placeholders})
+    ORDER BY lr.user_id, lr.start_day, lr.id
+    """
+    pairs = []
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, statuses)
+        current_user = None
+        active = []  # min-heap of (end_day, id, start_date, end_date, status) still open at the sweep line
+        for user_id, full_name, request_id, start_date, end_date, status, start_day, end_day in c:
+            if user_id != current_user:
+                current_user = user_id
+                active = []
+            while active and active[0][0] < start_day:
+                heapq.heappop(active)
+            for _, other_id, other_start, other_end, other_status in active:
+                pairs.append((user_id, full_name, other_id, other_start, other_end, other_status,
+                              request_id, start_date, end_date, status))
+            heapq.heappush(active, (end_day, request_id, start_date, end_date, status))
+    
+    return pd.DataFrame(pairs, columns=['user_id', 'full_name',
+                                        'first_id', 'first_start', 'first_end', 'first_status',
+                                        'second_id', 'second_start', 'second_end', 'second_status'])
+
+def leave_decision_date(status):
+    """The decided_date a status change records: today for approvals and rejections, none otherwise"""
+    return date.today().isoformat() if status in DECIDED_LEAVE_STATUSES else None
+
+def _chunked(values, size=500):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _classify_status_changes(request_ids, current_status, status):
+    """Outcome per requested id and the ids whose status actually changes"""
+    results = {}
+    changed = []
+    for request_id in request_ids:
+        if request_id not in current_status:
+            results[request_id] = 'not_found'
+        elif current_status[request_id] == status:
+            results[request_id] = 'unchanged'
+        else:
+            results[request_id] = 'updated'
+            changed.append(request_id)
+    return results, changed
+
+@timed
+def bulk_update_leave_status(request_ids, status, approved_by):
+    """Set the status of many requests in one transaction; returns {request_id: outcome}"""
+    request_ids = list(dict.fromkeys(int(request_id) for request_id in request_ids))
+    if not request_ids:
+        return {}
+    
+    results = leave_repository().bulk_update_leave_status(request_ids, status, approved_by)
+    if 'updated' in results.values():
+        invalidate_read_cache()
+        active_leave_store().mark_stale()
+    return results
+
+def update_leave_status(request_id, status, approved_by):
+    return bulk_update_leave_status([request_id], status, approved_by)[int(request_id)]
+
+@cached_read
+def get_leave_for_date_range(start_date, end_date, user_id=None):
+    return leave_repository().leave_for_date_range(start_date, end_date, user_id)
+
+# Storage backends
+class LeaveRepository(ABC):
+    """The queries and writes the app issues per rerun; one subclass per storage backend"""
+    backend = None
+    _token = None
+    _token_checked = float('-inf')
+
+    @abstractmethod
+    def bootstrap(self, seed_demo):
+        pass
+
+    @abstractmethod
+    def stats(self):
+        pass
+
+    def change_token(self):
+        """A value that changes whenever any process writes, polled at most every CHANGE_TOKEN_POLL_SECONDS"""
+        now = time.monotonic()
+        if now - self._token_checked >= CHANGE_TOKEN_POLL_SECONDS:
+            self._token = self.data_version()
+            self._token_checked = now
+        return self._token
+
+    @abstractmethod
+    def data_version(self):
+        """The leave_planner_meta counter every write transaction bumps"""
+
+    @abstractmethod
+    def authenticate(self, username, hashed_password):
+        pass
+
+    @abstractmethod
+    def user_leave_requests(self, user_id, include_history=False):
+        pass
+
+    @abstractmethod
+    def all_leave_requests(self, include_history=False):
+        pass
+
+    @abstractmethod
+    def count_leave_requests(self, status, department, include_history=False):
+        pass
+
+    @abstractmethod
+    def leave_requests_page(self, status, department, page_size, after, include_history=False):
+        pass
+
+    @abstractmethod
+    def departments(self):
+        pass
+
+    @abstractmethod
+    def leave_years(self):
+        pass
+
+    @abstractmethod
+    def max_concurrent_absences(self, department, start_date, end_date, statuses):
+        pass
+
+    @abstractmethod
+    def leave_balance(self, user_id, year):
+        """(entitlement, used working days) for one user and year"""
+
+    @abstractmethod
+    def department_headcount(self, department):
+        pass
+
+    @abstractmethod
+    def team_leave_requests(self, department, include_history=False):
+        pass
+
+    @abstractmethod
+    def leave_for_date_range(self, start_date, end_date, user_id=None):
+        pass
+
+    @abstractmethod
+    def find_leave_conflicts(self, user_id, start_date, end_date):
+        pass
+
+    @abstractmethod
+    def submit_leave_request(self, user_id, start_date, end_date, leave_type, reason, allow_overlap):
+        pass
+
+    @abstractmethod
+    def bulk_update_leave_status(self, request_ids, status, approved_by):
+        pass
+
+    @abstractmethod
+    def latest_leave_change(self):
+        """Highest leave_changes seq, or 0 when nothing has been logged"""
+
+    @abstractmethod
+    def leave_changes_since(self, seq):
+        """Ids of the requests changed after seq, or None once the log has been pruned past it"""
+
+    @abstractmethod
+    def prune_leave_changes(self, keep):
+        pass
+
+    @abstractmethod
+    def active_leave_rows(self, first_day, request_ids=None):
+        """ACTIVE_LEAVE_FIELDS tuples for requests ending on or after day number first_day"""
+
+    @abstractmethod
+    def leave_users(self):
+        """(id, full_name, department, role) of every user"""
+
+    @abstractmethod
+    def leave_rollups(self, first_month, last_month):
+        """Non-empty leave_rollups rows for month_key values first_month through last_month"""
+
+    @abstractmethod
+    def rebuild_leave_rollups(self):
+        """Recompute leave_rollups from every request; returns the number of rollup rows"""
+
+class SQLiteLeaveRepository(LeaveRepository):
+    """One database file; derived tables are kept in step inside each write transaction"""
+    backend = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def connection(self):
+        return get_db_pool(self.db_path, DB_POOL_SIZE, DB_POOL_TIMEOUT).connection()
+
+    def bootstrap(self, seed_demo):
+        return bootstrap_db(self.db_path, seed_demo)
+
+    def data_version(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT data_version FROM leave_planner_meta WHERE id = 1").fetchone()[0]
+
+    def stats(self):
+        return get_db_pool(self.db_path, DB_POOL_SIZE, DB_POOL_TIMEOUT).stats()
+
+    def authenticate(self, username, hashed_password):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, hashed_password))
+            user = c.fetchone()
+        return user
+
+    def _leave_tables(self, conn, include_history):
+        return leave_history_tables(conn.cursor()) if include_history else ['leave_requests']
+
+    def user_leave_requests(self, user_id, include_history=False):
+        with self.connection() as conn:
+            query, params = union_leave_tables("SELECT * FROM {table} WHERE user_id = ?", (user_id,),
+                                               self._leave_tables(conn, include_history))
+            df = pd.read_sql_query(f"{query} ORDER BY request_day DESC, id DESC", conn, params=params)
+        return df
+
+    def all_leave_requests(self, include_history=False):
+        query = """
+        SELECT lr.*, u.full_name, u.department
+        FROM {table} lr
+        JOIN users u ON lr.user_id = u.id
+        """
+        with self.connection() as conn:
+            query, params = union_leave_tables(query, (), self._leave_tables(conn, include_history))
+            df = pd.read_sql_query(f"{query} ORDER BY lr.request_day DESC, lr.id DESC", conn, params=params)
+        return df
+
+    def count_leave_requests(self, status, department, include_history=False):
+        clauses, params = _leave_request_filters(status, department)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.connection() as conn:
+            c = conn.cursor()
+            query, params = union_leave_tables(f"SELECT COUNT(*) FROM {{table}} lr JOIN users u ON lr.user_id = u.id {where}",
+                                               params, self._leave_tables(conn, include_history))
+            c.execute(query, params)
+            count = sum(row[0] for row in c.fetchall())
+        return count
+
+    def leave_requests_page(self, status, department, page_size, after, include_history=False):
+        clauses, params = _leave_request_filters(status, department)
+        if after:
+            clauses.append("(lr.request_day, lr.id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Each table is read in (request_day, id) index order and the branches merged, so LIMIT still stops early
+        query = f"""
+        SELECT lr.*, u.full_name, u.department
+        FROM {{table}} lr
+        JOIN users u ON lr.user_id = u.id
+        {where}
+        """
+        with self.connection() as conn:
+            query, params = union_leave_tables(query, params, self._leave_tables(conn, include_history))
+            df = pd.read_sql_query(f"{query} ORDER BY lr.request_day DESC, lr.id DESC LIMIT ?", conn,
+                                   params=params + [page_size])
+        return df
+
+    def departments(self):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT DISTINCT department FROM users WHERE department IS NOT NULL ORDER BY department")
+            departments = [row[0] for row in c.fetchall()]
+        return departments
+
+    def leave_years(self):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT MIN(start_day), MAX(start_day) FROM leave_requests")
+            first, last = c.fetchone()
+            archive_years = leave_archive_years(c)
+        years = [date.fromordinal(first).year, date.fromordinal(last).year] if first is not None else []
+        years += archive_years
+        if not years:
+            return None
+        return min(years), max(years)
+
+    def max_concurrent_absences(self, department, start_date, end_date, statuses):
+        placeholders = ",".join("?" * len(statuses))
+        query = f"""
+        SELECT day, SUM(headcount) AS absent
+        FROM leave_coverage
+        WHERE department = ? AND day BETWEEN ? AND ? AND status IN ({placeholders})
+        GROUP BY day
+        HAVING absent > 0
+        ORDER BY absent DESC, day
+        LIMIT 1
+        """
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute(query, (department, start_date, end_date, *statuses))
+            row = c.fetchone()
+        return (row[1], row[0]) if row else (0, None)
+
+    def leave_balance(self, user_id, year):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                SELECT u.annual_leave_balance, COALESCE(b.used_days, 0)
+                FROM users u
+                LEFT JOIN leave_balances b ON b.user_id = u.id AND b.year = ?
+                WHERE u.id = ?
+            """, (year, user_id))
+            row = c.fetchone()
+        return row if row else (0, 0)
+
+    def department_headcount(self, department):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM users WHERE department = ?", (department,))
+            headcount = c.fetchone()[0]
+        return headcount
+
+    def team_leave_requests(self, department, include_history=False):
+        query = """
+        SELECT lr.*, u.full_name, u.department
+        FROM {table} lr
+        JOIN users u ON lr.user_id = u.id
+        WHERE u.department = ? AND u.role != 'manager'
+        """
+        with self.connection() as conn:
+            query, params = union_leave_tables(query, (department,), self._leave_tables(conn, include_history))
+            df = pd.read_sql_query(f"{query} ORDER BY lr.request_day DESC, lr.id DESC", conn, params=params)
+        return df
+
+    def leave_for_date_range(self, start_date, end_date, user_id=None):
+        first_day, last_day = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        with self.connection() as conn:
+            if user_id:
+                query = f"""
+                SELECT {CALENDAR_LEAVE_COLUMNS}, u.full_name, u.department
+                FROM {{table}} lr
+                JOIN users u ON lr.user_id = u.id
+                WHERE lr.user_id = ? AND lr.start_day <= ? AND lr.end_day >= ?
+                """
+                tables = leave_history_tables(conn.cursor(), first_day.toordinal(), last_day.toordinal())
+                query, params = union_leave_tables(query, (user_id, last_day.toordinal(), first_day.toordinal()),
+                                                   tables)
+            else:
+                # Narrow to the month buckets the window touches before checking the exact overlap
+                query = f"""
+                SELECT {CALENDAR_LEAVE_COLUMNS}, u.full_name, u.department
+                FROM leave_requests lr
+                JOIN users u ON lr.user_id = u.id
+                WHERE lr.id IN (SELECT request_id FROM leave_request_months WHERE month BETWEEN ? AND ?)
+                AND lr.start_day <= ? AND lr.end_day >= ?
+                """
+                params = [month_key(first_day), month_key(last_day), last_day.toordinal(), first_day.toordinal()]
+                # Archived leave has no month buckets; the archives' own (start_day, end_day) index serves it
+                archives = leave_history_tables(conn.cursor(), first_day.toordinal(), last_day.toordinal())[1:]
+                if archives:
+                    archived, archived_params = union_leave_tables(f"""
+                    SELECT {CALENDAR_LEAVE_COLUMNS}, u.full_name, u.department
+                    FROM {{table}} lr
+                    JOIN users u ON lr.user_id = u.id
+                    WHERE lr.start_day <= ? AND lr.end_day >= ?
+                    """, (last_day.toordinal(), first_day.toordinal()), archives)
+                    query = f"{query} UNION ALL {archived}"
+                    params += archived_params
+            df = pd.read_sql_query(query, conn, params=params)
+        return df
+
+    def find_leave_conflicts(self, user_id, start_date, end_date):
+        with self.connection() as conn:
+            conflicts = _find_leave_conflicts(conn.cursor(), user_id, start_date, end_date)
+        return conflicts
+
+    def submit_leave_request(self, user_id, start_date, end_date, leave_type, reason, allow_overlap):
+        with self.connection() as conn:
+            c = conn.cursor()
+            # Hold the write lock across the overlap check so two submissions can't both pass it
+            c.execute("BEGIN IMMEDIATE")
+            if not allow_overlap:
+                conflicts = _find_leave_conflicts(c, user_id, start_date, end_date)
+                if conflicts:
+                    conn.rollback()
+                    raise LeaveConflictError(conflicts)
+
+            request_date = date.today()
+            c.execute("INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, request_date, start_day, end_day, request_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (user_id, start_date, end_date, leave_type, reason, request_date.isoformat(),
+                       day_ordinal(start_date), day_ordinal(end_date), request_date.toordinal()))
+            request_id = c.lastrowid
+            sync_leave_month_buckets(c, [request_id])
+            c.execute("SELECT department FROM users WHERE id = ?", (user_id,))
+            department = c.fetchone()
+            request = pd.DataFrame([{
+                'start_date': start_date,
+                'end_date': end_date,
+                'department': department[0] if department else None,
+                'leave_type': leave_type,
+                'status': 'pending'
+            }])
+            adjust_leave_coverage(c, request, 1)
+            adjust_leave_rollups(c, request, 1)
+            bump_data_version(c)
+            conn.commit()
+        return request_id
+
+    def bulk_update_leave_status(self, request_ids, status, approved_by):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                current = []
+                for chunk in _chunked(request_ids):
+                    placeholders = ",".join("?" * len(chunk))
+                    current.append(pd.read_sql_query(f"""
+                        SELECT lr.id, lr.user_id, lr.status, lr.start_date, lr.end_date, lr.start_day, lr.end_day,
+                               lr.request_date, lr.request_day, lr.decided_date, lr.leave_type, u.department
+                        FROM leave_requests lr
+                        LEFT JOIN users u ON lr.user_id = u.id
+                        WHERE lr.id IN ({placeholders})
+                    """, conn, params=chunk))
+                current = pd.concat(current, ignore_index=True)
+                results, changed = _classify_status_changes(
+                    request_ids, dict(zip(current['id'].tolist(), current['status'].tolist())), status)
+
+                decided_date = leave_decision_date(status)
+                c.executemany("UPDATE leave_requests SET status = ?, approved_by = ?, decided_date = ? WHERE id = ?",
+                              [(status, approved_by, decided_date, request_id) for request_id in changed])
+
+                # Move the changed requests' days from their old status to the new one
+                moved = current[current['id'].isin(changed)]
+                adjust_leave_coverage(c, moved, -1)
+                adjust_leave_coverage(c, moved.assign(status=status), 1)
+                adjust_leave_rollups(c, moved, -1)
+                adjust_leave_rollups(c, moved.assign(status=status, decided_date=decided_date), 1)
+
+                # Approvals debit the balance; moving an approved request to any other status credits it back
+                if status == 'approved':
+                    post_leave_debits(c, moved)
+                else:
+                    post_leave_credits(c, moved[moved['status'] == 'approved'])
+                bump_data_version(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return results
+
+    def latest_leave_change(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM leave_changes").fetchone()[0]
+
+    def leave_changes_since(self, seq):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT MIN(seq), MAX(seq) FROM leave_changes")
+            earliest, latest = c.fetchone()
+            if latest is None:
+                return [] if seq == 0 else None
+            if latest < seq or earliest > seq + 1:
+                return None
+            c.execute("SELECT DISTINCT request_id FROM leave_changes WHERE seq > ?", (seq,))
+            return [row[0] for row in c.fetchall()]
+
+    def prune_leave_changes(self, keep):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM leave_changes WHERE seq <= (SELECT MAX(seq) FROM leave_changes) - ?", (keep,))
+            conn.commit()
+
+    def active_leave_rows(self, first_day, request_ids=None):
+        query = f"SELECT {ACTIVE_LEAVE_FIELDS} FROM leave_requests lr WHERE lr.end_day >= ?"
+        with self.connection() as conn:
+            c = conn.cursor()
+            if request_ids is None:
+                return c.execute(query, (first_day,)).fetchall()
+            rows = []
+            for chunk in _chunked(request_ids):
+                c.execute(f"{query} AND lr.id IN ({','.join('?' * len(chunk))})", (first_day, *chunk))
+                rows.extend(c.fetchall())
+            return rows
+
+    def leave_users(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT id, full_name, department, role FROM users").fetchall()
+
+    def leave_rollups(self, first_month, last_month):
+        query = """
+        SELECT * FROM leave_rollups
+        WHERE month BETWEEN ? AND ?
+        """
+        with self.connection() as conn:
+            df = pd.read_sql_query(query, conn, params=(first_month, last_month))
+        return df
+
+    def rebuild_leave_rollups(self):
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                rebuild_leave_rollups_table(c)
+                bump_data_version(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return c.execute("SELECT COUNT(*) FROM leave_rollups").fetchone()[0]
+
+# Dates are stored as DATE and read back as ISO strings plus day numbers so both backends return the same frames
+POSTGRES_LEAVE_COLUMNS = """
+    lr.id, lr.user_id, to_char(lr.start_date, 'YYYY-MM-DD') AS start_date,
+    to_char(lr.end_date, 'YYYY-MM-DD') AS end_date, lr.leave_type, lr.reason, lr.status,
+    to_char(lr.request_date, 'YYYY-MM-DD') AS request_date, lr.approved_by,
+    lr.start_date - DATE '0001-01-01' + 1 AS start_day, lr.end_date - DATE '0001-01-01' + 1 AS end_day,
+    lr.request_date - DATE '0001-01-01' + 1 AS request_day, to_char(lr.decided_date, 'YYYY-MM-DD') AS decided_date
+"""
+
+POSTGRES_ACTIVE_LEAVE_FIELDS = """
+    lr.id, lr.user_id, lr.start_date - DATE '0001-01-01' + 1, lr.end_date - DATE '0001-01-01' + 1,
+    lr.request_date - DATE '0001-01-01' + 1, lr.status, lr.leave_type, lr.reason, lr.approved_by
+"""
+
+POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE,
+        password TEXT,
+        full_name TEXT,
+        role TEXT,
+        department TEXT,
+        annual_leave_balance INTEGER DEFAULT 30
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leave_requests (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        leave_type TEXT,
+        reason TEXT,
+        status TEXT DEFAULT 'pending',
+        request_date DATE,
+        approved_by TEXT,
+        period DATERANGE GENERATED ALWAYS AS (daterange(start_date, end_date, '[]')) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_leave_requests_period ON leave_requests USING gist (period)",
+    "CREATE INDEX IF NOT EXISTS idx_leave_requests_user_dates ON leave_requests (user_id, start_date, end_date)",
+    "CREATE INDEX IF NOT EXISTS idx_leave_requests_status ON leave_requests (status, request_date)",
+    "CREATE INDEX IF NOT EXISTS idx_leave_requests_request_date ON leave_requests (request_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_department_role ON users (department, role)",
+    "ALTER TABLE leave_requests ADD COLUMN IF NOT EXISTS decided_date DATE",
+    f"""
+    CREATE TABLE IF NOT EXISTS leave_rollups (
+        month INTEGER,
+        department TEXT,
+        leave_type TEXT,
+        status TEXT,
+        {', '.join(f'{measure} BIGINT NOT NULL DEFAULT 0' for measure in LEAVE_ROLLUP_MEASURES)},
+        PRIMARY KEY (month, department, leave_type, status)
+    )
+    """,
+    # Earlier releases left rows at zero once their last request moved status
+    f"DELETE FROM leave_rollups WHERE {EMPTY_LEAVE_ROLLUP}",
+    """
+    CREATE TABLE IF NOT EXISTS leave_ledger (
+        id BIGSERIAL PRIMARY KEY,
+        user_id INTEGER,
+        request_id INTEGER,
+        year INTEGER,
+        days INTEGER,
+        entry_type TEXT,
+        posted_at TIMESTAMP DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_leave_ledger_user_year ON leave_ledger (user_id, year)",
+    """
+    CREATE TABLE IF NOT EXISTS leave_balances (
+        user_id INTEGER,
+        year INTEGER,
+        used_days INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, year)
+    )
+    """,
+    # Bumped by every write so each replica can tell when its read cache is stale
+    "CREATE TABLE IF NOT EXISTS leave_planner_meta (id INTEGER PRIMARY KEY CHECK (id = 1), data_version BIGINT NOT NULL)",
+    "INSERT INTO leave_planner_meta (id, data_version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+    # Change feed for the active-leave snapshot, appended to by a row trigger on leave_requests
+    "CREATE TABLE IF NOT EXISTS leave_changes (seq BIGSERIAL PRIMARY KEY, request_id INTEGER NOT NULL)",
+    """
+    CREATE OR REPLACE FUNCTION log_leave_change() RETURNS trigger AS $$
+    BEGIN
+        -- Held until commit, so seqs become visible in the order they were handed out
+        PERFORM pg_advisory_xact_lock(hashtext('leave_planner_changes'));
+        INSERT INTO leave_changes (request_id) VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE TRIGGER trg_leave_changes
+    AFTER INSERT OR DELETE OR UPDATE OF {', '.join(LEAVE_CHANGE_COLUMNS)} ON leave_requests
+    FOR EACH ROW EXECUTE FUNCTION log_leave_change()
+    """,
+]
+
+class PostgresLeaveRepository(LeaveRepository):
+    """PostgreSQL through a psycopg2 connection pool, so several app replicas can share one database"""
+    backend = 'postgres'
+
+    def __init__(self, dsn, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        try:
+            import psycopg2.pool
+        except ImportError:
+            raise RuntimeError("The postgres backend needs psycopg2: pip install psycopg2-binary")
+        self.dsn = dsn
+        self.size = size
+        self.timeout = timeout
+        self._pool = psycopg2.pool.ThreadedConnectionPool(1, size, dsn)
+        # psycopg2's pool raises when exhausted; the semaphore makes callers wait like the SQLite pool
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._bootstrapped = False
+        self._checkouts = 0
+        self._waits = 0
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise TimeoutError(f"No PostgreSQL connection free after {self.timeout}s (pool size {self.size})")
+        try:
+            conn = self._pool.getconn()
+            with self._lock:
+                self._checkouts += 1
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as c:
+                    yield c
+                    c.execute("UPDATE leave_planner_meta SET data_version = data_version + 1 WHERE id = 1")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _read_frame(self, query, params=()):
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute(query, params)
+            return pd.DataFrame(c.fetchall(), columns=[column[0] for column in c.description])
+
+    def _read_one(self, query, params=()):
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute(query, params)
+            return c.fetchone()
+
+    def bootstrap(self, seed_demo):
+        if self._bootstrapped:
+            return None
+        with self.transaction() as c:
+            # Serialise schema creation between replicas starting together
+            c.execute("SELECT pg_advisory_xact_lock(hashtext('leave_planner_schema'))")
+            for statement in POSTGRES_SCHEMA:
+                c.execute(statement)
+            if seed_demo:
+                c.executemany("""
+                    INSERT INTO users (username, password, full_name, role, department)
+                    VALUES (%s, %s, %s, %s, %s) ON CONFLICT (username) DO NOTHING
+                """, demo_users())
+                c.execute("SELECT EXISTS (SELECT 1 FROM leave_requests)")
+                if not c.fetchone()[0]:
+                    c.executemany("""
+                        INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, status,
+                                                    request_date, approved_by)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, DEMO_LEAVE_REQUESTS)
+                    c.execute(f"SELECT {POSTGRES_LEAVE_COLUMNS} FROM leave_requests lr WHERE lr.status = 'approved'")
+                    approved = pd.DataFrame(c.fetchall(), columns=[column[0] for column in c.description])
+                    post_leave_debits(c, approved, placeholder="%s")
+            # Every request contributes rollup rows, so empty rollups beside existing requests need a backfill
+            c.execute("SELECT EXISTS (SELECT 1 FROM leave_requests) AND NOT EXISTS (SELECT 1 FROM leave_rollups)")
+            if c.fetchone()[0]:
+                self._rebuild_leave_rollups(c)
+        self._bootstrapped = True
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'pool_size': self.size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'data_version': self._token,
+            }
+
+    def data_version(self):
+        return self._read_one("SELECT data_version FROM leave_planner_meta WHERE id = 1")[0]
+
+    def authenticate(self, username, hashed_password):
+        return self._read_one("SELECT * FROM users WHERE username = %s AND password = %s",
+                              (username, hashed_password))
+
+    # Archiving is SQLite-only, so leave_requests already holds the whole history and include_history changes nothing
+    def user_leave_requests(self, user_id, include_history=False):
+        return self._read_frame(f"""
+            SELECT {POSTGRES_LEAVE_COLUMNS} FROM leave_requests lr
+            WHERE lr.user_id = %s ORDER BY lr.request_date DESC, lr.id DESC
+        """, (user_id,))
+
+    def all_leave_requests(self, include_history=False):
+        return self._read_frame(f"""
+            SELECT {POSTGRES_LEAVE_COLUMNS}, u.full_name, u.department
+            FROM leave_requests lr JOIN users u ON lr.user_id = u.id
+            ORDER BY lr.request_date DESC, lr.id DESC
+        """)
+
+    def count_leave_requests(self, status, department, include_history=False):
+        clauses, params = _leave_request_filters(status, department, placeholder="%s")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read_one(f"SELECT COUNT(*) FROM leave_requests lr JOIN users u ON lr.user_id = u.id {where}",
+                              params)[0]
+
+    def leave_requests_page(self, status, department, page_size, after, include_history=False):
+        clauses, params = _leave_request_filters(status, department, placeholder="%s")
+        if after:
+            clauses.append("(lr.request_date, lr.id) < (DATE '0001-01-01' + (%s - 1), %s)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read_frame(f"""
+            SELECT {POSTGRES_LEAVE_COLUMNS}, u.full_name, u.department
+            FROM leave_requests lr JOIN users u ON lr.user_id = u.id
+            {where}
+            ORDER BY lr.request_date DESC, lr.id DESC
+            LIMIT %s
+        """, params + [page_size])
+
+    def departments(self):
+        departments = self._read_frame(
+            "SELECT DISTINCT department FROM users WHERE department IS NOT NULL ORDER BY department")
+        return departments['department'].tolist()
+
+    def leave_years(self):
+        first, last = self._read_one("""
+            SELECT EXTRACT(YEAR FROM MIN(start_date))::int, EXTRACT(YEAR FROM MAX(start_date))::int
+            FROM leave_requests
+        """)
+        return None if first is None else (first, last)
+
+    def max_concurrent_absences(self, department, start_date, end_date, statuses):
+        # Expand only the requests the GiST index finds overlapping the window, clipped to it
+        row = self._read_one("""
+            SELECT to_char(day, 'YYYY-MM-DD'), COUNT(*) AS absent
+            FROM leave_requests lr
+            JOIN users u ON lr.user_id = u.id
+            CROSS JOIN LATERAL generate_series(GREATEST(lr.start_date, %(start)s::date),
+                                               LEAST(lr.end_date, %(end)s::date), interval '1 day') AS day
+            WHERE u.department = %(department)s AND lr.status = ANY(%(statuses)s)
+            AND lr.period && daterange(%(start)s::date, %(end)s::date, '[]')
+            GROUP BY day
+            ORDER BY absent DESC, day
+            LIMIT 1
+        """, {'department': department, 'start': start_date, 'end': end_date, 'statuses': list(statuses)})
+        return (row[1], row[0]) if row else (0, None)
+
+    def leave_balance(self, user_id, year):
+        row = self._read_one("""
+            SELECT u.annual_leave_balance, COALESCE(b.used_days, 0)
+            FROM users u
+            LEFT JOIN leave_balances b ON b.user_id = u.id AND b.year = %s
+            WHERE u.id = %s
+        """, (year, user_id))
+        return row if row else (0, 0)
+
+    def department_headcount(self, department):
+        return self._read_one("SELECT COUNT(*) FROM users WHERE department = %s", (department,))[0]
+
+    def team_leave_requests(self, department, include_history=False):
+        return self._read_frame(f"""
+            SELECT {POSTGRES_LEAVE_COLUMNS}, u.full_name, u.department
+            FROM leave_requests lr JOIN users u ON lr.user_id = u.id
+            WHERE u.department = %s AND u.role != 'manager'
+            ORDER BY lr.request_date DESC, lr.id DESC
+        """, (department,))
+
+    def leave_for_date_range(self, start_date, end_date, user_id=None):
+        # && on the generated daterange column is answered from the GiST index
+        query = """
+            SELECT lr.id, lr.user_id, lr.leave_type, lr.reason, lr.status,
+                   lr.start_date - DATE '0001-01-01' + 1 AS start_day, lr.end_date - DATE '0001-01-01' + 1 AS end_day,
+                   u.full_name, u.department
+            FROM leave_requests lr JOIN users u ON lr.user_id = u.id
+            WHERE lr.period && daterange(%s::date, %s::date, '[]')
+        """
+        params = [start_date, end_date]
+        if user_id:
+            query += " AND lr.user_id = %s"
+            params.append(user_id)
+        return self._read_frame(query, params)
+
+    def _find_leave_conflicts(self, c, user_id, start_date, end_date):
+        return _select_leave_conflicts(
+            c, user_id, "period && daterange(%s::date, %s::date, '[]')", (start_date, end_date),
+            columns="id, to_char(start_date, 'YYYY-MM-DD') AS start_date, to_char(end_date, 'YYYY-MM-DD') AS end_date",
+            placeholder="%s")
+
+    def find_leave_conflicts(self, user_id, start_date, end_date):
+        with self.connection() as conn, conn.cursor() as c:
+            return self._find_leave_conflicts(c, user_id, start_date, end_date)
+
+    def submit_leave_request(self, user_id, start_date, end_date, leave_type, reason, allow_overlap):
+        with self.transaction() as c:
+            # Lock only this user's row: submissions for different people proceed in parallel
+            c.execute("SELECT department FROM users WHERE id = %s FOR UPDATE", (user_id,))
+            department = c.fetchone()
+            if not allow_overlap:
+                conflicts = self._find_leave_conflicts(c, user_id, start_date, end_date)
+                if conflicts:
+                    raise LeaveConflictError(conflicts)
+            c.execute("""
+                INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, request_date)
+                VALUES (%s, %s, %s, %s, %s, CURRENT_DATE) RETURNING id
+            """, (user_id, start_date, end_date, leave_type, reason))
+            request_id = c.fetchone()[0]
+            adjust_leave_rollups(c, pd.DataFrame([{
+                'start_date': start_date,
+                'end_date': end_date,
+                'department': department[0] if department else None,
+                'leave_type': leave_type,
+                'status': 'pending'
+            }]), 1, placeholder="%s")
+        return request_id
+
+    def bulk_update_leave_status(self, request_ids, status, approved_by):
+        with self.transaction() as c:
+            # Row locks, not a database-wide lock, keep concurrent moderators from racing on the same requests
+            c.execute(f"""
+                SELECT {POSTGRES_LEAVE_COLUMNS}, u.department
+                FROM leave_requests lr LEFT JOIN users u ON lr.user_id = u.id
+                WHERE lr.id = ANY(%s)
+                ORDER BY lr.id
+                FOR UPDATE OF lr
+            """, (request_ids,))
+            current = pd.DataFrame(c.fetchall(), columns=[column[0] for column in c.description])
+            current_status = dict(zip(current['id'].tolist(), current['status'].tolist())) if not current.empty else {}
+            results, changed = _classify_status_changes(request_ids, current_status, status)
+            if changed:
+                decided_date = leave_decision_date(status)
+                c.execute("UPDATE leave_requests SET status = %s, approved_by = %s, decided_date = %s WHERE id = ANY(%s)",
+                          (status, str(approved_by), decided_date, changed))
+                moved = current[current['id'].isin(changed)]
+                adjust_leave_rollups(c, moved, -1, placeholder="%s")
+                adjust_leave_rollups(c, moved.assign(status=status, decided_date=decided_date), 1, placeholder="%s")
+                if status == 'approved':
+                    post_leave_debits(c, moved, placeholder="%s")
+                else:
+                    post_leave_credits(c, moved[moved['status'] == 'approved'], placeholder="%s")
+        return results
+
+    def latest_leave_change(self):
+        return self._read_one("SELECT COALESCE(MAX(seq), 0) FROM leave_changes")[0]
+
+    def leave_changes_since(self, seq):
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute("SELECT MIN(seq), MAX(seq) FROM leave_changes")
+            earliest, latest = c.fetchone()
+            if latest is None:
+                return [] if seq == 0 else None
+            if latest < seq or earliest > seq + 1:
+                return None
+            c.execute("SELECT DISTINCT request_id FROM leave_changes WHERE seq > %s", (seq,))
+            return [row[0] for row in c.fetchall()]
+
+    def prune_leave_changes(self, keep):
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute("DELETE FROM leave_changes WHERE seq <= (SELECT MAX(seq) FROM leave_changes) - %s", (keep,))
+            conn.commit()
+
+    def active_leave_rows(self, first_day, request_ids=None):
+        query = f"SELECT {POSTGRES_ACTIVE_LEAVE_FIELDS} FROM leave_requests lr WHERE lr.end_date >= DATE '0001-01-01' + (%s - 1)"
+        params = [first_day]
+        if request_ids is not None:
+            query += " AND lr.id = ANY(%s)"
+            params.append(list(request_ids))
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute(query, params)
+            return c.fetchall()
+
+    def leave_users(self):
+        with self.connection() as conn, conn.cursor() as c:
+            c.execute("SELECT id, full_name, department, role FROM users")
+            return c.fetchall()
+
+    def leave_rollups(self, first_month, last_month):
+        return self._read_frame("""
+            SELECT * FROM leave_rollups
+            WHERE month BETWEEN %s AND %s
+        """, (first_month, last_month))
+
+    def _rebuild_leave_rollups(self, c):
+        c.execute("DELETE FROM leave_rollups")
+        # A server-side cursor streams the history while c writes the rollups
+        with c.connection.cursor(name="leave_rollups_rebuild") as rows:
+            rows.execute(f"""
+                SELECT {POSTGRES_LEAVE_COLUMNS}, u.department
+                FROM leave_requests lr JOIN users u ON lr.user_id = u.id
+            """)
+            while True:
+                batch = rows.fetchmany(50000)
+                if not batch:
+                    break
+                adjust_leave_rollups(c, pd.DataFrame(batch, columns=[column[0] for column in rows.description]), 1,
+                                     placeholder="%s")
+
+    def rebuild_leave_rollups(self):
+        with self.transaction() as c:
+            # Writers wait for the rebuild, so none of their rollup deltas is lost or counted twice
+            c.execute("LOCK TABLE leave_requests IN SHARE MODE")
+            self._rebuild_leave_rollups(c)
+            c.execute("SELECT COUNT(*) FROM leave_rollups")
+            count = c.fetchone()[0]
+        return count
+
+STORAGE_BACKENDS = ('sqlite', 'postgres')
+
+@st.cache_resource
+def get_leave_repository(backend, target):
+    if backend == 'postgres':
+        return PostgresLeaveRepository(target, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+    if backend == 'sqlite':
+        return SQLiteLeaveRepository(target)
+    raise ValueError(f"Unknown LEAVE_PLANNER_BACKEND {backend!r}; expected one of {', '.join(STORAGE_BACKENDS)}")
+
+# Resolved once per script run and database target; benchmark.py repoints DB_PATH at runtime
+@functools.lru_cache(maxsize=None)
+def _leave_repository(backend, target):
+    return get_leave_repository(backend, target)
+
+def storage_target():
+    return POSTGRES_DSN if STORAGE_BACKEND == 'postgres' else DB_PATH
+
+def leave_repository():
+    return _leave_repository(STORAGE_BACKEND, storage_target())
+
+def require_sqlite_backend(feature):
+    """Bulk maintenance works on the SQLite file directly and is not available on other backends"""
+    if STORAGE_BACKEND != 'sqlite':
+        raise RuntimeError(f"{feature} is only available with LEAVE_PLANNER_BACKEND=sqlite")
+
+# Active leave snapshot
+ACTIVE_LEAVE_FIELDS = ("lr.id, lr.user_id, lr.start_day, lr.end_day, lr.request_day, lr.status, lr.leave_type, "
+                       "lr.reason, lr.approved_by")
+ACTIVE_LEAVE_COLUMNS = ('id', 'user_id', 'start_day', 'end_day', 'request_day', 'status', 'leave_type', 'reason',
+                        'approved_by')
+
+def active_leave_first_day():
+    """Day number of 1 January ACTIVE_LEAVE_YEARS_BACK years ago; leave ending earlier stays in the database"""
+    return date(date.today().year - ACTIVE_LEAVE_YEARS_BACK, 1, 1).toordinal()
+
+def _active_leave_columns(rows):
+    values = list(zip(*rows)) if rows else [()] * len(ACTIVE_LEAVE_COLUMNS)
+    return {name: np.array(column, dtype=np.int64 if position < 5 else object)
+            for position, (name, column) in enumerate(zip(ACTIVE_LEAVE_COLUMNS, values))}
+
+def _offset_index(keys):
+    """Distinct keys, their offsets into the grouped row order, and that order (stable, so newest first)"""
+    order = np.argsort(keys, kind='stable')
+    distinct, starts = np.unique(keys[order], return_index=True)
+    return distinct, np.append(starts, len(keys)), order
+
+def _offset_lookup(index, key):
+    distinct, offsets, order = index
+    position = np.searchsorted(distinct, key)
+    if position == len(distinct) or distinct[position] != key:
+        return order[:0]
+    return order[offsets[position]:offsets[position + 1]]
+
+class ActiveLeaveSnapshot:
+    """Read-only column arrays of the leave ending on or after first_day, indexed by user and department"""
+
+    def __init__(self, columns, users, first_day, seq):
+        self.first_day = first_day
+        self.seq = seq
+        
+        users = sorted(users)
+        self.user_keys = np.array([user[0] for user in users], dtype=np.int64)
+        self.user_names = np.array([user[1] for user in users], dtype=object)
+        self.user_departments = np.array([user[2] for user in users], dtype=object)
+        user_department_codes, self.departments = pd.factorize(self.user_departments, use_na_sentinel=False)
+        self.user_managers = np.array([user[3] == 'manager' for user in users], dtype=bool)
+        
+        # Inner join on users, then newest request first: the order every list view shows
+        user_pos = np.searchsorted(self.user_keys, columns['user_id'])
+        known = user_pos < len(self.user_keys)
+        known[known] = self.user_keys[user_pos[known]] == columns['user_id'][known]
+        rows = np.flatnonzero(known)
+        rows = rows[np.lexsort((-columns['id'][rows], -columns['request_day'][rows]))]
+        
+        self.ids = columns['id'][rows]
+        self.user_ids = columns['user_id'][rows]
+        self.user_pos = user_pos[rows].astype(np.int32)
+        self.department_codes = user_department_codes[self.user_pos].astype(np.int16)
+        self.start_days = columns['start_day'][rows].astype(np.int32)
+        self.end_days = columns['end_day'][rows].astype(np.int32)
+        self.request_days = columns['request_day'][rows].astype(np.int32)
+        status_codes, self.statuses = pd.factorize(columns['status'][rows], use_na_sentinel=False)
+        self.status_codes = status_codes.astype(np.int8)
+        leave_type_codes, self.leave_types = pd.factorize(columns['leave_type'][rows], use_na_sentinel=False)
+        self.leave_type_codes = leave_type_codes.astype(np.int16)
+        self.reasons = columns['reason'][rows]
+        self.approved_by = columns['approved_by'][rows]
+        
+        self.by_user = _offset_index(self.user_ids)
+        self.by_department = _offset_index(self.department_codes)
+        self._department_lookup = {department: code for code, department in enumerate(self.departments)}
+
+    @classmethod
+    def from_rows(cls, rows, users, first_day, seq):
+        return cls(_active_leave_columns(rows), users, first_day, seq)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _columns(self, rows):
+        return {
+            'id': self.ids[rows],
+            'user_id': self.user_ids[rows],
+            'start_day': self.start_days[rows],
+            'end_day': self.end_days[rows],
+            'request_day': self.request_days[rows],
+            'status': self.statuses[self.status_codes[rows]],
+            'leave_type': self.leave_types[self.leave_type_codes[rows]],
+            'reason': self.reasons[rows],
+            'approved_by': self.approved_by[rows],
+        }
+
+    def updated(self, rows, users, changed_ids, first_day, seq):
+        """A new snapshot with changed_ids replaced by their current rows and expired leave dropped"""
+        keep = ~np.isin(self.ids, np.asarray(changed_ids, dtype=np.int64)) & (self.end_days >= first_day)
+        kept = self._columns(keep)
+        fresh = _active_leave_columns(rows)
+        return ActiveLeaveSnapshot({name: np.concatenate([kept[name], fresh[name]]) for name in ACTIVE_LEAVE_COLUMNS},
+                                   users, first_day, seq)
+
+    def _request_frame(self, rows, with_user=True):
+        # Shaped like the leave_requests rows the repository returns; ISO dates only for the rows asked for
+        frame = pd.DataFrame({
+            'id': self.ids[rows],
+            'user_id': self.user_ids[rows],
+            'start_date': format_leave_days(self.start_days[rows]),
+            'end_date': format_leave_days(self.end_days[rows]),
+            'leave_type': self.leave_types[self.leave_type_codes[rows]],
+            'reason': self.reasons[rows],
+            'status': self.statuses[self.status_codes[rows]],
+            'request_date': format_leave_days(self.request_days[rows]),
+            'approved_by': self.approved_by[rows],
+            'start_day': self.start_days[rows],
+            'end_day': self.end_days[rows],
+            'request_day': self.request_days[rows],
+        })
+        if with_user:
+            frame['full_name'] = self.user_names[self.user_pos[rows]]
+            frame['department'] = self.user_departments[self.user_pos[rows]]
+        return frame
+
+    def user_requests(self, user_id):
+        """Like get_user_leave_requests, limited to the snapshot"""
+        return self._request_frame(_offset_lookup(self.by_user, user_id), with_user=False)
+
+    def team_requests(self, department):
+        """Like get_team_leave_requests, limited to the snapshot"""
+        code = self._department_lookup.get(department)
+        if code is None:
+            return self._request_frame(self.ids[:0])
+        rows = _offset_lookup(self.by_department, code)
+        return self._request_frame(rows[~self.user_managers[self.user_pos[rows]]])
+
+    def leave_for_range(self, first_day, last_day, user_id=None):
+        """Like get_leave_for_date_range for day numbers on or after first_day"""
+        rows = _offset_lookup(self.by_user, user_id) if user_id else np.arange(len(self.ids))
+        rows = rows[(self.start_days[rows] <= last_day) & (self.end_days[rows] >= first_day)]
+        return pd.DataFrame({
+            'id': self.ids[rows],
+            'user_id': self.user_ids[rows],
+            'leave_type': self.leave_types[self.leave_type_codes[rows]],
+            'reason': self.reasons[rows],
+            'status': self.statuses[self.status_codes[rows]],
+            'start_day': self.start_days[rows],
+            'end_day': self.end_days[rows],
+            'full_name': self.user_names[self.user_pos[rows]],
+            'department': self.user_departments[self.user_pos[rows]],
+        })
+
+class ActiveLeaveStore:
+    """Holds the current ActiveLeaveSnapshot and rolls it forward from the leave_changes log"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._snapshot = None
+        self._stale = True
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._full_loads = 0
+        self._refreshes = 0
+        self._last_refresh_ms = None
+
+    def mark_stale(self):
+        """Replay the change log on the next read, so this process sees its own writes at once"""
+        self._stale = True
+
+    def _is_current(self, snapshot):
+        return (snapshot is not None and not self._stale and snapshot.first_day == active_leave_first_day()
+                and time.monotonic() - self._checked < ACTIVE_LEAVE_POLL_SECONDS)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if self._is_current(snapshot):
+            return snapshot
+        with self._lock:
+            if not self._is_current(self._snapshot):
+                self._refresh()
+            return self._snapshot
+
+    def _refresh(self):
+        started = time.perf_counter()
+        # Cleared before reading, so a write landing mid-refresh is replayed by the next read
+        self._stale = False
+        self._checked = time.monotonic()
+        first_day = active_leave_first_day()
+        current = self._snapshot
+        latest = self.repository.latest_leave_change()
+        changed = None
+        if current is not None and first_day >= current.first_day:
+            if latest == current.seq and first_day == current.first_day:
+                return
+            changed = self.repository.leave_changes_since(current.seq)
+            # After a bulk import replaying row by row costs more than reloading
+            if changed is not None and len(changed) > len(current) // 2:
+                changed = None
+        
+        users = self.repository.leave_users()
+        if changed is None:
+            self._snapshot = ActiveLeaveSnapshot.from_rows(self.repository.active_leave_rows(first_day), users,
+                                                           first_day, latest)
+            self._full_loads += 1
+        else:
+            rows = self.repository.active_leave_rows(first_day, changed) if changed else []
+            self._snapshot = current.updated(rows, users, changed, first_day, latest)
+            self._refreshes += 1
+        
+        # Replicas that fall further behind than this just reload in full
+        previous = current.seq if current is not None else 0
+        if LEAVE_CHANGES_RETAINED > 0 and latest // LEAVE_CHANGES_RETAINED > previous // LEAVE_CHANGES_RETAINED:
+            self.repository.prune_leave_changes(LEAVE_CHANGES_RETAINED)
+        self._last_refresh_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'rows': len(snapshot) if snapshot is not None else 0,
+            'first_day': date.fromordinal(snapshot.first_day).isoformat() if snapshot is not None else None,
+            'change_seq': snapshot.seq if snapshot is not None else None,
+            'full_loads': self._full_loads,
+            'incremental_refreshes': self._refreshes,
+            'last_refresh_ms': self._last_refresh_ms,
+        }
+
+@st.cache_resource
+def get_active_leave_store(backend, target):
+    return ActiveLeaveStore(get_leave_repository(backend, target))
+
+@functools.lru_cache(maxsize=None)
+def _active_leave_store(backend, target):
+    return get_active_leave_store(backend, target)
+
+def active_leave_store():
+    return _active_leave_store(STORAGE_BACKEND, storage_target())
+
+@timed
+def active_leave_snapshot():
+    return active_leave_store().snapshot()
+
+def calendar_leave(start_date, end_date, user_id=None):
+    """Leave overlapping a calendar window, from the snapshot whenever the window lies inside it"""
+    snapshot = active_leave_snapshot()
+    if start_date.toordinal() >= snapshot.first_day:
+        return snapshot.leave_for_range(start_date.toordinal(), end_date.toordinal(), user_id)
+    return get_leave_for_date_range(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), user_id)
+
+# Public holidays
+HOLIDAY_REGION = os.environ.get("LEAVE_PLANNER_HOLIDAY_REGION", "SA")
+# Observed holiday dates per region; years listed here replace the generated dates
+HOLIDAYS_FILE = os.environ.get("LEAVE_PLANNER_HOLIDAYS_FILE",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays.csv"))
+
+def hijri_to_gregorian(year, month, day):
+    """Convert a Hijri date using the tabular (arithmetic) Islamic calendar"""
+    julian_day = (day + (59 * (month - 1) + 1) // 2 + (year - 1) * 354 + (3 + 11 * year) // 30
+                  + 1948439)
+    return date.fromordinal(julian_day - 1721425)
+
+def generate_saudi_holidays(year):
+    """Saudi public holidays for a Gregorian year; Hijri dates may be a day off the sighted moon"""
+    holidays = {
+        date(year, 1, 1): "New Year's Day",
+        date(year, 2, 22): "Foundation Day",
+        date(year, 9, 23): "Saudi National Day",
+    }
+    # A Gregorian year overlaps two or three Hijri years
+    first_hijri_year = (year - 622) * 33 // 32
+    for hijri_year in range(first_hijri_year - 1, first_hijri_year + 3):
+        hijri_dates = [
+            ((hijri_year, 10, 1), "Eid al-Fitr (Day 1)"),
+            ((hijri_year, 10, 2), "Eid al-Fitr (Day 2)"),
+            ((hijri_year, 10, 3), "Eid al-Fitr (Day 3)"),
+            ((hijri_year, 12, 10), "Eid al-Adha (Day 1)"),
+            ((hijri_year, 12, 11), "Eid al-Adha (Day 2)"),
+            ((hijri_year, 12, 12), "Eid al-Adha (Day 3)"),
+            ((hijri_year, 1, 1), "Islamic New Year"),
+            ((hijri_year, 3, 12), "Prophet's Birthday"),
+        ]
+        for hijri_date, name in hijri_dates:
+            day = hijri_to_gregorian(*hijri_date)
+            if day.year == year:
+                holidays.setdefault(day, name)
+    return holidays
+
+HOLIDAY_GENERATORS = {
+    'SA': generate_saudi_holidays,
+}
+
+def load_observed_holidays(path, region):
+    """Observed holidays for a region from the holidays file, grouped by year"""
+    observed = {}
+    if not path or not os.path.exists(path):
+        return observed
+    with open(path, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            if row['region'] != region:
+                continue
+            day = date.fromisoformat(row['date'])
+            observed.setdefault(day.year, {})[day] = row['name']
+    return observed
+
+class HolidayCalendar:
+    """Immutable holiday set: a 366-bit bitmap per year for membership, sorted ordinals for range counts"""
+
+    def __init__(self, holidays):
+        self._names = {day.toordinal(): name for day, name in holidays.items()}
+        self._ordinals = np.array(sorted(self._names), dtype=np.int64)
+        bitmaps = {}
+        for day in holidays:
+            bitmap = bitmaps.setdefault(day.year, bytearray(46))
+            offset = day.timetuple().tm_yday - 1
+            bitmap[offset >> 3] |= 1 << (offset & 7)
+        self._bitmaps = {year: bytes(bitmap) for year, bitmap in bitmaps.items()}
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def is_holiday(self, day):
+        bitmap = self._bitmaps.get(day.year)
+        if bitmap is None:
+            return False
+        offset = day.timetuple().tm_yday - 1
+        return bool(bitmap[offset >> 3] & (1 << (offset & 7)))
+
+    def name(self, day):
+        """Holiday name for a date, or None on ordinary days"""
+        if not self.is_holiday(day):
+            return None
+        return self._names[day.toordinal()]
+
+    def count(self, start_date, end_date):
+        """Holidays in the inclusive [start, end] range"""
+        first = np.searchsorted(self._ordinals, start_date.toordinal(), side='left')
+        last = np.searchsorted(self._ordinals, end_date.toordinal(), side='right')
+        return int(max(last - first, 0))
+
+    def dates(self):
+        return np.array([date.fromordinal(int(ordinal)) for ordinal in self._ordinals],
+                        dtype='datetime64[D]')
+
+def build_holiday_calendar(region, first_year, last_year, path=HOLIDAYS_FILE):
+    observed = load_observed_holidays(path, region)
+    generate = HOLIDAY_GENERATORS.get(region)
+    holidays = {}
+    for year in range(first_year, last_year + 1):
+        if year in observed:
+            holidays.update(observed[year])
+        elif generate is not None:
+            holidays.update(generate(year))
+    return HolidayCalendar(holidays)
+
+@st.cache_resource
+def get_holiday_calendar(region, first_year, last_year, path=HOLIDAYS_FILE):
+    return build_holiday_calendar(region, first_year, last_year, path)
+
+def holiday_calendar():
+    return get_holiday_calendar(HOLIDAY_REGION, *WORKING_DAY_YEARS)
+
+# Working-day calendar
+SAUDI_WEEKEND = (4, 5)  # Friday, Saturday
+WORKING_DAY_YEARS = (int(os.environ.get("LEAVE_PLANNER_CALENDAR_FIRST_YEAR", "2020")),
+                     int(os.environ.get("LEAVE_PLANNER_CALENDAR_LAST_YEAR", "2035")))
+# Leave outside WORKING_DAY_YEARS gets holidays generated on demand within these bounds
+FALLBACK_HOLIDAY_YEARS = (1900, 2199)
+
+class WorkingDayCalendar:
+    """Cumulative working-day counts over a year range, so any range count is one subtraction"""
+
+    def __init__(self, first_year, last_year, weekend=SAUDI_WEEKEND, holidays=(), holidays_for_years=None):
+        self.first_day = np.datetime64(f"{first_year}-01-01", 'D')
+        self.last_day = np.datetime64(f"{last_year}-12-31", 'D')
+        self.weekmask = [0 if weekday in weekend else 1 for weekday in range(7)]
+        self.holidays = np.array(sorted(holidays), dtype='datetime64[D]')
+        # Called with (first_year, last_year) for the holiday dates of ranges outside the precomputed years
+        self.holidays_for_years = holidays_for_years
+        
+        days = np.arange(self.first_day, self.last_day + 1)
+        weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        working = ~np.isin(weekdays, weekend) & ~np.isin(days, self.holidays)
+        self._cumulative = np.concatenate(([0], np.cumsum(working, dtype=np.int64)))
+
+    def count(self, start_date, end_date):
+        return int(self.count_many([start_date], [end_date])[0])
+
+    def count_many(self, start_dates, end_dates):
+        """Working days in each inclusive [start, end] pair; accepts arrays of dates or ISO strings"""
+        starts = np.asarray(start_dates, dtype='datetime64[D]')
+        ends = np.asarray(end_dates, dtype='datetime64[D]')
+        result = np.zeros(starts.shape, dtype=np.int64)
+        
+        valid = starts <= ends
+        inside = valid & (starts >= self.first_day) & (ends <= self.last_day)
+        start_index = (starts[inside] - self.first_day).astype(np.int64)
+        end_index = (ends[inside] - self.first_day).astype(np.int64)
+        result[inside] = self._cumulative[end_index + 1] - self._cumulative[start_index]
+        
+        # Ranges reaching outside the precomputed years fall back to NumPy's business-day counter
+        outside = valid & ~inside
+        if outside.any():
+            holidays = self.holidays
+            if self.holidays_for_years is not None:
+                years = np.concatenate([starts[outside], ends[outside]]).astype('datetime64[Y]').astype(np.int64) + 1970
+                holidays = self.holidays_for_years(int(years.min()), int(years.max()))
+            result[outside] = np.busday_count(starts[outside], ends[outside] + 1,
+                                              weekmask=self.weekmask, holidays=holidays)
+        return result
+
+@st.cache_resource
+def get_working_day_calendar(region, first_year, last_year):
+    holidays = get_holiday_calendar(region, first_year, last_year)
+    
+    def holidays_for_years(first, last):
+        first, last = max(first, FALLBACK_HOLIDAY_YEARS[0]), min(last, FALLBACK_HOLIDAY_YEARS[1])
+        return get_holiday_calendar(region, first, last).dates()
+    
+    return WorkingDayCalendar(first_year, last_year, SAUDI_WEEKEND, holidays.dates(), holidays_for_years)
+
+@timed
+def calculate_working_days(start_date, end_date):
+    """Calculate working days excluding weekends and holidays"""
+    return get_working_day_calendar(HOLIDAY_REGION, *WORKING_DAY_YEARS).count(start_date, end_date)
+
+@timed
+def calculate_working_days_many(start_dates, end_dates):
+    return get_working_day_calendar(HOLIDAY_REGION, *WORKING_DAY_YEARS).count_many(start_dates, end_dates)
+
+# Search
+# bm25 column weights for (full_name, reason, leave_type): a name hit outranks a reason or type hit
+LEAVE_SEARCH_WEIGHTS = (5.0, 1.0, 2.0)
+
+def leave_search_query(text):
+    """FTS5 query matching every word of free text as a prefix, or "" when there is nothing to search for"""
+    return " ".join(f'"{term}"*' for term in re.findall(r"\w+", text.lower()))
+
+def _leave_search_source(query, status, department, start_day, end_day):
+    """FROM ... WHERE ... and its parameters for a search; without a query it is a plain filtered listing"""
+    clauses, params = _leave_request_filters(status, department)
+    if start_day is not None and end_day is not None:
+        # Overlap tests can't use an index on their own; the month buckets narrow the rows first
+        clauses.append("lr.id IN (SELECT request_id FROM leave_request_months WHERE month BETWEEN ? AND ?)")
+        params.extend([month_key(date.fromordinal(start_day)), month_key(date.fromordinal(end_day))])
+    if start_day is not None:
+        clauses.append("lr.end_day >= ?")
+        params.append(start_day)
+    if end_day is not None:
+        clauses.append("lr.start_day <= ?")
+        params.append(end_day)
+    source = "leave_requests lr"
+    if query:
+        # CROSS JOIN keeps the MATCH as the outer loop; otherwise SQLite may re-run it for every filtered row
+        source = "leave_search CROSS JOIN leave_requests lr ON lr.id = leave_search.rowid"
+        clauses.insert(0, "leave_search MATCH ?")
+        params.insert(0, query)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"FROM {source} JOIN users u ON lr.user_id = u.id {where}", params
+
+@cached_read
+def count_leave_search(query, status=None, department=None, start_day=None, end_day=None):
+    """Matching requests; text searches stop counting past SEARCH_RESULT_LIMIT"""
+    require_sqlite_backend("Search")
+    source, params = _leave_search_source(query, status, department, start_day, end_day)
+    sql = f"SELECT COUNT(*) {source}"
+    if query:
+        sql = f"SELECT COUNT(*) FROM (SELECT 1 {source} LIMIT ?)"
+        params.append(SEARCH_RESULT_LIMIT + 1)
+    with db_connection() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+@cached_read
+def search_leave_requests(query, status=None, department=None, start_day=None, end_day=None, page_size=25, offset=0,
+                          ranked=True):
+    """One page of requests matching a leave_search_query, best match first when ranked, else newest first"""
+    require_sqlite_backend("Search")
+    source, params = _leave_search_source(query, status, department, start_day, end_day)
+    if query and ranked:
+        # bm25 scores every match, so it only runs once the count is known to be small
+        weights = ", ".join(map(str, LEAVE_SEARCH_WEIGHTS))
+        columns, order = f"bm25(leave_search, {weights}) AS search_rank", "search_rank, lr.request_day DESC, lr.id DESC"
+    elif query:
+        # FTS5 walks its doclist newest rowid first, so the page is found without sorting every match
+        columns, order = "NULL AS search_rank", "leave_search.rowid DESC"
+    else:
+        columns, order = "NULL AS search_rank", "lr.request_day DESC, lr.id DESC"
+    sql = f"""
+    SELECT lr.*, u.full_name, u.department, {columns}
+    {source}
+    ORDER BY {order}
+    LIMIT ? OFFSET ?
+    """
+    with db_connection() as conn:
+        df = pd.read_sql_query(sql, conn, params=params + [page_size, offset])
+    return df
+
+# Leave archive
+# Decided requests past the horizon move to leave_archive_<start year> tables shaped like leave_requests
+DECIDED_LEAVE_STATUSES = ('approved', 'rejected')
+ARCHIVE_BATCH_SIZE = int(os.environ.get("LEAVE_PLANNER_ARCHIVE_BATCH_SIZE", "5000"))
+
+def leave_archive_table(year):
+    return f"leave_archive_{int(year)}"
+
+def leave_archive_years(c):
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'leave_archive_[0-9]*'")
+    return sorted(int(name.rsplit("_", 1)[1]) for (name,) in c.fetchall())
+
+def leave_history_tables(c, first_day=None, last_day=None):
+    """leave_requests followed by the archive tables that can hold leave overlapping [first_day, last_day]"""
+    years = leave_archive_years(c)
+    if first_day is not None:
+        # Leave starting in December runs into the next year
+        years = [year for year in years if year >= date.fromordinal(first_day).year - 1]
+    if last_day is not None:
+        years = [year for year in years if year <= date.fromordinal(last_day).year]
+    return ['leave_requests'] + [leave_archive_table(year) for year in years]
+
+def union_leave_tables(query, params, tables):
+    """The query, reading `{table}`, repeated over each table with UNION ALL"""
+    return " UNION ALL ".join(query.format(table=table) for table in tables), list(params) * len(tables)
+
+def leave_archive_horizon():
+    """Day number before which decided leave may be archived; never inside the active-leave snapshot"""
+    return min(date(date.today().year - ARCHIVE_AFTER_YEARS, 1, 1).toordinal(), active_leave_first_day())
+
+def _create_leave_archive(c, year):
+    table = leave_archive_table(year)
+    c.execute("PRAGMA table_info(leave_requests)")
+    columns = ", ".join(f"{name} {kind}{' PRIMARY KEY' if pk else ''}" for _, name, kind, _, _, pk in c.fetchall())
+    c.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_days ON {table} (user_id, start_day, end_day)")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_days ON {table} (start_day, end_day)")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_request_day ON {table} (request_day)")
+    return table
+
+@timed
+def archive_leave_history(before_day=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move decided requests ending before day number before_day into the archives; returns {year: requests moved}"""
+    require_sqlite_backend("Archiving")
+    # Leave the snapshot covers stays put, so the default views never need the archives
+    before_day = leave_archive_horizon() if before_day is None else min(before_day, active_leave_first_day())
+    placeholders = ",".join("?" * len(DECIDED_LEAVE_STATUSES))
+    # start_day <= end_day, so the start_day bound lets the (start_day, end_day) index find the candidates.
+    # The newest id stays behind so new requests never reuse an archived id
+    candidates = f"""
+    SELECT id, start_day FROM leave_requests
+    WHERE start_day < ? AND end_day < ? AND status IN ({placeholders})
+    AND id < (SELECT MAX(id) FROM leave_requests)
+    LIMIT ?
+    """
+    moved = {}
+    with db_connection() as conn:
+        c = conn.cursor()
+        while True:
+            # One short transaction per batch, so submissions and approvals carry on in between
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute(candidates, (before_day, before_day, *DECIDED_LEAVE_STATUSES, batch_size))
+                batch = c.fetchall()
+                by_year = {}
+                for request_id, start_day in batch:
+                    by_year.setdefault(date.fromordinal(start_day).year, []).append(request_id)
+                for year, request_ids in by_year.items():
+                    table = _create_leave_archive(c, year)
+                    for chunk in _chunked(request_ids):
+                        ids = ",".join("?" * len(chunk))
+                        c.execute(f"INSERT INTO {table} SELECT * FROM leave_requests WHERE id IN ({ids})", chunk)
+                        c.execute(f"DELETE FROM leave_request_months WHERE request_id IN ({ids})", chunk)
+                        c.execute(f"DELETE FROM leave_requests WHERE id IN ({ids})", chunk)
+                    moved[year] = moved.get(year, 0) + len(request_ids)
+                bump_data_version(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if len(batch) < batch_size:
+                break
+    
+    if moved:
+        invalidate_read_cache()
+        active_leave_store().mark_stale()
+    return dict(sorted(moved.items()))
+
+def leave_archive_stats():
+    """Requests held in each archive table, keyed by year"""
+    require_sqlite_backend("Archiving")
+    with db_connection() as conn:
+        c = conn.cursor()
+        return {year: c.execute(f"SELECT COUNT(*) FROM {leave_archive_table(year)}").fetchone()[0]
+                for year in leave_archive_years(c)}
+
+# Leave history export
+EXPORT_COLUMNS = ['id', 'user_id', 'username', 'full_name', 'department', 'leave_type', 'start_date',
+                  'end_date', 'status', 'request_date', 'approved_by', 'reason']
+EXPORT_CHUNK_SIZE = int(os.environ.get("LEAVE_PLANNER_EXPORT_CHUNK_SIZE", "10000"))
+
+def iter_leave_history(start_date=None, end_date=None, department=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield leave history rows, archives included, in fixed-size chunks straight off the cursor, oldest request first"""
+    clauses, params = [], []
+    if start_date:
+        clauses.append("lr.end_day >= ?")
+        params.append(day_ordinal(start_date))
+    if end_date:
+        clauses.append("lr.start_day <= ?")
+        params.append(day_ordinal(end_date))
+    if department:
+        clauses.append("u.department = ?")
+        params.append(department)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+    SELECT lr.id, lr.user_id, u.username, u.full_name, u.department, lr.leave_type, lr.start_date,
+           lr.end_date, lr.status, lr.request_date, lr.approved_by, lr.reason
+    FROM {{table}} lr
+    LEFT JOIN users u ON lr.user_id = u.id
+    {where}
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        tables = leave_history_tables(c, day_ordinal(start_date) if start_date else None,
+                                      day_ordinal(end_date) if end_date else None)
+        # Every table is read in id order and the branches merged, so nothing is sorted up front
+        query, params = union_leave_tables(query, params, tables)
+        c.execute(f"{query} ORDER BY lr.id", params)
+        while True:
+            batch = c.fetchmany(chunk_size)
+            if not batch:
+                break
+            yield batch
+
+def _export_csv(output, chunks):
+    rows = 0
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in chunks:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+def _export_parquet(output, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    
+    schema = pa.schema([(column, pa.int64() if column in ('id', 'user_id') else pa.string())
+                        for column in EXPORT_COLUMNS])
+    rows = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        # One row group per chunk keeps memory bounded by the chunk size
+        for batch in chunks:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays([pa.array(values, type=field.type)
+                                                     for values, field in zip(columns, schema)], schema=schema))
+            rows += len(batch)
+    return rows
+
+@timed
+def export_leave_history(output, fmt="csv", start_date=None, end_date=None, department=None,
+                         chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream leave history joined with users to a CSV or Parquet file; returns the number of rows written"""
+    require_sqlite_backend("Leave history export")
+    chunks = iter_leave_history(start_date, end_date, department, chunk_size)
+    if fmt == "csv":
+        return _export_csv(output, chunks)
+    if fmt == "parquet":
+        return _export_parquet(output, chunks)
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+# Bulk import
+VALID_ROLES = ('admin', 'manager', 'employee')
+VALID_STATUSES = ('pending', 'approved', 'rejected')
+IMPORT_CHUNK_SIZE = int(os.environ.get("LEAVE_PLANNER_IMPORT_CHUNK_SIZE", "100000"))
+
+def _drop_secondary_indexes(c, table):
+    """Drop a table's explicit indexes, returning the SQL needed to recreate them"""
+    c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+    indexes = c.fetchall()
+    for name, _ in indexes:
+        c.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+def _blank(values):
+    return values.str.strip() == ""
+
+def _validate_users(chunk, seen_usernames):
+    """Row errors for a users chunk; seen_usernames holds the usernames accepted from earlier chunks"""
+    chunk = chunk.assign(username=chunk['username'].str.strip(), role=chunk['role'].str.strip().str.lower())
+    errors = pd.Series("", index=chunk.index)
+    errors[_blank(chunk['username'])] = "missing username"
+    errors[(errors == "") & _blank(chunk['password'])] = "missing password"
+    errors[(errors == "") & ~chunk['role'].isin(VALID_ROLES)] = "invalid role"
+    errors[(errors == "") & _blank(chunk['department'])] = "missing department"
+    balance = pd.to_numeric(chunk['annual_leave_balance'].replace("", "30"), errors='coerce')
+    # NaN, inf and overflowed values like 1e400 all fail isfinite; fractional days are rejected too
+    whole = np.isfinite(balance) & (balance == np.floor(balance))
+    errors[(errors == "") & ~whole] = "invalid annual_leave_balance"
+    # Only otherwise valid rows claim a username, so a bad first copy doesn't block a good second one
+    usernames = chunk['username'].where(errors == "")
+    errors[(errors == "") & (usernames.duplicated() | usernames.isin(seen_usernames))] = "duplicate username in file"
+    return chunk.assign(annual_leave_balance=balance), errors
+
+def _timestamps_to_ordinals(timestamps):
+    days = timestamps.to_numpy(dtype='datetime64[D]', na_value=np.datetime64('NaT'))
+    return np.where(np.isnat(days), 0, days.astype(np.int64) + EPOCH_ORDINAL)
+
+def _validate_leave_requests(chunk, user_ids):
+    starts = pd.to_datetime(chunk['start_date'], format="%Y-%m-%d", errors='coerce')
+    ends = pd.to_datetime(chunk['end_date'], format="%Y-%m-%d", errors='coerce')
+    requested = pd.to_datetime(chunk['request_date'].where(~_blank(chunk['request_date']), chunk['start_date']),
+                               format="%Y-%m-%d", errors='coerce')
+    status = chunk['status'].str.strip().str.lower().replace("", "pending")
+    user_id = chunk['username'].str.strip().map(user_ids)
     
-    for user in sample_users:
-        c.execute("INSERT OR IGNORE INTO users (username, password, full_name, role, department) VALUES (?, ?, ?, ?, ?)", user)
-    
-    # Add sample leave requests
-    sample_requests = [
-        (2, "2024-10-15", "2024-10-17", "Annual Leave", "Family vacation", "approved", "2024-10-01", "admin"),
-        (3, "2024-11-10", "2024-11-12", "Annual Leave", "Personal matters", "pending", "2024-10-25", ""),
-        (4, "2024-11-05", "2024-11-07", "Sick Leave", "Medical appointment", "approved", "2024-10-28", "admin"),
-        (2, "2024-12-20", "2024-12-22", "Annual Leave", "Wedding", "pending", "2024-11-01", ""),
-        (5, "2024-11-15", "2024-11-16", "Annual Leave", "Personal", "approved", "2024-11-01", "admin"),
-        (6, "2024-12-01", "2024-12-03", "Annual Leave", "Holiday", "pending", "2024-11-15", "")
-    ]
+    errors = pd.Series("", index=chunk.index)
+    errors[user_id.isna()] = "unknown username"
+    errors[(errors == "") & (starts.isna() | ends.isna())] = "invalid start_date/end_date"
+    errors[(errors == "") & (ends < starts)] = "end_date before start_date"
+    errors[(errors == "") & requested.isna()] = "invalid request_date"
+    errors[(errors == "") & ~status.isin(VALID_STATUSES)] = "invalid status"
+    errors[(errors == "") & _blank(chunk['leave_type'])] = "missing leave_type"
     
-    for req in sample_requests:
-        c.execute("INSERT OR IGNORE INTO leave_requests (user_id, start_date, end_date, leave_type, reason, status, request_date, approved_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", req)
+    valid = chunk.assign(
+        user_id=user_id,
+        start_date=starts.dt.strftime("%Y-%m-%d"),
+        end_date=ends.dt.strftime("%Y-%m-%d"),
+        request_date=requested.dt.strftime("%Y-%m-%d"),
+        start_day=_timestamps_to_ordinals(starts),
+        end_day=_timestamps_to_ordinals(ends),
+        request_day=_timestamps_to_ordinals(requested),
+        status=status
+    )
+    return valid, errors
+
+def _import_csv(path, columns, chunk_size, rejected_path, load_chunk):
+    """Validate and load a CSV chunk by chunk; returns row counts and where rejected rows were written"""
+    read = imported = skipped = rejected = 0
+    rejected_header = True
+    for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        for column, default in columns.items():
+            if column not in chunk:
+                if default is None:
+                    raise ValueError(f"{path} is missing required column '{column}'")
+                chunk[column] = default
+        read += len(chunk)
+        valid, errors = load_chunk(chunk)
+        bad = errors != ""
+        imported += int((~bad).sum()) - valid.attrs.get('ignored', 0)
+        skipped += valid.attrs.get('ignored', 0)
+        rejected += int(bad.sum())
+        if rejected_path and bad.any():
+            chunk[bad].assign(error=errors[bad]).to_csv(rejected_path, mode="w" if rejected_header else "a",
+                                                        header=rejected_header, index=False)
+            rejected_header = False
     
-    conn.commit()
-    conn.close()
+    return {
+        'rows_read': read,
+        'rows_imported': imported,
+        'rows_skipped': skipped,
+        'rows_rejected': rejected,
+        'rejected_path': rejected_path if rejected else None,
+    }
 
-def hash_password(password):
-    return hashlib.md5(password.encode()).hexdigest()
+def _with_throughput(summary, started):
+    seconds = time.perf_counter() - started
+    summary['seconds'] = round(seconds, 2)
+    summary['rows_per_second'] = round(summary['rows_read'] / seconds) if seconds else summary['rows_read']
+    return summary
 
-def authenticate_user(username, password):
-    conn = sqlite3.connect('leave_planner.db')
-    c = conn.cursor()
-    hashed_password = hash_password(password)
-    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, hashed_password))
-    user = c.fetchone()
-    conn.close()
-    return user
-
-def get_user_leave_requests(user_id):
-    conn = sqlite3.connect('leave_planner.db')
-    df = pd.read_sql_query("SELECT * FROM leave_requests WHERE user_id = ? ORDER BY request_date DESC", conn, params=(user_id,))
-    conn.close()
-    return df
+def import_users_csv(path, chunk_size=IMPORT_CHUNK_SIZE, rejected_path=None):
+    """Bulk-load users (username, password, full_name, role, department[, annual_leave_balance]) from CSV"""
+    require_sqlite_backend("Bulk import")
+    started = time.perf_counter()
+    columns = {'username': None, 'password': None, 'full_name': "", 'role': None, 'department': None,
+               'annual_leave_balance': ""}
+    seen_usernames = set()
+    with db_connection() as conn:
+        c = conn.cursor()
+        
+        def load_chunk(chunk):
+            valid, errors = _validate_users(chunk, seen_usernames)
+            valid = valid[errors == ""]
+            seen_usernames.update(valid['username'].tolist())
+            rows = list(zip(valid['username'].tolist(),
+                            [hash_password(password) for password in valid['password'].tolist()],
+                            valid['full_name'].tolist(), valid['role'].tolist(),
+                            valid['department'].str.strip().tolist(),
+                            valid['annual_leave_balance'].astype(int).tolist()))
+            before = conn.total_changes
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.executemany("INSERT OR IGNORE INTO users (username, password, full_name, role, department, annual_leave_balance) VALUES (?, ?, ?, ?, ?, ?)",
+                              rows)
+                inserted = conn.total_changes - before
+                bump_data_version(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            # Usernames already in the database are skipped rather than overwritten
+            valid.attrs['ignored'] = len(valid) - inserted
+            return valid, errors
+        
+        summary = _import_csv(path, columns, chunk_size, rejected_path, load_chunk)
+    invalidate_read_cache()
+    return _with_throughput(summary, started)
 
-def get_all_leave_requests():
-    conn = sqlite3.connect('leave_planner.db')
-    query = """
-    SELECT lr.*, u.full_name, u.department 
-    FROM leave_requests lr 
-    JOIN users u ON lr.user_id = u.id 
-    ORDER BY lr.request_date DESC
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+def import_leave_requests_csv(path, chunk_size=IMPORT_CHUNK_SIZE, rejected_path=None):
+    """Bulk-load historical leave (username, start_date, end_date, leave_type[, reason, status, request_date, approved_by])"""
+    require_sqlite_backend("Bulk import")
+    started = time.perf_counter()
+    columns = {'username': None, 'start_date': None, 'end_date': None, 'leave_type': None, 'reason': "",
+               'status': "", 'request_date': "", 'approved_by': ""}
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT username, id FROM users")
+        user_ids = dict(c.fetchall())
+        
+        # Build indexes and derived tables once at the end instead of row by row
+        c.execute("BEGIN IMMEDIATE")
+        index_sql = _drop_secondary_indexes(c, 'leave_requests')
+        conn.commit()
+        
+        def load_chunk(chunk):
+            valid, errors = _validate_leave_requests(chunk, user_ids)
+            valid = valid[errors == ""]
+            rows = list(zip(valid['user_id'].astype(int).tolist(), valid['start_date'].tolist(),
+                            valid['end_date'].tolist(), valid['leave_type'].str.strip().tolist(),
+                            valid['reason'].tolist(), valid['status'].tolist(),
+                            valid['request_date'].tolist(), valid['approved_by'].tolist(),
+                            valid['start_day'].tolist(), valid['end_day'].tolist(), valid['request_day'].tolist()))
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.executemany("INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, status, request_date, approved_by, start_day, end_day, request_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              rows)
+                bump_data_version(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return valid, errors
+        
+        try:
+            summary = _import_csv(path, columns, chunk_size, rejected_path, load_chunk)
+        finally:
+            # A failed chunk must not leave a transaction open, or the indexes below would never come back
+            if conn.in_transaction:
+                conn.rollback()
+            c.execute("BEGIN IMMEDIATE")
+            for sql in index_sql:
+                c.execute(sql)
+            rebuild_derived_tables(c)
+            bump_data_version(c)
+            conn.commit()
+    invalidate_read_cache()
+    active_leave_store().mark_stale()
+    return _with_throughput(summary, started)
 
-def get_team_leave_requests(manager_department):
-    conn = sqlite3.connect('leave_planner.db')
-    query = """
-    SELECT lr.*, u.full_name, u.department 
-    FROM leave_requests lr 
-    JOIN users u ON lr.user_id = u.id 
-    WHERE u.department = ? AND u.role != 'manager'
-    ORDER BY lr.request_date DESC
-    """
-    df = pd.read_sql_query(query, conn, params=(manager_department,))
-    conn.close()
-    return df
+# Calendar occupancy
+LEAVE_STATUS_EMOJI = {
+    'approved': '🟢',
+    'pending': '🟡',
+    'rejected': '🔴'
+}
 
-def submit_leave_request(user_id, start_date, end_date, leave_type, reason):
-    conn = sqlite3.connect('leave_planner.db')
-    c = conn.cursor()
-    request_date = datetime.now().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, request_date) VALUES (?, ?, ?, ?, ?, ?)",
-              (user_id, start_date, end_date, leave_type, reason, request_date))
-    conn.commit()
-    conn.close()
+STATUS_DISPLAY = {
+    'pending': {'color': '🟡', 'bg': '#FFF3CD', 'text': 'Pending Review'},
+    'approved': {'color': '🟢', 'bg': '#D4EDDA', 'text': 'Approved'},
+    'rejected': {'color': '🔴', 'bg': '#F8D7DA', 'text': 'Rejected'}
+}
 
-def update_leave_status(request_id, status, approved_by):
-    conn = sqlite3.connect('leave_planner.db')
-    c = conn.cursor()
-    c.execute("UPDATE leave_requests SET status = ?, approved_by = ? WHERE id = ?", (status, approved_by, request_id))
-    conn.commit()
-    conn.close()
+@timed
+def prepare_request_rows(requests):
+    """Add parsed dates, day counts and status display columns to a request DataFrame in one vectorised pass"""
+    requests = requests.copy()
+    starts = pd.Series(leave_days(requests, 'start_date'), index=requests.index)
+    ends = pd.Series(leave_days(requests, 'end_date'), index=requests.index)
+    requests['start'] = starts.dt.date
+    requests['end'] = ends.dt.date
+    requests['total_days'] = (ends - starts).dt.days + 1
+    requests['working_days'] = calculate_working_days_many(starts.to_numpy().astype('datetime64[D]'),
+                                                           ends.to_numpy().astype('datetime64[D]'))
+    requests['status_emoji'] = requests['status'].map(LEAVE_STATUS_EMOJI).fillna('⚪')
+    requests['status_text'] = requests['status'].map({status: config['text'] for status, config in STATUS_DISPLAY.items()}).fillna(STATUS_DISPLAY['pending']['text'])
+    requests['status_title'] = requests['status'].str.title()
+    return requests
 
-def get_leave_for_date_range(start_date, end_date, user_id=None):
-    conn = sqlite3.connect('leave_planner.db')
-    if user_id:
-        query = """
-        SELECT lr.*, u.full_name, u.department 
-        FROM leave_requests lr 
-        JOIN users u ON lr.user_id = u.id 
-        WHERE lr.user_id = ? AND lr.start_date <= ? AND lr.end_date >= ?
-        """
-        df = pd.read_sql_query(query, conn, params=(user_id, end_date, start_date))
-    else:
-        query = """
-        SELECT lr.*, u.full_name, u.department 
-        FROM leave_requests lr 
-        JOIN users u ON lr.user_id = u.id 
-        WHERE lr.start_date <= ? AND lr.end_date >= ?
-        """
-        df = pd.read_sql_query(query, conn, params=(end_date, start_date))
-    conn.close()
-    return df
+def _expand_leave_days(leave_data, start_date, num_days):
+    """(row, day offset) pairs for every day of leave inside a window starting at start_date"""
+    if leave_data.empty:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    window_start = np.datetime64(start_date, 'D')
+    starts = (leave_days(leave_data, 'start_date') - window_start).astype(np.int64)
+    ends = (leave_days(leave_data, 'end_date') - window_start).astype(np.int64)
+    
+    # Clip each interval to the window and expand it into (row, day offset) pairs
+    return expand_intervals(np.clip(starts, 0, None), np.clip(ends, None, num_days - 1))
 
-def get_saudi_holidays():
-    # Saudi Arabia public holidays (approximate dates for 2024-2025)
-    holidays = {
-        "2024-01-01": "New Year's Day",
-        "2024-04-10": "Eid al-Fitr (Day 1)",
-        "2024-04-11": "Eid al-Fitr (Day 2)",
-        "2024-04-12": "Eid al-Fitr (Day 3)",
-        "2024-06-16": "Eid al-Adha (Day 1)",
-        "2024-06-17": "Eid al-Adha (Day 2)",
-        "2024-06-18": "Eid al-Adha (Day 3)",
-        "2024-07-07": "Islamic New Year",
-        "2024-09-16": "Prophet's Birthday",
-        "2024-09-23": "Saudi National Day",
-        "2024-11-01": "Foundation Day",
-        "2025-01-01": "New Year's Day",
-        "2025-03-30": "Eid al-Fitr (Day 1)",
-        "2025-03-31": "Eid al-Fitr (Day 2)",
-        "2025-04-01": "Eid al-Fitr (Day 3)",
-        "2025-06-06": "Eid al-Adha (Day 1)",
-        "2025-06-07": "Eid al-Adha (Day 2)",
-        "2025-06-08": "Eid al-Adha (Day 3)",
-        "2025-06-26": "Islamic New Year",
-        "2025-09-05": "Prophet's Birthday",
-        "2025-09-23": "Saudi National Day",
-        "2025-11-01": "Foundation Day"
+@timed
+def build_daily_occupancy(leave_data, start_date, end_date):
+    """Expand leave intervals into per-day status counts and name lists in one vectorised pass"""
+    num_days = (end_date - start_date).days + 1
+    rows, days = _expand_leave_days(leave_data, start_date, num_days)
+    statuses = leave_data['status'].to_numpy() if not leave_data.empty else np.zeros(0, dtype=object)
+    
+    counts = {}
+    for status in pd.unique(statuses):
+        counts[status] = np.bincount(days[statuses[rows] == status], minlength=num_days)
+    
+    # Group row positions by day, keeping the original row order within each day
+    order = np.argsort(days, kind='stable')
+    day_rows = np.split(rows[order], np.searchsorted(days[order], np.arange(1, num_days)))
+    
+    if 'full_name' in leave_data:
+        full_names = leave_data['full_name'].to_numpy()
+        names = [full_names[positions].tolist() for positions in day_rows]
+    else:
+        names = [[] for _ in day_rows]
+    
+    return {
+        'start_date': start_date,
+        'counts': counts,
+        'rows': day_rows,
+        'names': names
     }
-    return holidays
 
-def calculate_working_days(start_date, end_date):
-    """Calculate working days excluding weekends and holidays"""
-    start = datetime.strptime(start_date, "%Y-%m-%d").date()
-    end = datetime.strptime(end_date, "%Y-%m-%d").date()
-    holidays = get_saudi_holidays()
+@timed
+def build_leave_heatmap(leave_data, start_date, end_date, group_column):
+    """Absences per day for each group and status over a span, counted in one vectorised pass"""
+    num_days = (end_date - start_date).days + 1
+    rows, days = _expand_leave_days(leave_data, start_date, num_days)
+    if not rows.size:
+        return pd.DataFrame({group_column: pd.Series(dtype=object), 'status': pd.Series(dtype=object),
+                             'day': pd.Series(dtype='datetime64[s]'), 'absences': pd.Series(dtype=np.int64)})
     
-    working_days = 0
-    current_date = start
+    group_codes, groups = pd.factorize(leave_data[group_column].fillna(''))
+    status_codes, statuses = pd.factorize(leave_data['status'])
     
-    while current_date <= end:
-        # Skip weekends (Friday=4, Saturday=5 in Saudi Arabia)
-        if current_date.weekday() not in [4, 5]:
-            # Skip holidays
-            if current_date.strftime("%Y-%m-%d") not in holidays:
-                working_days += 1
-        current_date += timedelta(days=1)
-    
-    return working_days
+    # One flat bin per (group, status, day) cell
+    cells = (group_codes[rows] * len(statuses) + status_codes[rows]) * num_days + days
+    counts = np.bincount(cells, minlength=len(groups) * len(statuses) * num_days)
+    occupied = np.flatnonzero(counts)
+    combos, day_offsets = np.divmod(occupied, num_days)
+    group_index, status_index = np.divmod(combos, len(statuses))
+    return pd.DataFrame({
+        group_column: np.asarray(groups)[group_index],
+        'status': np.asarray(statuses)[status_index],
+        'day': np.datetime64(start_date, 'D') + day_offsets,
+        'absences': counts[occupied]
+    })
 
-def create_admin_calendar_view():
-    st.subheader("📅 Admin Calendar - All Staff Leave")
+def render_leave_heatmap(heatmap, group_column, group_title, statuses):
+    """Day x group heatmap of absences in the selected statuses"""
+    heatmap = heatmap[heatmap['status'].isin(statuses)]
+    if heatmap.empty:
+        st.info("No leave in the selected statuses for this period.")
+        return
+    daily = heatmap.groupby([group_column, 'day'], as_index=False)['absences'].sum()
+    daily['next_day'] = daily['day'] + pd.Timedelta(days=1)
+    chart = alt.Chart(daily).mark_rect().encode(
+        x=alt.X('day:T', title=None),
+        x2='next_day:T',
+        y=alt.Y(f'{group_column}:N', title=group_title),
+        color=alt.Color('absences:Q', title="People off", scale=alt.Scale(scheme='orangered')),
+        tooltip=[alt.Tooltip(f'{group_column}:N', title=group_title), alt.Tooltip('day:T', title="Date"),
+                 alt.Tooltip('absences:Q', title="People off")]
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+def show_calendar_summary(leave_data, period, start_date, end_date):
+    st.markdown(f"### {period} Summary")
+    if not leave_data.empty:
+        # Counts come from the monthly rollups; the calendar spans are always whole months
+        first_month = month_key(start_date)
+        rollups = get_leave_rollups(first_month, month_key(end_date))
+        status_counts = rollup_request_counts(rollups, first_month, 'status')
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Approved Requests", int(status_counts.get('approved', 0)))
+        
+        with col2:
+            st.metric("Pending Requests", int(status_counts.get('pending', 0)))
+        
+        with col3:
+            st.metric("Rejected Requests", int(status_counts.get('rejected', 0)))
+        
+        with col4:
+            st.metric("Total Leave Days", int(rollups['calendar_days'].sum()),
+                      help="Calendar days of leave falling inside the period")
+        
+        # Department breakdown
+        st.markdown("### Department Breakdown")
+        dept_summary = rollup_request_counts(rollups, first_month, ['department', 'status']).unstack(fill_value=0)
+        st.dataframe(dept_summary, use_container_width=True)
+        
+        # Detailed leave list
+        st.markdown("### Detailed Leave List")
+        display_df = leave_data[['full_name', 'department', 'leave_type', 'start_day', 'end_day', 'status', 'reason']].copy()
+        display_df['start_day'] = format_leave_days(display_df['start_day'])
+        display_df['end_day'] = format_leave_days(display_df['end_day'])
+        display_df.columns = ['Employee', 'Department', 'Leave Type', 'Start Date', 'End Date', 'Status', 'Reason']
+        st.dataframe(display_df, use_container_width=True)
+    else:
+        st.info("No leave requests found for this period.")
+
+CALENDAR_VIEW_MODES = ["Month", "Quarter", "Year"]
+
+def select_calendar_span(key):
+    """View mode and period pickers; returns (mode, start date, end date, title)"""
+    today = date.today()
+    leave_years = get_leave_years()
+    first_year, last_year = leave_years if leave_years else (today.year, today.year)
+    years = list(range(min(first_year, today.year), max(last_year, today.year + 1) + 1))
     
-    # Date selection
+    mode = st.radio("View", CALENDAR_VIEW_MODES, horizontal=True, key=f"{key}_mode")
     col1, col2 = st.columns(2)
     with col1:
-        selected_month = st.selectbox("Select Month", range(1, 13), 
-                                    format_func=lambda x: calendar.month_name[x],
-                                    index=datetime.now().month - 1)
+        selected_year = st.selectbox("Year", years, index=years.index(today.year), key=f"{key}_year")
     with col2:
-        selected_year = st.selectbox("Select Year", range(2024, 2027), 
-                                   index=0)
+        if mode == "Month":
+            selected_month = st.selectbox("Month", range(1, 13),
+                                          format_func=lambda x: calendar.month_name[x],
+                                          index=today.month - 1, key=f"{key}_month")
+            start_date = date(selected_year, selected_month, 1)
+            end_date = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+            title = f"{calendar.month_name[selected_month]} {selected_year}"
+        elif mode == "Quarter":
+            quarter = st.selectbox("Quarter", range(1, 5), format_func=lambda x: f"Q{x}",
+                                   index=(today.month - 1) // 3, key=f"{key}_quarter")
+            start_date = date(selected_year, quarter * 3 - 2, 1)
+            end_date = date(selected_year, quarter * 3, calendar.monthrange(selected_year, quarter * 3)[1])
+            title = f"Q{quarter} {selected_year}"
+        else:
+            start_date = date(selected_year, 1, 1)
+            end_date = date(selected_year, 12, 31)
+            title = str(selected_year)
+    return mode, start_date, end_date, title
+
+CALENDAR_DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+CALENDAR_GRID_STYLE = """<style>
+.lp-calendar {width: 100%; table-layout: fixed; border-collapse: collapse;}
+.lp-calendar th, .lp-calendar td {border: 1px solid rgba(128, 128, 128, 0.3); padding: 4px; vertical-align: top; font-size: 0.85rem;}
+.lp-calendar td.lp-holiday {background: rgba(13, 110, 253, 0.12);}
+.lp-calendar details ul {margin: 0; padding-left: 1rem;}
+</style>"""
+
+def render_calendar_grid(year, month, holidays, day_cell):
+    """Draw the month as one HTML table; day_cell(day) returns the cell HTML for days that are not holidays"""
+    weeks = []
+    for week in calendar.monthcalendar(year, month):
+        cells = []
+        for day in week:
+            if day == 0:
+                cells.append("<td></td>")
+                continue
+            holiday_name = holidays.name(date(year, month, day))
+            if holiday_name:
+                cells.append(f'<td class="lp-holiday">🔵 <b>{day}</b><br>{html.escape(holiday_name)}</td>')
+            else:
+                cells.append(f"<td>{day_cell(day)}</td>")
+        weeks.append(f"<tr>{''.join(cells)}</tr>")
+    header = ''.join(f"<th>{name}</th>" for name in CALENDAR_DAY_NAMES)
+    st.markdown(f'{CALENDAR_GRID_STYLE}<table class="lp-calendar"><thead><tr>{header}</tr></thead>'
+                f'<tbody>{"".join(weeks)}</tbody></table>', unsafe_allow_html=True)
+
+@st.fragment
+@timed
+def create_admin_calendar_view():
+    st.subheader("📅 Admin Calendar - All Staff Leave")
     
-    # Get calendar data
-    cal = calendar.monthcalendar(selected_year, selected_month)
-    holidays = get_saudi_holidays()
+    mode, start_date, end_date, title = select_calendar_span("admin_calendar")
     
-    # Get all leave requests for the selected month
-    start_date = date(selected_year, selected_month, 1)
-    if selected_month == 12:
-        end_date = date(selected_year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = date(selected_year, selected_month + 1, 1) - timedelta(days=1)
+    # Leave for the selected period, from the in-memory snapshot when the period is recent enough
+    leave_data = calendar_leave(start_date, end_date)
+    
+    if mode != "Month":
+        st.markdown(f"### {title}")
+        statuses = st.multiselect("Statuses", list(STATUS_DISPLAY), default=['approved', 'pending'],
+                                  format_func=str.title, key="admin_calendar_statuses")
+        heatmap = build_leave_heatmap(leave_data, start_date, end_date, 'department')
+        render_leave_heatmap(heatmap, 'department', "Department", statuses)
+        show_calendar_summary(leave_data, title, start_date, end_date)
+        return
     
-    leave_data = get_leave_for_date_range(start_date.strftime("%Y-%m-%d"), 
-                                        end_date.strftime("%Y-%m-%d"))
+    selected_year, selected_month = start_date.year, start_date.month
+    holidays = holiday_calendar()
+    occupancy = build_daily_occupancy(leave_data, start_date, end_date)
     
     # Create legend
     st.markdown("### Legend")
@@ -244,141 +3157,43 @@ def create_admin_calendar_view():
     # Display calendar
     st.markdown(f"### {calendar.month_name[selected_month]} {selected_year}")
     
-    # Create calendar grid
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    
-    # Header row
-    header_cols = st.columns(7)
-    for i, day in enumerate(days):
-        with header_cols[i]:
-            st.markdown(f"**{day}**")
-    
-    # Calendar rows
-    for week in cal:
-        week_cols = st.columns(7)
-        for i, day in enumerate(week):
-            with week_cols[i]:
-                if day == 0:
-                    st.markdown("&nbsp;")
-                else:
-                    current_date = date(selected_year, selected_month, day)
-                    date_str = current_date.strftime("%Y-%m-%d")
-                    
-                    # Check for holidays
-                    if date_str in holidays:
-                        st.markdown(f"🔵 **{day}**\n{holidays[date_str][:10]}...")
-                    else:
-                        # Check for leave requests on this date
-                        day_leave = []
-                        for _, leave in leave_data.iterrows():
-                            leave_start = datetime.strptime(leave['start_date'], "%Y-%m-%d").date()
-                            leave_end = datetime.strptime(leave['end_date'], "%Y-%m-%d").date()
-                            
-                            if leave_start <= current_date <= leave_end:
-                                status_emoji = {
-                                    'approved': '🟢',
-                                    'pending': '🟡',
-                                    'rejected': '🔴'
-                                }.get(leave['status'], '⚪')
-                                
-                                day_leave.append({
-                                    'name': leave['full_name'],
-                                    'status': leave['status'],
-                                    'emoji': status_emoji,
-                                    'type': leave['leave_type'],
-                                    'department': leave['department']
-                                })
-                        
-                        if day_leave:
-                            # Group by status for display
-                            status_counts = {}
-                            for leave in day_leave:
-                                status = leave['status']
-                                if status not in status_counts:
-                                    status_counts[status] = {'count': 0, 'emoji': leave['emoji'], 'names': []}
-                                status_counts[status]['count'] += 1
-                                status_counts[status]['names'].append(leave['name'])
-                            
-                            # Display day with leave info
-                            display_text = f"**{day}**\n"
-                            for status, info in status_counts.items():
-                                display_text += f"{info['emoji']} {info['count']} "
-                            
-                            st.markdown(display_text)
-                            
-                            # Show details in expander
-                            with st.expander(f"Details for {day}/{selected_month}"):
-                                for leave in day_leave:
-                                    st.write(f"{leave['emoji']} **{leave['name']}** ({leave['department']})")
-                                    st.write(f"   └─ {leave['type']} - {leave['status'].title()}")
-                        else:
-                            st.markdown(f"⚪ **{day}**")
+    # Per-day counts with the people off listed in a collapsible block
+    entries = [f"<li>{LEAVE_STATUS_EMOJI.get(leave.status, '⚪')} <b>{html.escape(str(leave.full_name))}</b> "
+               f"({html.escape(str(leave.department))})<br>{html.escape(leave.leave_type)} - {leave.status.title()}</li>"
+               for leave in leave_data.itertuples(index=False)]
     
-    # Summary statistics
-    st.markdown("### Monthly Summary")
-    if not leave_data.empty:
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            approved_count = len(leave_data[leave_data['status'] == 'approved'])
-            st.metric("Approved Requests", approved_count)
-        
-        with col2:
-            pending_count = len(leave_data[leave_data['status'] == 'pending'])
-            st.metric("Pending Requests", pending_count)
-        
-        with col3:
-            rejected_count = len(leave_data[leave_data['status'] == 'rejected'])
-            st.metric("Rejected Requests", rejected_count)
-        
-        with col4:
-            total_days = 0
-            for _, leave in leave_data.iterrows():
-                start = datetime.strptime(leave['start_date'], "%Y-%m-%d").date()
-                end = datetime.strptime(leave['end_date'], "%Y-%m-%d").date()
-                total_days += (end - start).days + 1
-            st.metric("Total Leave Days", total_days)
-        
-        # Department breakdown
-        st.markdown("### Department Breakdown")
-        if not leave_data.empty:
-            dept_summary = leave_data.groupby(['department', 'status']).size().unstack(fill_value=0)
-            st.dataframe(dept_summary, use_container_width=True)
-        
-        # Detailed leave list
-        st.markdown("### Detailed Leave List")
-        display_df = leave_data[['full_name', 'department', 'leave_type', 'start_date', 'end_date', 'status', 'reason']].copy()
-        display_df.columns = ['Employee', 'Department', 'Leave Type', 'Start Date', 'End Date', 'Status', 'Reason']
-        st.dataframe(display_df, use_container_width=True)
-    else:
-        st.info("No leave requests found for this month.")
+    def day_cell(day):
+        day_rows = occupancy['rows'][day - 1]
+        if not len(day_rows):
+            return f"⚪ <b>{day}</b>"
+        counts = ' '.join(f"{LEAVE_STATUS_EMOJI.get(status, '⚪')} {status_counts[day - 1]}"
+                          for status, status_counts in occupancy['counts'].items() if status_counts[day - 1])
+        details = ''.join(entries[row] for row in day_rows)
+        return f"<b>{day}</b><br>{counts}<details><summary>Details</summary><ul>{details}</ul></details>"
+    
+    render_calendar_grid(selected_year, selected_month, holidays, day_cell)
+    
+    show_calendar_summary(leave_data, "Monthly", start_date, end_date)
 
+@st.fragment
+@timed
 def create_user_calendar_view(user_id):
     st.subheader("📅 My Leave Calendar")
     
-    # Date selection
-    col1, col2 = st.columns(2)
-    with col1:
-        selected_month = st.selectbox("Month", range(1, 13), 
-                                    format_func=lambda x: calendar.month_name[x],
-                                    index=datetime.now().month - 1)
-    with col2:
-        selected_year = st.selectbox("Year", range(2024, 2027), 
-                                   index=0)
+    mode, start_date, end_date, title = select_calendar_span("user_calendar")
     
-    # Get calendar data
-    cal = calendar.monthcalendar(selected_year, selected_month)
-    holidays = get_saudi_holidays()
+    # Get user's leave requests for the selected period
+    leave_data = calendar_leave(start_date, end_date, user_id)
     
-    # Get user's leave requests for the selected month
-    start_date = date(selected_year, selected_month, 1)
-    if selected_month == 12:
-        end_date = date(selected_year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = date(selected_year, selected_month + 1, 1) - timedelta(days=1)
+    if mode != "Month":
+        st.markdown(f"### {title}")
+        heatmap = build_leave_heatmap(leave_data, start_date, end_date, 'leave_type')
+        render_leave_heatmap(heatmap, 'leave_type', "Leave Type", list(STATUS_DISPLAY))
+        return
     
-    leave_data = get_leave_for_date_range(start_date.strftime("%Y-%m-%d"), 
-                                        end_date.strftime("%Y-%m-%d"), user_id)
+    selected_year, selected_month = start_date.year, start_date.month
+    holidays = holiday_calendar()
+    occupancy = build_daily_occupancy(leave_data, start_date, end_date)
     
     # Create legend
     st.markdown("### Legend")
@@ -395,54 +3210,494 @@ def create_user_calendar_view(user_id):
     # Display calendar
     st.markdown(f"### {calendar.month_name[selected_month]} {selected_year}")
     
-    # Create calendar grid
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    
-    # Header row
-    header_cols = st.columns(7)
-    for i, day in enumerate(days):
-        with header_cols[i]:
-            st.markdown(f"**{day}**")
-    
-    # Calendar rows
-    for week in cal:
-        week_cols = st.columns(7)
-        for i, day in enumerate(week):
-            with week_cols[i]:
-                if day == 0:
-                    st.markdown("&nbsp;")
+    def day_cell(day):
+        day_rows = occupancy['rows'][day - 1]
+        if not len(day_rows):
+            return f"⚪ <b>{day}</b>"
+        leave = leave_data.iloc[day_rows[0]]
+        status_emoji = LEAVE_STATUS_EMOJI.get(leave['status'], '⚪')
+        return f"{status_emoji} <b>{day}</b><br>{html.escape(leave['leave_type'])}"
+    
+    render_calendar_grid(selected_year, selected_month, holidays, day_cell)
+
+def render_bulk_moderation(requests, approved_by, key):
+    """Multi-select over the pending rows in view with approve/reject-all actions"""
+    pending = requests[requests['status'] == 'pending']
+    if pending.empty:
+        return
+    
+    labels = {int(request.id): f"{request.full_name} - {request.leave_type} ({request.start_date} to {request.end_date})"
+              for request in pending.itertuples(index=False)}
+    
+    with st.expander(f"🗂️ Bulk actions ({len(labels)} pending in view)"):
+        selected = st.multiselect("Select requests", list(labels), format_func=labels.get, key=f"{key}_selected")
+        select_all = st.checkbox("Select all pending requests in view", key=f"{key}_select_all")
+        if select_all:
+            selected = list(labels)
+        
+        col_approve, col_reject = st.columns(2)
+        with col_approve:
+            approve = st.button(f"✅ Approve {len(selected)} selected", key=f"{key}_approve",
+                                disabled=not selected, use_container_width=True)
+        with col_reject:
+            reject = st.button(f"❌ Reject {len(selected)} selected", key=f"{key}_reject",
+                               disabled=not selected, use_container_width=True)
+        
+        if approve or reject:
+            status = 'approved' if approve else 'rejected'
+            results = bulk_update_leave_status(selected, status, approved_by)
+            updated = sum(outcome == 'updated' for outcome in results.values())
+            skipped = len(results) - updated
+            message = f"{'✅' if approve else '❌'} {updated} request(s) {status}"
+            if skipped:
+                message += f" ({skipped} skipped: already processed or removed)"
+            st.session_state.moderation_message = message
+            del st.session_state[f"{key}_selected"]
+            del st.session_state[f"{key}_select_all"]
+            st.rerun()
+
+def show_moderation_message():
+    if 'moderation_message' in st.session_state:
+        st.success(st.session_state.pop('moderation_message'))
+
+@timed
+def create_my_requests_view(user_data):
+    st.subheader("📋 My Leave Requests")
+    st.markdown("*View and track all your leave requests*")
+    
+    snapshot = active_leave_snapshot()
+    include_history = st.toggle(f"Include requests that ended before {date.fromordinal(snapshot.first_day):%d %b %Y}",
+                                key="my_requests_history")
+    requests_df = (get_user_leave_requests(user_data[0], include_history=True) if include_history
+                   else snapshot.user_requests(user_data[0]))
+    if not requests_df.empty:
+        requests_df = prepare_request_rows(requests_df)
+        status_counts = requests_df['status'].value_counts()
+        
+        # Summary metrics
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("✅ Approved", int(status_counts.get('approved', 0)))
+        with col2:
+            st.metric("⏳ Pending", int(status_counts.get('pending', 0)))
+        with col3:
+            st.metric("❌ Rejected", int(status_counts.get('rejected', 0)))
+        with col4:
+            total_days = requests_df.loc[requests_df['status'] == 'approved', 'total_days'].sum()
+            st.metric("📅 Days Used", int(total_days))
+        
+        st.markdown("---")
+        
+        # Display requests
+        for request in requests_df.itertuples(index=False):
+            with st.expander(f"{request.status_emoji} {request.leave_type} - {request.start_date} to {request.end_date} ({request.status_text})"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown(f"**📊 Status:** {request.status_title}")
+                    st.markdown(f"**📋 Type:** {request.leave_type}")
+                    st.markdown(f"**📅 Duration:** {request.start_date} to {request.end_date}")
+                    st.markdown(f"**⏱️ Days:** {request.total_days} total ({request.working_days} working)")
+                    
+                with col2:
+                    st.markdown(f"**📝 Reason:** {request.reason}")
+                    st.markdown(f"**📤 Submitted:** {request.request_date}")
+                    if request.approved_by:
+                        st.markdown(f"**✅ Approved by:** {request.approved_by}")
+    else:
+        st.info("📭 No leave requests found. Submit your first request using the 'Submit Leave' option.")
+
+def render_export_panel():
+    with st.expander("📤 Export leave history"):
+        st.markdown("*Payroll export of all leave requests with employee details*")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            fmt = st.radio("Format", ["csv", "parquet"], format_func=str.upper, horizontal=True, key="export_format")
+        with col2:
+            department = st.selectbox("Department", ["All"] + get_departments(), key="export_department")
+        with col3:
+            date_range = st.date_input("Date range (optional)", value=(), key="export_range")
+        
+        if st.button("Prepare export", key="export_prepare"):
+            start_date = end_date = None
+            if len(date_range) == 2:
+                start_date, end_date = (day.strftime("%Y-%m-%d") for day in date_range)
+            
+            # Stream to a temp file rather than building the export as a DataFrame; only its bytes are kept
+            st.session_state.pop('export_file', None)
+            with tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False) as f:
+                path = f.name
+            try:
+                rows = export_leave_history(path, fmt, start_date, end_date,
+                                            None if department == "All" else department)
+                with open(path, "rb") as f:
+                    st.session_state.export_file = (f.read(), fmt, rows)
+            except RuntimeError as e:
+                st.error(f"❌ {e}")
+            finally:
+                os.remove(path)
+        
+        if 'export_file' in st.session_state:
+            data, fmt, rows = st.session_state.export_file
+            st.download_button(f"⬇️ Download {rows} rows ({fmt.upper()})", data,
+                               file_name=f"leave_history_{datetime.now():%Y%m%d}.{fmt}",
+                               key="export_download")
+
+@timed
+def create_manage_requests_view(user_data):
+    st.subheader("⚙️ Manage All Leave Requests")
+    st.markdown("*Review and approve/reject leave requests from all employees*")
+    
+    # Archived requests stay out of the list unless asked for
+    include_history = STORAGE_BACKEND == 'sqlite' and st.checkbox("📦 Include archived requests",
+                                                                  key="manage_include_history")
+    total_requests = count_leave_requests(include_history=include_history)
+    if total_requests == 0:
+        st.info("📭 No leave requests found.")
+        return
+    
+    # Filter options
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        status_filter = st.selectbox("Filter by Status", ["All", "Pending", "Approved", "Rejected"])
+    with col2:
+        dept_filter = st.selectbox("Filter by Department", ["All"] + get_departments())
+    with col3:
+        page_size = st.selectbox("Per Page", PAGE_SIZE_OPTIONS,
+                                 index=PAGE_SIZE_OPTIONS.index(MANAGE_REQUESTS_PAGE_SIZE))
+    with col4:
+        if st.button("🔄 Refresh", use_container_width=True):
+            st.rerun()
+    
+    status = None if status_filter == "All" else status_filter.lower()
+    department = None if dept_filter == "All" else dept_filter
+    
+    # Full-text search and the date filter use the SQLite FTS5 index
+    query, start_day, end_day = "", None, None
+    if STORAGE_BACKEND == 'sqlite':
+        col_search, col_dates = st.columns([3, 2])
+        with col_search:
+            query = leave_search_query(st.text_input("🔎 Search", placeholder="Employee name, reason or leave type",
+                                                     key="manage_search"))
+        with col_dates:
+            date_range = st.date_input("Overlapping dates (optional)", value=(), key="manage_dates")
+        if len(date_range) == 2:
+            start_day, end_day = (day.toordinal() for day in date_range)
+    searching = bool(query) or start_day is not None
+    
+    # Cursors for the pages visited so far (row offsets when searching, keysets otherwise); reset when the filters change
+    filters = (status, department, page_size, query, start_day, end_day, include_history)
+    if st.session_state.get('manage_filters') != filters:
+        st.session_state.manage_filters = filters
+        st.session_state.manage_cursors = [None]
+    cursors = st.session_state.manage_cursors
+    
+    if searching:
+        if include_history:
+            st.caption("Search covers requests that have not been archived.")
+        matching_requests = count_leave_search(query, status, department, start_day, end_day)
+        ranked = matching_requests <= SEARCH_RESULT_LIMIT
+        if query and not ranked:
+            st.caption(f"More than {SEARCH_RESULT_LIMIT:,} matches: showing the most recently submitted "
+                       f"{SEARCH_RESULT_LIMIT:,}. Add words or filters to rank by relevance.")
+            matching_requests = SEARCH_RESULT_LIMIT
+        page = search_leave_requests(query, status, department, start_day, end_day, page_size, cursors[-1] or 0,
+                                     ranked)
+    else:
+        matching_requests = count_leave_requests(status, department, include_history)
+        page = get_leave_requests_page(status, department, page_size, cursors[-1], include_history)
+    page_number = len(cursors)
+    if page.empty and page_number > 1:
+        # The rows behind the cursor were moderated away; start again from the first page
+        st.session_state.manage_cursors = [None]
+        st.rerun()
+    page_count = max(1, -(-matching_requests // page_size))
+    first_row = (page_number - 1) * page_size
+    
+    st.markdown(f"**📊 Showing {first_row + 1 if len(page) else 0}-{first_row + len(page)} of {matching_requests} "
+                f"matching requests ({total_requests} total) · Page {page_number} of {page_count}**")
+    
+    col_prev, col_spacer, col_next = st.columns([1, 4, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", disabled=page_number == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if st.button("Next ➡️", disabled=first_row + len(page) >= matching_requests, use_container_width=True):
+            if searching:
+                cursors.append(first_row + len(page))
+            else:
+                last = page.iloc[-1]
+                cursors.append((int(last['request_day']), int(last['id'])))
+            st.rerun()
+    
+    show_moderation_message()
+    render_bulk_moderation(page, user_data[1], key="manage_bulk")
+    
+    # Export and audit read the SQLite file directly
+    if STORAGE_BACKEND == 'sqlite':
+        render_export_panel()
+        
+        with st.expander("🔍 Overlap audit"):
+            st.markdown("*Find every employee with overlapping pending or approved requests*")
+            if st.button("Run audit", key="overlap_audit"):
+                overlaps = audit_leave_overlaps()
+                if overlaps.empty:
+                    st.success("✅ No overlapping requests found")
                 else:
-                    current_date = date(selected_year, selected_month, day)
-                    date_str = current_date.strftime("%Y-%m-%d")
+                    st.warning(f"⚠️ {len(overlaps)} overlapping pair(s) across {overlaps['user_id'].nunique()} employee(s)")
+                    st.dataframe(overlaps, use_container_width=True, hide_index=True)
+    st.markdown("---")
+    
+    for request in prepare_request_rows(page).itertuples(index=False):
+        with st.expander(f"{request.status_emoji} **{request.full_name}** - {request.leave_type} ({request.start_date} to {request.end_date})"):
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.markdown(f"**👤 Employee:** {request.full_name}")
+                st.markdown(f"**🏢 Department:** {request.department}")
+                st.markdown(f"**📋 Type:** {request.leave_type}")
+                st.markdown(f"**📊 Status:** {request.status_title}")
+            
+            with col2:
+                st.markdown(f"**📅 Start Date:** {request.start_date}")
+                st.markdown(f"**📅 End Date:** {request.end_date}")
+                st.markdown(f"**📤 Requested:** {request.request_date}")
+                st.markdown(f"**⏱️ Duration:** {request.total_days} total ({request.working_days} working)")
+            
+            with col3:
+                st.markdown(f"**📝 Reason:** {request.reason}")
+                
+                if request.status == 'pending':
+                    st.markdown("**🎯 Actions:**")
+                    col_approve, col_reject = st.columns(2)
+                    with col_approve:
+                        if st.button(f"✅ Approve", key=f"approve_{request.id}", use_container_width=True):
+                            update_leave_status(request.id, 'approved', user_data[1])
+                            st.success("✅ Request approved!")
+                            st.rerun()
+                    with col_reject:
+                        if st.button(f"❌ Reject", key=f"reject_{request.id}", use_container_width=True):
+                            update_leave_status(request.id, 'rejected', user_data[1])
+                            st.success("❌ Request rejected!")
+                            st.rerun()
+                elif request.approved_by:
+                    st.markdown(f"**✅ Processed by:** {request.approved_by}")
+
+def show_coverage_warning(department, start_date, end_date):
+    absent, peak_day = get_max_concurrent_absences(department, start_date, end_date)
+    if not absent:
+        st.caption("✅ Nobody else in the department is off on these dates")
+        return
+    headcount = get_department_headcount(department)
+    message = f"{absent} of {headcount} {department} staff already off on {peak_day}"
+    if headcount and (absent + 1) / headcount > COVERAGE_WARNING_RATIO:
+        st.warning(f"⚠️ Coverage: {message}")
+    else:
+        st.caption(f"👥 Coverage: {message}")
+
+@timed
+def create_team_requests_view(user_data):
+    st.subheader("👥 Team Leave Requests")
+    st.markdown(f"*Managing leave requests for {user_data[5]} department*")
+    
+    snapshot = active_leave_snapshot()
+    include_history = st.toggle(f"Include requests that ended before {date.fromordinal(snapshot.first_day):%d %b %Y}",
+                                key="team_requests_history")
+    team_requests = (get_team_leave_requests(user_data[5], include_history=True) if include_history
+                     else snapshot.team_requests(user_data[5]))
+    if not team_requests.empty:
+        show_moderation_message()
+        render_bulk_moderation(team_requests, user_data[1], key="team_bulk")
+        
+        for request in prepare_request_rows(team_requests).itertuples(index=False):
+            with st.expander(f"{request.status_emoji} **{request.full_name}** - {request.leave_type} ({request.start_date} to {request.end_date})"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.write(f"**👤 Employee:** {request.full_name}")
+                    st.write(f"**📋 Type:** {request.leave_type}")
+                    st.write(f"**📊 Status:** {request.status_title}")
+                with col2:
+                    st.write(f"**📅 Dates:** {request.start_date} to {request.end_date}")
+                    st.write(f"**📤 Requested:** {request.request_date}")
+                with col3:
+                    st.write(f"**📝 Reason:** {request.reason}")
                     
-                    # Check for holidays
-                    if date_str in holidays:
-                        st.markdown(f"🔵 **{day}**\n{holidays[date_str][:8]}...")
-                    else:
-                        # Check for leave requests on this date
-                        has_leave = False
-                        leave_status = None
-                        leave_type = None
-                        
-                        for _, leave in leave_data.iterrows():
-                            leave_start = datetime.strptime(leave['start_date'], "%Y-%m-%d").date()
-                            leave_end = datetime.strptime(leave['end_date'], "%Y-%m-%d").date()
-                            
-                            if leave_start <= current_date <= leave_end:
-                                has_leave = True
-                                leave_status = leave['status']
-                                leave_type = leave['leave_type']
-                                break
-                        
-                        if has_leave:
-                            status_emoji = {
-                                'approved': '🟢',
-                                'pending': '🟡',
-                                'rejected': '🔴'
-                            }.get(leave_status, '⚪')
-                            st.markdown(f"{status_emoji} **{day}**\n{leave_type[:8]}...")
-                        else:
-                            st.markdown(f"⚪ **{day}**")
+                    if request.status == 'pending':
+                        show_coverage_warning(request.department, request.start_date, request.end_date)
+                        col_approve, col_reject = st.columns(2)
+                        with col_approve:
+                            if st.button(f"✅ Approve", key=f"approve_{request.id}"):
+                                update_leave_status(request.id, 'approved', user_data[1])
+                                st.success("✅ Request approved!")
+                                st.rerun()
+                        with col_reject:
+                            if st.button(f"❌ Reject", key=f"reject_{request.id}"):
+                                update_leave_status(request.id, 'rejected', user_data[1])
+                                st.success("❌ Request rejected!")
+                                st.rerun()
+    else:
+        st.info("📭 No team leave requests found.")
+
+def rollup_month_starts(months):
+    """First day of each month_key as datetime64[D]"""
+    return (np.asarray(months, dtype=np.int64) - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+
+@timed
+def create_analytics_view():
+    st.subheader("📊 Leave Analytics")
+    st.markdown("*Multi-year trends from the monthly leave rollups*")
+    
+    today = date.today()
+    leave_years = get_leave_years()
+    if not leave_years:
+        st.info("📭 No leave requests found.")
+        return
+    years = list(range(min(leave_years[0], today.year), max(leave_years[1], today.year) + 1))
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        first_year, last_year = years[0], years[-1]
+        if len(years) > 1:
+            first_year, last_year = st.select_slider("Years", years, value=(max(years[0], today.year - 2), today.year),
+                                                     key="analytics_years")
+    with col2:
+        departments = st.multiselect("Departments", get_departments(), key="analytics_departments",
+                                     placeholder="All departments")
+    
+    first_month, last_month = month_key(date(first_year, 1, 1)), month_key(date(last_year, 12, 1))
+    rollups = get_leave_rollups(first_month, last_month)
+    if departments:
+        rollups = rollups[rollups['department'].isin(departments)]
+    if rollups.empty:
+        st.info("No leave in the selected years and departments.")
+        return
+    approved = rollups[rollups['status'] == 'approved']
+    decided = rollups[rollups['decisions'] > 0]
+    
+    # Headline figures
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Approved Working Days", f"{int(approved['working_days'].sum()):,}")
+    with col2:
+        decisions = decided.groupby('status')['decisions'].sum()
+        total_decisions = int(decisions.sum())
+        st.metric("Approval Rate", f"{decisions.get('approved', 0) / total_decisions:.0%}" if total_decisions else "–")
+    with col3:
+        latency = decided['decision_days'].sum() / total_decisions if total_decisions else None
+        st.metric("Avg. Days to Decision", f"{latency:.1f}" if latency is not None else "–")
+    with col4:
+        monthly = approved.groupby('month')['working_days'].sum()
+        peak = int(monthly.idxmax()) if not monthly.empty else None
+        st.metric("Peak Month", f"{calendar.month_abbr[peak % 12 + 1]} {peak // 12}" if peak is not None else "–")
+    
+    # Utilisation: approved working days taken over the working days the department's staff had that month
+    st.markdown("### Utilisation")
+    months = np.arange(first_month, last_month + 1)
+    month_starts = rollup_month_starts(months)
+    month_ends = rollup_month_starts(months + 1) - 1
+    working_days = pd.Series(calculate_working_days_many(month_starts, month_ends), index=months)
+    usage = approved.groupby(['department', 'month'], as_index=False)['working_days'].sum()
+    headcounts = {department: get_department_headcount(department) for department in usage['department'].unique()}
+    usage['capacity'] = usage['department'].map(headcounts) * usage['month'].map(working_days)
+    usage = usage[usage['capacity'] > 0]
+    usage['utilisation'] = usage['working_days'] / usage['capacity']
+    usage['month_start'] = rollup_month_starts(usage['month'])
+    st.altair_chart(alt.Chart(usage).mark_line(point=True).encode(
+        x=alt.X('month_start:T', title=None),
+        y=alt.Y('utilisation:Q', title="Share of working days on leave", axis=alt.Axis(format='%')),
+        color=alt.Color('department:N', title="Department"),
+        tooltip=[alt.Tooltip('department:N', title="Department"),
+                 alt.Tooltip('month_start:T', title="Month", format='%b %Y'),
+                 alt.Tooltip('utilisation:Q', title="Utilisation", format='.1%'),
+                 alt.Tooltip('working_days:Q', title="Working days taken")]
+    ), use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        # Seasonal peaks: approved leave days per calendar month and year
+        st.markdown("### Seasonal Peaks")
+        seasonal = approved.groupby('month', as_index=False)['calendar_days'].sum()
+        seasonal['year'] = (seasonal['month'] // 12).astype(str)
+        seasonal['month_name'] = [calendar.month_abbr[month % 12 + 1] for month in seasonal['month']]
+        st.altair_chart(alt.Chart(seasonal).mark_rect().encode(
+            x=alt.X('month_name:O', title=None, sort=list(calendar.month_abbr)[1:]),
+            y=alt.Y('year:O', title=None),
+            color=alt.Color('calendar_days:Q', title="Leave days", scale=alt.Scale(scheme='orangered')),
+            tooltip=[alt.Tooltip('month_name:O', title="Month"), alt.Tooltip('year:O', title="Year"),
+                     alt.Tooltip('calendar_days:Q', title="Leave days")]
+        ), use_container_width=True)
+    with col2:
+        # Approval latency: mean days from submission to decision, by the month the decision was made
+        st.markdown("### Approval Latency")
+        if decided.empty:
+            st.info("No decisions with a recorded decision date in this period.")
+        else:
+            latency = decided.groupby(['month', 'status'], as_index=False)[['decisions', 'decision_days']].sum()
+            latency['average_days'] = latency['decision_days'] / latency['decisions']
+            latency['month_start'] = rollup_month_starts(latency['month'])
+            st.altair_chart(alt.Chart(latency).mark_line(point=True).encode(
+                x=alt.X('month_start:T', title=None),
+                y=alt.Y('average_days:Q', title="Days to decision"),
+                color=alt.Color('status:N', title="Decision"),
+                tooltip=[alt.Tooltip('month_start:T', title="Month", format='%b %Y'),
+                         alt.Tooltip('status:N', title="Decision"),
+                         alt.Tooltip('average_days:Q', title="Average days", format='.1f'),
+                         alt.Tooltip('decisions:Q', title="Decisions")]
+            ), use_container_width=True)
+    
+    # Leave type mix per year
+    st.markdown("### Leave Type Mix")
+    mix = approved.assign(year=(approved['month'] // 12).astype(str))
+    mix = mix.groupby(['year', 'leave_type'], as_index=False)['working_days'].sum()
+    st.altair_chart(alt.Chart(mix).mark_bar().encode(
+        x=alt.X('year:O', title=None),
+        y=alt.Y('working_days:Q', title="Approved working days"),
+        color=alt.Color('leave_type:N', title="Leave type"),
+        tooltip=[alt.Tooltip('year:O', title="Year"), alt.Tooltip('leave_type:N', title="Leave type"),
+                 alt.Tooltip('working_days:Q', title="Working days")]
+    ), use_container_width=True)
+
+@timed
+def create_performance_view():
+    st.subheader("📈 Performance")
+    st.caption(f"Percentiles cover the last {METRICS_WINDOW} calls of each span since the server started.")
+    
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        if st.button("🔄 Reset timings", use_container_width=True):
+            span_recorder().reset()
+            st.rerun()
+    
+    st.markdown("### Previous Rerun")
+    last_spans = st.session_state.get('last_rerun_spans') or []
+    if last_spans:
+        trace = pd.DataFrame({
+            'Span': ["\u00a0\u00a0" * span['depth'] + span['span'] for span in last_spans],
+            'Milliseconds': [span['ms'] for span in last_spans]
+        })
+        st.dataframe(trace, use_container_width=True, hide_index=True)
+    else:
+        st.info("No rerun has been recorded in this session yet.")
+    
+    st.markdown("### Span Latencies")
+    summary = span_recorder().summary()
+    summary.columns = ['Span', 'Calls', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Total (s)']
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### Connection Pool")
+        st.json(db_pool_stats())
+    with col2:
+        st.markdown("### Read Cache")
+        st.json(read_cache_stats())
+    
+    st.markdown("### Active Leave Snapshot")
+    st.json(active_leave_store().stats())
+    
+    if METRICS_FILE:
+        st.caption(f"Prometheus metrics are written to `{METRICS_FILE}` after every rerun.")
+    st.download_button("📥 Download Prometheus metrics", span_recorder().prometheus(),
+                       file_name="leave_planner_metrics.prom", mime="text/plain")
 
 def main():
     st.set_page_config(page_title="Leave Planning System", page_icon="📅", layout="wide")
@@ -480,22 +3735,23 @@ def main():
                     else:
                         st.error("❌ Invalid username or password")
                 
-                st.markdown("---")
-                st.info("""
-                **🎯 Demo Accounts:**
-                
-                **Admin Access:**
-                - Username: `admin`
-                - Password: `admin123`
-                
-                **Employee Access:**
-                - Username: `ahmed.ali`
-                - Password: `password123`
-                
-                **Manager Access:**
-                - Username: `omar.khalil`
-                - Password: `password123`
-                """)
+                if SEED_DEMO_DATA:
+                    st.markdown("---")
+                    st.info("""
+                    **🎯 Demo Accounts:**
+                    
+                    **Admin Access:**
+                    - Username: `admin`
+                    - Password: `admin123`
+                    
+                    **Employee Access:**
+                    - Username: `ahmed.ali`
+                    - Password: `password123`
+                    
+                    **Manager Access:**
+                    - Username: `omar.khalil`
+                    - Password: `password123`
+                    """)
     
     else:
         # Main application
@@ -505,12 +3761,14 @@ def main():
         st.sidebar.title(f"👋 Welcome, {user_data[3]}")
         st.sidebar.markdown(f"**🎭 Role:** {user_data[4].title()}")
         st.sidebar.markdown(f"**🏢 Department:** {user_data[5]}")
-        st.sidebar.markdown(f"**📊 Leave Balance:** {user_data[6]} days")
+        balance = get_leave_balance(user_data[0], datetime.now().year)
+        st.sidebar.markdown(f"**📊 Leave Balance:** {balance['remaining']} of {balance['entitlement']} days")
         st.sidebar.markdown("---")
         
         # Menu options based on role
         if user_data[4] == 'admin':
-            menu_options = ["🗓️ Admin Calendar", "⚙️ Manage Requests", "📝 Submit Leave", "📅 My Calendar", "📋 My Requests"]
+            menu_options = ["🗓️ Admin Calendar", "⚙️ Manage Requests", "📊 Analytics", "📝 Submit Leave", "📅 My Calendar",
+                            "📋 My Requests", "📈 Performance"]
         elif user_data[4] == 'manager':
             menu_options = ["📅 My Calendar", "📋 My Requests", "📝 Submit Leave", "👥 Team Requests"]
         else:
@@ -524,232 +3782,81 @@ def main():
             st.session_state.user_data = None
             st.rerun()
         
-        # Main content based on menu selection
-        if selected_menu == "🗓️ Admin Calendar":
-            create_admin_calendar_view()
-        
-        elif selected_menu == "📅 My Calendar":
-            create_user_calendar_view(user_data[0])
-        
-        elif selected_menu == "📝 Submit Leave":
-            st.subheader("📝 Submit Leave Request")
-            st.markdown("*Please fill out the form below to submit your leave request*")
+        # Main content based on menu selection, timed per page
+        with timed_span(f"page {selected_menu}"):
+            if selected_menu == "🗓️ Admin Calendar":
+                create_admin_calendar_view()
             
-            with st.form("leave_request_form"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    start_date = st.date_input("📅 Start Date", 
-                                             min_value=datetime.now().date(),
-                                             help="Select the first day of your leave")
-                    leave_type = st.selectbox("📋 Leave Type", 
-                                            ["Annual Leave", "Sick Leave", "Emergency Leave", 
-                                             "Maternity Leave", "Paternity Leave", "Hajj Leave"],
-                                            help="Select the type of leave you're requesting")
-                
-                with col2:
-                    end_date = st.date_input("📅 End Date", 
-                                           min_value=start_date if 'start_date' in locals() else datetime.now().date(),
-                                           help="Select the last day of your leave")
-                    reason = st.text_area("📝 Reason for Leave", 
-                                        placeholder="Please provide a detailed reason for your leave request...",
-                                        help="Explain why you need this leave")
-                
-                # Calculate working days
-                if start_date and end_date:
-                    working_days = calculate_working_days(start_date.strftime("%Y-%m-%d"), 
-                                                        end_date.strftime("%Y-%m-%d"))
-                    total_days = (end_date - start_date).days + 1
-                    st.info(f"📊 **Leave Summary:** {total_days} total days ({working_days} working days)")
-                
-                submitted = st.form_submit_button("🚀 Submit Request", type="primary", use_container_width=True)
-                
-                if submitted:
-                    if start_date and end_date and reason.strip():
-                        if end_date >= start_date:
-                            submit_leave_request(user_data[0], start_date.strftime("%Y-%m-%d"), 
-                                               end_date.strftime("%Y-%m-%d"), leave_type, reason)
-                            st.success("✅ Leave request submitted successfully! Your manager will review it soon.")
-                            st.balloons()
-                            st.rerun()
-                        else:
-                            st.error("❌ End date must be after or equal to start date")
-                    else:
-                        st.error("❌ Please fill in all required fields")
-        
-        elif selected_menu == "📋 My Requests":
-            st.subheader("📋 My Leave Requests")
-            st.markdown("*View and track all your leave requests*")
+            elif selected_menu == "📅 My Calendar":
+                create_user_calendar_view(user_data[0])
             
-            requests_df = get_user_leave_requests(user_data[0])
-            if not requests_df.empty:
-                # Summary metrics
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    approved = len(requests_df[requests_df['status'] == 'approved'])
-                    st.metric("✅ Approved", approved)
-                with col2:
-                    pending = len(requests_df[requests_df['status'] == 'pending'])
-                    st.metric("⏳ Pending", pending)
-                with col3:
-                    rejected = len(requests_df[requests_df['status'] == 'rejected'])
-                    st.metric("❌ Rejected", rejected)
-                with col4:
-                    total_days = sum([(datetime.strptime(r['end_date'], "%Y-%m-%d") - 
-                                     datetime.strptime(r['start_date'], "%Y-%m-%d")).days + 1 
-                                    for _, r in requests_df.iterrows() if r['status'] == 'approved'])
-                    st.metric("📅 Days Used", total_days)
+            elif selected_menu == "📝 Submit Leave":
+                st.subheader("📝 Submit Leave Request")
+                st.markdown("*Please fill out the form below to submit your leave request*")
                 
-                st.markdown("---")
-                
-                # Display requests
-                for _, request in requests_df.iterrows():
-                    status_config = {
-                        'pending': {'color': '🟡', 'bg': '#FFF3CD', 'text': 'Pending Review'},
-                        'approved': {'color': '🟢', 'bg': '#D4EDDA', 'text': 'Approved'},
-                        'rejected': {'color': '🔴', 'bg': '#F8D7DA', 'text': 'Rejected'}
-                    }
+                with st.form("leave_request_form"):
+                    col1, col2 = st.columns(2)
                     
-                    config = status_config.get(request['status'], status_config['pending'])
+                    with col1:
+                        start_date = st.date_input("📅 Start Date", 
+                                                 min_value=datetime.now().date(),
+                                                 help="Select the first day of your leave")
+                        leave_type = st.selectbox("📋 Leave Type", 
+                                                ["Annual Leave", "Sick Leave", "Emergency Leave", 
+                                                 "Maternity Leave", "Paternity Leave", "Hajj Leave"],
+                                                help="Select the type of leave you're requesting")
                     
-                    with st.expander(f"{config['color']} {request['leave_type']} - {request['start_date']} to {request['end_date']} ({config['text']})"):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.markdown(f"**📊 Status:** {request['status'].title()}")
-                            st.markdown(f"**📋 Type:** {request['leave_type']}")
-                            st.markdown(f"**📅 Duration:** {request['start_date']} to {request['end_date']}")
-                            
-                            # Calculate days
-                            start = datetime.strptime(request['start_date'], "%Y-%m-%d").date()
-                            end = datetime.strptime(request['end_date'], "%Y-%m-%d").date()
-                            total_days = (end - start).days + 1
-                            working_days = calculate_working_days(request['start_date'], request['end_date'])
-                            st.markdown(f"**⏱️ Days:** {total_days} total ({working_days} working)")
-                            
-                        with col2:
-                            st.markdown(f"**📝 Reason:** {request['reason']}")
-                            st.markdown(f"**📤 Submitted:** {request['request_date']}")
-                            if request['approved_by']:
-                                st.markdown(f"**✅ Approved by:** {request['approved_by']}")
-            else:
-                st.info("📭 No leave requests found. Submit your first request using the 'Submit Leave' option.")
-        
-        elif selected_menu == "⚙️ Manage Requests" and user_data[4] == 'admin':
-            st.subheader("⚙️ Manage All Leave Requests")
-            st.markdown("*Review and approve/reject leave requests from all employees*")
-            
-            all_requests = get_all_leave_requests()
-            if not all_requests.empty:
-                # Filter options
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    status_filter = st.selectbox("Filter by Status", ["All", "Pending", "Approved", "Rejected"])
-                with col2:
-                    dept_filter = st.selectbox("Filter by Department", ["All"] + list(all_requests['department'].unique()))
-                with col3:
-                    if st.button("🔄 Refresh", use_container_width=True):
-                        st.rerun()
-                
-                # Apply filters
-                filtered_requests = all_requests.copy()
-                if status_filter != "All":
-                    filtered_requests = filtered_requests[filtered_requests['status'] == status_filter.lower()]
-                if dept_filter != "All":
-                    filtered_requests = filtered_requests[filtered_requests['department'] == dept_filter]
-                
-                st.markdown(f"**📊 Showing {len(filtered_requests)} of {len(all_requests)} requests**")
-                st.markdown("---")
-                
-                for _, request in filtered_requests.iterrows():
-                    status_config = {
-                        'pending': {'color': '🟡', 'bg': '#FFF3CD'},
-                        'approved': {'color': '🟢', 'bg': '#D4EDDA'},
-                        'rejected': {'color': '🔴', 'bg': '#F8D7DA'}
-                    }
+                    with col2:
+                        end_date = st.date_input("📅 End Date", 
+                                               min_value=start_date if 'start_date' in locals() else datetime.now().date(),
+                                               help="Select the last day of your leave")
+                        reason = st.text_area("📝 Reason for Leave", 
+                                            placeholder="Please provide a detailed reason for your leave request...",
+                                            help="Explain why you need this leave")
                     
-                    config = status_config.get(request['status'], status_config['pending'])
+                    # Calculate working days
+                    if start_date and end_date:
+                        working_days = calculate_working_days(start_date.strftime("%Y-%m-%d"), 
+                                                            end_date.strftime("%Y-%m-%d"))
+                        total_days = (end_date - start_date).days + 1
+                        st.info(f"📊 **Leave Summary:** {total_days} total days ({working_days} working days)")
                     
-                    with st.expander(f"{config['color']} **{request['full_name']}** - {request['leave_type']} ({request['start_date']} to {request['end_date']})"):
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.markdown(f"**👤 Employee:** {request['full_name']}")
-                            st.markdown(f"**🏢 Department:** {request['department']}")
-                            st.markdown(f"**📋 Type:** {request['leave_type']}")
-                            st.markdown(f"**📊 Status:** {request['status'].title()}")
-                        
-                        with col2:
-                            st.markdown(f"**📅 Start Date:** {request['start_date']}")
-                            st.markdown(f"**📅 End Date:** {request['end_date']}")
-                            st.markdown(f"**📤 Requested:** {request['request_date']}")
-                            
-                            # Calculate days
-                            start = datetime.strptime(request['start_date'], "%Y-%m-%d").date()
-                            end = datetime.strptime(request['end_date'], "%Y-%m-%d").date()
-                            total_days = (end - start).days + 1
-                            working_days = calculate_working_days(request['start_date'], request['end_date'])
-                            st.markdown(f"**⏱️ Duration:** {total_days} total ({working_days} working)")
-                        
-                        with col3:
-                            st.markdown(f"**📝 Reason:** {request['reason']}")
-                            
-                            if request['status'] == 'pending':
-                                st.markdown("**🎯 Actions:**")
-                                col_approve, col_reject = st.columns(2)
-                                with col_approve:
-                                    if st.button(f"✅ Approve", key=f"approve_{request['id']}", use_container_width=True):
-                                        update_leave_status(request['id'], 'approved', user_data[1])
-                                        st.success("✅ Request approved!")
-                                        st.rerun()
-                                with col_reject:
-                                    if st.button(f"❌ Reject", key=f"reject_{request['id']}", use_container_width=True):
-                                        update_leave_status(request['id'], 'rejected', user_data[1])
-                                        st.success("❌ Request rejected!")
-                                        st.rerun()
-                            elif request['approved_by']:
-                                st.markdown(f"**✅ Processed by:** {request['approved_by']}")
-            else:
-                st.info("📭 No leave requests found.")
-        
-        elif selected_menu == "👥 Team Requests" and user_data[4] == 'manager':
-            st.subheader("👥 Team Leave Requests")
-            st.markdown(f"*Managing leave requests for {user_data[5]} department*")
-            
-            team_requests = get_team_leave_requests(user_data[5])
-            if not team_requests.empty:
-                for _, request in team_requests.iterrows():
-                    status_color = {
-                        'pending': '🟡',
-                        'approved': '🟢',
-                        'rejected': '🔴'
-                    }.get(request['status'], '⚪')
+                    submitted = st.form_submit_button("🚀 Submit Request", type="primary", use_container_width=True)
                     
-                    with st.expander(f"{status_color} **{request['full_name']}** - {request['leave_type']} ({request['start_date']} to {request['end_date']})"):
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.write(f"**👤 Employee:** {request['full_name']}")
-                            st.write(f"**📋 Type:** {request['leave_type']}")
-                            st.write(f"**📊 Status:** {request['status'].title()}")
-                        with col2:
-                            st.write(f"**📅 Dates:** {request['start_date']} to {request['end_date']}")
-                            st.write(f"**📤 Requested:** {request['request_date']}")
-                        with col3:
-                            st.write(f"**📝 Reason:** {request['reason']}")
-                            
-                            if request['status'] == 'pending':
-                                col_approve, col_reject = st.columns(2)
-                                with col_approve:
-                                    if st.button(f"✅ Approve", key=f"approve_{request['id']}"):
-                                        update_leave_status(request['id'], 'approved', user_data[1])
-                                        st.success("✅ Request approved!")
-                                        st.rerun()
-                                with col_reject:
-                                    if st.button(f"❌ Reject", key=f"reject_{request['id']}"):
-                                        update_leave_status(request['id'], 'rejected', user_data[1])
-                                        st.success("❌ Request rejected!")
-                                        st.rerun()
-            else:
-                st.info("📭 No team leave requests found.")
+                    if submitted:
+                        if start_date and end_date and reason.strip():
+                            if end_date >= start_date:
+                                try:
+                                    submit_leave_request(user_data[0], start_date.strftime("%Y-%m-%d"), 
+                                                       end_date.strftime("%Y-%m-%d"), leave_type, reason)
+                                except LeaveConflictError as e:
+                                    overlaps = ", ".join(f"{conflict['leave_type']} {conflict['start_date']} to {conflict['end_date']} ({conflict['status']})"
+                                                         for conflict in e.conflicts)
+                                    st.error(f"❌ These dates overlap your existing leave: {overlaps}")
+                                else:
+                                    st.success("✅ Leave request submitted successfully! Your manager will review it soon.")
+                                    st.balloons()
+                                    st.rerun()
+                            else:
+                                st.error("❌ End date must be after or equal to start date")
+                        else:
+                            st.error("❌ Please fill in all required fields")
+            
+            elif selected_menu == "📋 My Requests":
+                create_my_requests_view(user_data)
+            
+            elif selected_menu == "⚙️ Manage Requests" and user_data[4] == 'admin':
+                create_manage_requests_view(user_data)
+            
+            elif selected_menu == "👥 Team Requests" and user_data[4] == 'manager':
+                create_team_requests_view(user_data)
+            
+            elif selected_menu == "📊 Analytics" and user_data[4] == 'admin':
+                create_analytics_view()
+            
+            elif selected_menu == "📈 Performance" and user_data[4] == 'admin':
+                create_performance_view()
 
 if __name__ == "__main__":
-    main()
+    with rerun_spans():
+        main()
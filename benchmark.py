@@ -0,0 +1,379 @@
+"""Performance benchmarks for the Leave Planning System.
+
+Usage:
+    python benchmark.py run --users 2000 --requests 100000 --output head.json
+    python benchmark.py compare base.json head.json
+    python benchmark.py rows --rows 5000
+
+`run` generates a synthetic database in a temporary directory, times the data
+layer and the calendar bucketing directly, then renders every menu option
+headlessly through streamlit.testing.v1.AppTest. Results are written as JSON
+so runs from different commits can be compared with `compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import app
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+DEPARTMENTS = ["Operations", "Sales", "Finance", "IT", "HR", "Marketing",
+               "Customer Service", "Logistics", "Procurement", "Legal"]
+LEAVE_TYPES = ["Annual Leave", "Sick Leave", "Emergency Leave", "Maternity Leave", "Paternity Leave", "Hajj Leave"]
+LEAVE_TYPE_WEIGHTS = [0.62, 0.22, 0.08, 0.03, 0.02, 0.03]
+STATUSES = ["approved", "pending", "rejected"]
+STATUS_WEIGHTS = [0.7, 0.2, 0.1]
+DURATIONS = [1, 1, 1, 2, 2, 3, 4, 5, 7, 10, 14, 21, 30]
+# Relative demand per calendar month: summer holidays and year end are busiest
+MONTH_WEIGHTS = [0.8, 0.7, 0.8, 1.0, 0.9, 1.4, 2.0, 1.9, 0.9, 0.8, 0.8, 1.3]
+
+BENCH_PASSWORD = "bench123"
+
+
+def _normalise(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def generate_dataset(db_path, users=1000, requests=100000, first_year=2020, years=5, seed=42, chunk_size=50000):
+    """Create a migrated database at db_path filled with skewed, overlapping synthetic leave"""
+    rng = np.random.default_rng(seed)
+    app.DB_PATH = db_path
+    app.bootstrap_db(db_path, False)
+
+    # Department sizes follow a Zipf-like skew, so a few departments dominate the calendar
+    department_weights = _normalise([1 / (rank + 1) for rank in range(len(DEPARTMENTS))])
+    user_departments = rng.choice(len(DEPARTMENTS), size=users, p=department_weights)
+    password = app.hash_password(BENCH_PASSWORD)
+    user_rows = [("bench.admin", password, "Bench Admin", "admin", "IT")]
+    user_rows += [(f"bench.manager.{i}", password, f"Bench Manager {i}", "manager", department)
+                  for i, department in enumerate(DEPARTMENTS)]
+    user_rows += [(f"bench.user.{i}", password, f"Employee {i}", "employee", DEPARTMENTS[department])
+                  for i, department in enumerate(user_departments)]
+
+    with app.db_connection() as conn:
+        c = conn.cursor()
+        c.executemany("INSERT OR IGNORE INTO users (username, password, full_name, role, department) VALUES (?, ?, ?, ?, ?)",
+                      user_rows)
+        c.execute("SELECT id FROM users WHERE role = 'employee'")
+        employee_ids = np.array([row[0] for row in c.fetchall()])
+
+        month_probabilities = _normalise(MONTH_WEIGHTS)
+        inserted = 0
+        while inserted < requests:
+            size = min(chunk_size, requests - inserted)
+            year = rng.integers(first_year, first_year + years, size=size)
+            month = rng.choice(12, size=size, p=month_probabilities)
+            month_start = (year - 1970) * 12 + month
+            start = (month_start.astype('datetime64[M]').astype('datetime64[D]')
+                     + rng.integers(0, 28, size=size))
+            end = start + rng.choice(DURATIONS, size=size) - 1
+            requested = start - rng.integers(1, 45, size=size)
+            status = rng.choice(STATUSES, size=size, p=STATUS_WEIGHTS)
+            decided = requested + rng.integers(0, 15, size=size)
+            rows = zip(rng.choice(employee_ids, size=size).tolist(),
+                       np.datetime_as_string(start, unit='D').tolist(),
+                       np.datetime_as_string(end, unit='D').tolist(),
+                       rng.choice(LEAVE_TYPES, size=size, p=LEAVE_TYPE_WEIGHTS).tolist(),
+                       ["Synthetic request"] * size,
+                       status.tolist(),
+                       np.datetime_as_string(requested, unit='D').tolist(),
+                       np.where(status == 'pending', '', 'bench.admin').tolist(),
+                       (start.astype(np.int64) + app.EPOCH_ORDINAL).tolist(),
+                       (end.astype(np.int64) + app.EPOCH_ORDINAL).tolist(),
+                       (requested.astype(np.int64) + app.EPOCH_ORDINAL).tolist(),
+                       np.where(status == 'pending', None, np.datetime_as_string(decided, unit='D')).tolist())
+            c.executemany("INSERT INTO leave_requests (user_id, start_date, end_date, leave_type, reason, status, request_date, approved_by, start_day, end_day, request_day, decided_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          rows)
+            inserted += size
+        app.rebuild_derived_tables(c)
+        conn.commit()
+    app.invalidate_read_cache()
+    return {'users': len(user_rows), 'requests': requests, 'first_year': first_year, 'years': years, 'seed': seed}
+
+
+def _timings(func, repeat, *args, **kwargs):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+    }
+
+
+def bench_data_layer(repeat, year):
+    """Time the data functions with the read cache bypassed, plus one cached read for contrast"""
+    month_start, month_end = f"{year}-07-01", f"{year}-07-31"
+    leave_for_range = app.get_leave_for_date_range.__wrapped__
+    all_requests = app.get_all_leave_requests.__wrapped__
+
+    with app.db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT user_id FROM leave_requests GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1")
+        busiest_user = c.fetchone()[0]
+
+    month_data = leave_for_range(month_start, month_end)
+    year_data = leave_for_range(f"{year}-01-01", f"{year}-12-31")
+    requests = all_requests()
+    starts = requests['start_date'].to_numpy()
+    ends = requests['end_date'].to_numpy()
+    app.calculate_working_days(month_start, month_end)  # build the working-day calendar once
+
+    # The snapshot normally starts ACTIVE_LEAVE_YEARS_BACK before today; start it at the benchmark year instead
+    repository = app.leave_repository()
+    first_day = date(year, 1, 1).toordinal()
+
+    def load_snapshot():
+        return app.ActiveLeaveSnapshot.from_rows(repository.active_leave_rows(first_day), repository.leave_users(),
+                                                 first_day, 0)
+
+    snapshot = load_snapshot()
+
+    results = {
+        'get_leave_for_date_range.month': _timings(leave_for_range, repeat, month_start, month_end),
+        'get_leave_for_date_range.month_user': _timings(leave_for_range, repeat, month_start, month_end, busiest_user),
+        'get_leave_for_date_range.cached': _timings(app.get_leave_for_date_range, repeat, month_start, month_end),
+        'get_all_leave_requests': _timings(all_requests, max(1, repeat // 2)),
+        'calculate_working_days.single': _timings(app.calculate_working_days, repeat, month_start, month_end),
+        'calculate_working_days.batch_all': _timings(app.calculate_working_days_many, repeat, starts, ends),
+        'build_daily_occupancy.month': _timings(app.build_daily_occupancy, repeat, month_data,
+                                                date(year, 7, 1), date(year, 7, 31)),
+        'get_leave_for_date_range.year': _timings(leave_for_range, repeat, f"{year}-01-01", f"{year}-12-31"),
+        'build_leave_heatmap.year': _timings(app.build_leave_heatmap, repeat, year_data,
+                                             date(year, 1, 1), date(year, 12, 31), 'department'),
+        'active_leave_snapshot.load': _timings(load_snapshot, max(1, repeat // 2)),
+        'active_leave_snapshot.month': _timings(snapshot.leave_for_range, repeat, date(year, 7, 1).toordinal(),
+                                                date(year, 7, 31).toordinal()),
+        'active_leave_snapshot.year': _timings(snapshot.leave_for_range, repeat, first_day,
+                                               date(year, 12, 31).toordinal()),
+        'active_leave_snapshot.user': _timings(snapshot.user_requests, repeat, busiest_user),
+        'get_leave_rollups.all_years': _timings(app.get_leave_rollups.__wrapped__, repeat,
+                                                app.month_key(date(year - 10, 1, 1)), app.month_key(date(year, 12, 1))),
+        'leave_rollup_frame.year_from_rows': _timings(app.leave_rollup_frame, max(1, repeat // 2), year_data),
+    }
+    results['get_leave_for_date_range.month']['rows'] = len(month_data)
+    results['get_leave_for_date_range.year']['rows'] = len(year_data)
+    results['get_all_leave_requests']['rows'] = len(requests)
+    results['active_leave_snapshot.load']['rows'] = len(snapshot)
+    return results
+
+
+def _count_elements(node):
+    children = getattr(node, 'children', None)
+    if not children:
+        return 1
+    return sum(_count_elements(child) for child in children.values())
+
+
+def bench_pages(db_path, repeat, accounts=(("bench.admin", BENCH_PASSWORD), ("bench.manager.0", BENCH_PASSWORD))):
+    """Render every menu option headlessly and time the script run that draws it"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["LEAVE_PLANNER_DB"] = db_path
+    os.environ["LEAVE_PLANNER_SEED_DEMO"] = "0"
+    results = {}
+    for username, password in accounts:
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.run()
+        at.text_input[0].set_value(username)
+        at.text_input[1].set_value(password)
+        at.button[0].click().run()
+        at.run()
+        navigation = at.sidebar.selectbox[0]
+        for option in navigation.options:
+            if f"page.{option}" in results:
+                continue
+            at.sidebar.selectbox[0].set_value(option).run()
+            if at.exception:
+                raise RuntimeError(f"{option} raised: {at.exception[0].message}")
+            timing = _timings(at.run, repeat)
+            timing['elements'] = _count_elements(at._tree)
+            results[f"page.{option}"] = timing
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP_PATH), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(users, requests, years, repeat, seed, skip_pages=False, db_path=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, "benchmark.db")
+        started = time.perf_counter()
+        dataset = generate_dataset(db_path, users=users, requests=requests, years=years, seed=seed)
+        dataset['generate_seconds'] = round(time.perf_counter() - started, 2)
+
+        results = bench_data_layer(repeat, dataset['first_year'] + years // 2)
+        if not skip_pages:
+            results.update(bench_pages(db_path, repeat))
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+
+
+def compare_results(base, head, threshold):
+    """Print median timings side by side; returns the names that regressed beyond the threshold"""
+    regressions = []
+    print(f"{'benchmark':<48} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for name in sorted(set(base['results']) | set(head['results'])):
+        before = base['results'].get(name, {}).get('median_ms')
+        after = head['results'].get(name, {}).get('median_ms')
+        if before is None or after is None:
+            print(f"{name:<48} {before if before is not None else '-':>10} {after if after is not None else '-':>10}")
+            continue
+        change = (after - before) / before if before else 0.0
+        marker = ""
+        if change > threshold:
+            regressions.append(name)
+            marker = "  <-- regression"
+        print(f"{name:<48} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{marker}")
+    return regressions
+
+
+def synthetic_request_frame(rows, seed=42):
+    rng = random.Random(seed)
+    first_day = date(2024, 1, 1)
+    records = []
+    for request_id in range(1, rows + 1):
+        start = first_day + timedelta(days=rng.randint(0, 700))
+        end = start + timedelta(days=rng.choice([0, 0, 1, 2, 4, 6, 13, 20]))
+        records.append({
+            'id': request_id,
+            'user_id': rng.randint(1, max(1, rows // 10)),
+            'start_date': start.strftime("%Y-%m-%d"),
+            'end_date': end.strftime("%Y-%m-%d"),
+            'leave_type': rng.choice(["Annual Leave", "Sick Leave", "Emergency Leave"]),
+            'reason': "Synthetic request",
+            'status': rng.choice(['approved', 'approved', 'pending', 'rejected']),
+            'request_date': (start - timedelta(days=rng.randint(1, 30))).strftime("%Y-%m-%d"),
+            'approved_by': "",
+            'full_name': f"Employee {request_id % 997}",
+            'department': rng.choice(["HR", "Finance", "Operations", "Marketing", "IT", "Sales"]),
+        })
+    return pd.DataFrame.from_records(records)
+
+
+def _legacy_row_loop(requests):
+    # The per-row work the views did before prepare_request_rows(): a Series per row,
+    # a rebuilt status dict, two strptime calls and a working-day count
+    labels = []
+    for _, request in requests.iterrows():
+        status_config = {
+            'pending': {'color': '🟡', 'bg': '#FFF3CD', 'text': 'Pending Review'},
+            'approved': {'color': '🟢', 'bg': '#D4EDDA', 'text': 'Approved'},
+            'rejected': {'color': '🔴', 'bg': '#F8D7DA', 'text': 'Rejected'}
+        }
+        config = status_config.get(request['status'], status_config['pending'])
+        start = datetime.strptime(request['start_date'], "%Y-%m-%d").date()
+        end = datetime.strptime(request['end_date'], "%Y-%m-%d").date()
+        total_days = (end - start).days + 1
+        working_days = app.calculate_working_days(request['start_date'], request['end_date'])
+        labels.append(f"{config['color']} {request['full_name']} {total_days} ({working_days})")
+    return labels
+
+
+def _pipeline_row_loop(requests):
+    labels = []
+    for request in app.prepare_request_rows(requests).itertuples(index=False):
+        labels.append(f"{request.status_emoji} {request.full_name} {request.total_days} ({request.working_days})")
+    return labels
+
+
+def _best_of(func, *args, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_row_rendering(rows):
+    requests = synthetic_request_frame(rows)
+    app.calculate_working_days("2024-01-01", "2024-01-01")  # build the working-day calendar up front
+    legacy = _best_of(_legacy_row_loop, requests)
+    pipeline = _best_of(_pipeline_row_loop, requests)
+    return {
+        'rows': rows,
+        'legacy_us_per_row': round(legacy / rows * 1e6, 2),
+        'pipeline_us_per_row': round(pipeline / rows * 1e6, 2),
+        'speedup': round(legacy / pipeline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave Planner performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="generate a synthetic database and time the data layer and pages")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--requests", type=int, default=100000, help="leave requests to generate (1k-1M)")
+    run_parser.add_argument("--years", type=int, default=5)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--skip-pages", action="store_true", help="skip the headless AppTest page renders")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression")
+    compare_parser.add_argument("--fail-on-regression", action="store_true")
+
+    rows_parser = subparsers.add_parser("rows", help="per-row cost of request list rendering")
+    rows_parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_benchmarks(args.users, args.requests, args.years, args.repeat, args.seed, args.skip_pages)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        for name, timing in report['results'].items():
+            print(f"{name:<48} median {timing['median_ms']:>10.3f} ms  p95 {timing['p95_ms']:>10.3f} ms")
+        print(f"Wrote {args.output}")
+
+    elif args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        regressions = compare_results(base, head, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+    elif args.command == "rows":
+        result = bench_row_rendering(args.rows)
+        print(f"{result['rows']} rows: legacy {result['legacy_us_per_row']} µs/row, "
+              f"pipeline {result['pipeline_us_per_row']} µs/row ({result['speedup']}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Maintenance commands for the Leave Planning System.
+
+Usage:
+    python manage.py reconcile-balances
+    python manage.py rebuild-rollups
+    python manage.py audit-overlaps
+    python manage.py export --format parquet --output leave.parquet --department Finance
+    python manage.py import-users users.csv
+    python manage.py import-leave leave_history.csv --rejected rejected.csv
+    python manage.py archive-leave --before 2023-01-01
+
+Commands run against the database named by LEAVE_PLANNER_DB and apply any
+pending schema migrations first.
+"""
+import argparse
+
+import app
+
+
+def reconcile_balances(args):
+    corrected = app.reconcile_leave_balances()
+    print(f"Reconciled leave balances: {corrected} user/year total(s) corrected")
+
+
+def rebuild_rollups(args):
+    rows = app.rebuild_leave_rollups()
+    print(f"Rebuilt monthly leave rollups: {rows} row(s)")
+
+
+def audit_overlaps(args):
+    overlaps = app.audit_leave_overlaps()
+    if overlaps.empty:
+        print("No overlapping requests found")
+    else:
+        print(overlaps.to_string(index=False))
+
+
+def export(args):
+    rows = app.export_leave_history(args.output, args.format, args.start_date, args.end_date,
+                                    args.department, args.chunk_size)
+    print(f"Exported {rows} leave requests to {args.output}")
+
+
+def _print_import_summary(summary):
+    print(f"Read {summary['rows_read']} rows in {summary['seconds']}s ({summary['rows_per_second']} rows/sec): "
+          f"{summary['rows_imported']} imported, {summary['rows_skipped']} already present, "
+          f"{summary['rows_rejected']} rejected")
+    if summary['rejected_path']:
+        print(f"Rejected rows written to {summary['rejected_path']}")
+
+
+def import_users(args):
+    _print_import_summary(app.import_users_csv(args.path, args.chunk_size, args.rejected))
+
+
+def import_leave(args):
+    _print_import_summary(app.import_leave_requests_csv(args.path, args.chunk_size, args.rejected))
+
+
+def archive_leave(args):
+    before_day = app.day_ordinal(args.before) if args.before else None
+    moved = app.archive_leave_history(before_day, args.batch_size)
+    if not moved:
+        print("No decided requests to archive")
+    for year, requests in moved.items():
+        print(f"Archived {requests} request(s) starting in {year} to {app.leave_archive_table(year)}")
+    for year, requests in app.leave_archive_stats().items():
+        print(f"{app.leave_archive_table(year)}: {requests} request(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave Planner maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("reconcile-balances", help="rebuild leave balance totals from approved history"
+                          ).set_defaults(handler=reconcile_balances)
+    subparsers.add_parser("rebuild-rollups", help="recompute the monthly leave rollups from the whole history"
+                          ).set_defaults(handler=rebuild_rollups)
+    subparsers.add_parser("audit-overlaps", help="list every pair of overlapping pending/approved requests"
+                          ).set_defaults(handler=audit_overlaps)
+    export_parser = subparsers.add_parser("export", help="stream leave history to CSV or Parquet (needs pyarrow)")
+    export_parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--start-date", help="only requests ending on or after YYYY-MM-DD")
+    export_parser.add_argument("--end-date", help="only requests starting on or before YYYY-MM-DD")
+    export_parser.add_argument("--department")
+    export_parser.add_argument("--chunk-size", type=int, default=app.EXPORT_CHUNK_SIZE)
+    export_parser.set_defaults(handler=export)
+    for name, handler, help_text in [
+        ("import-users", import_users, "bulk-load users from CSV"),
+        ("import-leave", import_leave, "bulk-load historical leave requests from CSV"),
+    ]:
+        import_parser = subparsers.add_parser(name, help=help_text)
+        import_parser.add_argument("path")
+        import_parser.add_argument("--chunk-size", type=int, default=app.IMPORT_CHUNK_SIZE)
+        import_parser.add_argument("--rejected", help="write rejected rows with the reason to this CSV")
+        import_parser.set_defaults(handler=handler)
+    archive_parser = subparsers.add_parser("archive-leave", help="move decided requests past the horizon into "
+                                           "per-year archive tables")
+    archive_parser.add_argument("--before", help="archive requests ending before YYYY-MM-DD (default: "
+                                "1 January LEAVE_PLANNER_ARCHIVE_AFTER_YEARS years ago)")
+    archive_parser.add_argument("--batch-size", type=int, default=app.ARCHIVE_BATCH_SIZE)
+    archive_parser.set_defaults(handler=archive_leave)
+    args = parser.parse_args()
+
+    app.init_db()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A freshly migrated SQLite database seeded with the demo accounts and leave"""
+    monkeypatch.setattr(app, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "leave_planner.db"))
+    monkeypatch.setattr(app, "SEED_DEMO_DATA", True)
+    app.init_db()
+    yield app.DB_PATH
+    app.invalidate_read_cache()
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pandas as pd
+
+import app
+
+
+def table(db_path, name, order_by):
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql_query(f"SELECT * FROM {name} ORDER BY {order_by}", conn)
+
+
+def rebuilt(db_path, name, order_by):
+    """The table as rebuild_derived_tables recomputes it from scratch, rolled back afterwards"""
+    with sqlite3.connect(db_path) as conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        app.rebuild_derived_tables(c)
+        frame = pd.read_sql_query(f"SELECT * FROM {name} ORDER BY {order_by}", conn)
+        conn.rollback()
+    return frame
+
+
+def query_plan(db_path, query, params):
+    with sqlite3.connect(db_path) as conn:
+        return " | ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+
+
+def make_changes():
+    """Submit, approve, reject and reopen requests across a year boundary and several departments"""
+    submitted = [
+        app.submit_leave_request(2, "2024-12-30", "2025-01-03", "Annual Leave", "New year", allow_overlap=True),
+        app.submit_leave_request(3, "2024-11-11", "2024-11-14", "Sick Leave", "Flu", allow_overlap=True),
+        app.submit_leave_request(6, "2024-12-01", "2024-12-02", "Annual Leave", "Errands", allow_overlap=True),
+    ]
+    app.bulk_update_leave_status([submitted[0], 2, 4], 'approved', 'admin')
+    app.bulk_update_leave_status([submitted[1], 6], 'rejected', 'admin')
+    # Approved leave moved back to pending is credited and leaves its coverage and rollup rows
+    app.bulk_update_leave_status([1, submitted[0]], 'pending', 'admin')
+    return submitted
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+import numpy as np
+from pandas.testing import assert_frame_equal
+
+import app
+
+
+def submit_upcoming_leave(count):
+    today = date.today()
+    for offset in range(0, count * 10, 10):
+        start = today + timedelta(days=offset)
+        app.submit_leave_request(2 + offset // 10 % 5, start.isoformat(), (start + timedelta(days=2)).isoformat(),
+                                 "Annual Leave", "Planned", allow_overlap=True)
+
+
+def snapshot_columns(snapshot):
+    return snapshot._columns(np.arange(len(snapshot)))
+
+
+def test_incremental_snapshot_matches_full_load(db):
+    today = date.today()
+    submit_upcoming_leave(8)
+    repository = app.leave_repository()
+    store = app.ActiveLeaveStore(repository)
+    store.snapshot()
+    
+    latest = app.submit_leave_request(3, today.isoformat(), today.isoformat(), "Sick Leave", "", allow_overlap=True)
+    app.bulk_update_leave_status([latest - 1, latest - 2], 'approved', 'admin')
+    store.mark_stale()
+    incremental = store.snapshot()
+    assert store.stats()['incremental_refreshes'] == 1
+    
+    first_day = app.active_leave_first_day()
+    full = app.ActiveLeaveSnapshot.from_rows(repository.active_leave_rows(first_day), repository.leave_users(),
+                                             first_day, repository.latest_leave_change())
+    assert incremental.seq == full.seq
+    for name, values in snapshot_columns(full).items():
+        np.testing.assert_array_equal(snapshot_columns(incremental)[name], values, err_msg=name)
+
+
+def test_snapshot_reads_match_the_database(db):
+    submit_upcoming_leave(8)
+    first, last = date.today(), date.today() + timedelta(days=40)
+    
+    from_snapshot = app.calendar_leave(first, last)
+    from_database = app.get_leave_for_date_range(first.isoformat(), last.isoformat())
+    columns = list(from_snapshot.columns)
+    assert_frame_equal(from_snapshot.sort_values('id').reset_index(drop=True),
+                       from_database[columns].sort_values('id').reset_index(drop=True), check_dtype=False)
+    
+    snapshot = app.active_leave_snapshot()
+    requests = app.get_user_leave_requests(2)
+    active = requests[requests['end_date'] >= date.fromordinal(snapshot.first_day).isoformat()]
+    assert snapshot.user_requests(2)['id'].tolist() == active['id'].tolist()
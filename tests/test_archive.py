@@ -0,0 +1,58 @@
+from datetime import date
+
+from pandas.testing import assert_frame_equal
+
+import app
+from helpers import make_changes, rebuilt, table
+
+
+def archived_reads():
+    return {
+        'all': app.get_all_leave_requests(include_history=True),
+        'user': app.get_user_leave_requests(2, include_history=True),
+        'range': app.get_leave_for_date_range("2024-10-01", "2024-12-31"),
+        'user_range': app.get_leave_for_date_range("2024-10-01", "2024-12-31", user_id=4),
+        'rollups': app.get_leave_rollups(app.month_key(date(2024, 1, 1)), app.month_key(date(2025, 12, 1))),
+        'balance': app.get_leave_balance(2, 2024),
+    }
+
+
+def test_archiving_keeps_reads_and_derived_tables(db):
+    make_changes()
+    before = archived_reads()
+    
+    moved = app.archive_leave_history(before_day=date(2025, 1, 1).toordinal())
+    
+    assert moved and set(moved) == {2024}
+    after = archived_reads()
+    for name in ('all', 'user', 'range', 'user_range'):
+        order = ['id']
+        assert_frame_equal(after[name].sort_values(order).reset_index(drop=True),
+                           before[name].sort_values(order).reset_index(drop=True), obj=name)
+    assert_frame_equal(after['rollups'], before['rollups'])
+    assert after['balance'] == before['balance']
+    assert app.reconcile_leave_balances() == 0
+    order_by = "department, day, status"
+    assert_frame_equal(table(db, "leave_coverage", order_by), rebuilt(db, "leave_coverage", order_by))
+
+
+def test_pending_and_newest_requests_stay_put(db):
+    moved = app.archive_leave_history(before_day=date(2025, 1, 1).toordinal())
+    
+    # Approved requests 1, 3 and 5 move; pending ones and the newest id stay in leave_requests
+    assert moved == {2024: 3}
+    assert app.leave_archive_stats() == {2024: 3}
+    assert sorted(app.get_all_leave_requests()['id']) == [2, 4, 6]
+    assert app.archive_leave_history(before_day=date(2025, 1, 1).toordinal()) == {}
+    new_id = app.submit_leave_request(2, "2026-03-01", "2026-03-02", "Annual Leave", "After archiving")
+    assert new_id == 7
+
+
+def test_archiving_never_reaches_into_the_active_snapshot(db):
+    app.submit_leave_request(2, date.today().isoformat(), date.today().isoformat(), "Sick Leave", "")
+    app.bulk_update_leave_status([7], 'approved', 'admin')
+    app.submit_leave_request(3, date.today().isoformat(), date.today().isoformat(), "Sick Leave", "")
+    
+    app.archive_leave_history(before_day=date.today().toordinal() + 30)
+    
+    assert 7 in set(app.get_all_leave_requests()['id'])
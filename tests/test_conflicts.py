@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+import app
+from helpers import query_plan
+
+
+def test_overlapping_submission_is_rejected(db):
+    with pytest.raises(app.LeaveConflictError) as excinfo:
+        app.submit_leave_request(2, "2024-10-17", "2024-10-20", "Annual Leave", "Overlaps the approved leave")
+    
+    assert [conflict['id'] for conflict in excinfo.value.conflicts] == [1]
+    # Rejected leave no longer blocks the dates
+    app.bulk_update_leave_status([1], 'rejected', 'admin')
+    assert app.submit_leave_request(2, "2024-10-17", "2024-10-20", "Annual Leave", "Rebooked")
+
+
+def test_audit_lists_overlaps_allowed_through(db):
+    second = app.submit_leave_request(2, "2024-10-16", "2024-10-18", "Annual Leave", "Approved anyway",
+                                      allow_overlap=True)
+    
+    overlaps = app.audit_leave_overlaps()
+    assert overlaps[['first_id', 'second_id']].values.tolist() == [[1, second]]
+
+
+def test_conflict_check_reads_user_day_index(db):
+    statements = []
+    with sqlite3.connect(db) as conn:
+        conn.set_trace_callback(statements.append)
+        app._find_leave_conflicts(conn.cursor(), 2, "2024-03-01", "2024-03-10")
+    
+    plan = query_plan(db, statements[-1], ())
+    assert "idx_leave_requests_user_days" in plan
+    assert "SCAN leave_requests" not in plan
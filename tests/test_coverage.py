@@ -0,0 +1,19 @@
+from pandas.testing import assert_frame_equal
+
+import app
+from helpers import make_changes, rebuilt, table
+
+
+def test_incremental_coverage_matches_rebuild(db):
+    make_changes()
+    
+    order_by = "department, day, status"
+    assert_frame_equal(table(db, "leave_coverage", order_by), rebuilt(db, "leave_coverage", order_by))
+
+
+def test_peak_absences_follow_status_changes(db):
+    assert app.get_max_concurrent_absences("HR", "2024-10-01", "2024-10-31") == (1, "2024-10-15")
+    
+    app.bulk_update_leave_status([1], 'rejected', 'admin')
+    
+    assert app.get_max_concurrent_absences("HR", "2024-10-01", "2024-10-31") == (0, None)
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import app
+
+
+def leave_request_indexes(db_path):
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'leave_requests' AND sql IS NOT NULL").fetchall()
+    return {name for (name,) in rows}
+
+
+def test_import_users_rejects_non_finite_and_fractional_balances(db, tmp_path):
+    path = tmp_path / "users.csv"
+    pd.DataFrame({
+        'username': ["u_inf", "u_huge", "u_half", "u_ok"],
+        'password': ["pw"] * 4,
+        'full_name': ["A", "B", "C", "D"],
+        'role': ["employee"] * 4,
+        'department': ["Finance"] * 4,
+        'annual_leave_balance': ["inf", "1e400", "2.5", "21"],
+    }).to_csv(path, index=False)
+    
+    summary = app.import_users_csv(str(path), rejected_path=str(tmp_path / "rejected.csv"))
+    
+    assert summary['rows_imported'] == 1
+    assert summary['rows_rejected'] == 3
+    rejected = pd.read_csv(tmp_path / "rejected.csv")
+    assert set(rejected['error']) == {"invalid annual_leave_balance"}
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT annual_leave_balance FROM users WHERE username = 'u_ok'").fetchone() == (21,)
+
+
+def test_failed_leave_import_restores_indexes(db, tmp_path):
+    indexes = leave_request_indexes(db)
+    path = tmp_path / "leave.csv"
+    pd.DataFrame({
+        'username': ["ahmed.ali", "sara.hassan"],
+        'start_date': ["2024-03-04", "2024-04-01"],
+        'end_date': ["2024-03-05", "2024-04-02"],
+        'leave_type': ["Annual Leave"] * 2,
+    }).to_csv(path, index=False)
+    
+    # Fail inside the chunk's own transaction, after part of the chunk was written
+    with sqlite3.connect(db) as conn:
+        before = conn.execute("SELECT COUNT(*) FROM leave_requests").fetchone()[0]
+        conn.execute("CREATE TRIGGER fail_import BEFORE INSERT ON leave_requests WHEN NEW.start_date = '2024-04-01' BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    
+    with pytest.raises(sqlite3.IntegrityError, match="disk full"):
+        app.import_leave_requests_csv(str(path))
+    
+    assert leave_request_indexes(db) == indexes
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM leave_requests").fetchone()[0] == before
+
+
+def write_users(path, usernames):
+    pd.DataFrame({
+        'username': usernames,
+        'password': ["pw"] * len(usernames),
+        'full_name': [""] * len(usernames),
+        'role': ["employee"] * len(usernames),
+        'department': ["Finance"] * len(usernames),
+        'annual_leave_balance': [""] * len(usernames),
+    }).to_csv(path, index=False)
+
+
+@pytest.mark.parametrize("chunk_size", [10, 1])
+def test_import_users_rejects_duplicates_after_stripping(db, tmp_path, chunk_size):
+    path = tmp_path / "users.csv"
+    write_users(path, ["alice", " alice ", "bob", "bob"])
+    
+    summary = app.import_users_csv(str(path), chunk_size=chunk_size, rejected_path=str(tmp_path / "rejected.csv"))
+    
+    assert (summary['rows_imported'], summary['rows_skipped'], summary['rows_rejected']) == (2, 0, 2)
+    rejected = pd.read_csv(tmp_path / "rejected.csv", keep_default_na=False)
+    assert rejected['username'].tolist() == [" alice ", "bob"]
+    assert set(rejected['error']) == {"duplicate username in file"}
+
+
+def test_import_users_skips_usernames_already_in_the_database(db, tmp_path):
+    path = tmp_path / "users.csv"
+    write_users(path, ["ahmed.ali", "carol"])
+    
+    summary = app.import_users_csv(str(path), rejected_path=str(tmp_path / "rejected.csv"))
+    
+    assert (summary['rows_imported'], summary['rows_skipped'], summary['rows_rejected']) == (1, 1, 0)
+    assert summary['rejected_path'] is None
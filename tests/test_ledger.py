@@ -0,0 +1,26 @@
+import app
+from helpers import make_changes, table
+
+
+def test_incremental_ledger_matches_rebuild(db):
+    make_changes()
+    
+    assert app.reconcile_leave_balances() == 0
+    balances = table(db, "leave_balances", "user_id, year")
+    assert balances.loc[balances['user_id'] == 1, 'used_days'].sum() == 0
+
+
+def test_approval_debits_each_year_and_reopening_credits_it_back(db):
+    request_id = app.submit_leave_request(2, "2024-12-30", "2025-01-03", "Annual Leave", "New year",
+                                          allow_overlap=True)
+    before = app.get_leave_balance(2, 2024)['used']
+    
+    app.update_leave_status(request_id, 'approved', 'admin')
+    assert app.get_leave_balance(2, 2024)['used'] == before + app.calculate_working_days("2024-12-30", "2024-12-31")
+    assert app.get_leave_balance(2, 2025)['used'] == app.calculate_working_days("2025-01-01", "2025-01-03")
+    
+    app.update_leave_status(request_id, 'rejected', 'admin')
+    assert app.get_leave_balance(2, 2024)['used'] == before
+    assert app.get_leave_balance(2, 2025)['used'] == 0
+    entries = table(db, "leave_ledger", "id")
+    assert entries.loc[entries['request_id'] == request_id, 'days'].sum() == 0
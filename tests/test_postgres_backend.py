@@ -0,0 +1,119 @@
+"""The repository contract against PostgreSQL.
+
+Runs against LEAVE_PLANNER_POSTGRES_DSN when it is set, otherwise against a
+throwaway server started with pgserver; skipped when neither is available.
+Each test gets its own freshly created database.
+"""
+import os
+import uuid
+
+import pytest
+
+import app
+
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.extensions import make_dsn
+
+
+@pytest.fixture(scope="module")
+def server_dsn(tmp_path_factory):
+    dsn = os.environ.get("LEAVE_PLANNER_POSTGRES_DSN")
+    if dsn:
+        return dsn
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop")
+    return make_dsn(server.get_uri())
+
+
+def _admin(dsn, sql):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as c:
+            c.execute(sql)
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def pg(server_dsn, monkeypatch):
+    """DSN of a fresh database bootstrapped with the demo data, with the app pointed at it"""
+    name = f"leave_planner_test_{uuid.uuid4().hex[:12]}"
+    try:
+        _admin(server_dsn, f"CREATE DATABASE {name}")
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not reachable: {e}")
+    dsn = make_dsn(server_dsn, dbname=name)
+    monkeypatch.setattr(app, "STORAGE_BACKEND", "postgres")
+    monkeypatch.setattr(app, "POSTGRES_DSN", dsn)
+    monkeypatch.setattr(app, "SEED_DEMO_DATA", True)
+    monkeypatch.setattr(app, "CHANGE_TOKEN_POLL_SECONDS", 0)
+    app.init_db()
+    yield dsn
+    app.invalidate_read_cache()
+    app.leave_repository()._pool.closeall()
+    app.get_leave_repository.clear()
+    app.get_active_leave_store.clear()
+    _admin(server_dsn, f"DROP DATABASE {name} WITH (FORCE)")
+
+
+def test_keyset_pages_walk_every_request_once(pg):
+    seen = []
+    after = None
+    while True:
+        page = app.get_leave_requests_page(page_size=4, after=after)
+        if page.empty:
+            break
+        seen += page['id'].tolist()
+        last = page.iloc[-1]
+        after = (int(last['request_day']), int(last['id']))
+    
+    assert seen == [6, 5, 4, 3, 2, 1]
+    assert app.count_leave_requests() == 6
+    assert app.count_leave_requests('pending') == 3
+    assert app.count_leave_requests(None, 'HR') == 2
+
+
+def test_date_range_reads_use_inclusive_overlap(pg):
+    assert sorted(app.get_leave_for_date_range("2024-11-01", "2024-11-30")['id']) == [2, 3, 5]
+    assert sorted(app.get_leave_for_date_range("2024-10-17", "2024-12-20", user_id=2)['id']) == [1, 4]
+    assert app.get_leave_for_date_range("2024-10-18", "2024-11-04").empty
+
+
+def test_overlapping_submission_is_rejected(pg):
+    assert [conflict['id'] for conflict in app.find_leave_conflicts(2, "2024-10-16", "2024-10-20")] == [1]
+    with pytest.raises(app.LeaveConflictError):
+        app.submit_leave_request(2, "2024-10-16", "2024-10-20", "Annual Leave", "Overlap")
+    
+    request_id = app.submit_leave_request(2, "2024-10-18", "2024-10-20", "Annual Leave", "Next to it")
+    assert app.find_leave_conflicts(2, "2024-10-20", "2024-10-20")[0] == {
+        'id': request_id, 'start_date': "2024-10-18", 'end_date': "2024-10-20", 'leave_type': "Annual Leave",
+        'status': "pending"}
+
+
+def test_approval_debits_and_rejection_credits_the_balance(pg):
+    request_id = app.submit_leave_request(2, "2025-01-05", "2025-01-09", "Annual Leave", "Trip")
+    
+    results = app.bulk_update_leave_status([request_id, 999, 1], 'approved', 'admin')
+    assert results == {request_id: 'updated', 999: 'not_found', 1: 'unchanged'}
+    assert app.get_leave_balance(2, 2025)['used'] == app.calculate_working_days("2025-01-05", "2025-01-09")
+    
+    app.update_leave_status(request_id, 'rejected', 'admin')
+    assert app.get_leave_balance(2, 2025)['used'] == 0
+    assert app.get_leave_balance(2, 2024)['used'] == app.calculate_working_days("2024-10-15", "2024-10-17")
+
+
+def test_writes_from_another_replica_invalidate_the_read_cache(pg):
+    assert app.count_leave_requests() == 6
+    assert app.get_leave_balance(3, 2026)['used'] == 0
+    other = app.PostgresLeaveRepository(pg, size=2)
+    try:
+        seq = other.latest_leave_change()
+        request_id = other.submit_leave_request(3, "2026-01-04", "2026-01-08", "Annual Leave", "Replica", False)
+        other.bulk_update_leave_status([request_id], 'approved', 'admin')
+    finally:
+        other._pool.closeall()
+    
+    assert app.count_leave_requests() == 7
+    assert app.get_leave_balance(3, 2026)['used'] == app.calculate_working_days("2026-01-04", "2026-01-08")
+    assert app.leave_repository().leave_changes_since(seq) == [request_id]
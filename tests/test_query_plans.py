@@ -0,0 +1,66 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import app
+from helpers import query_plan
+
+
+# The range reads as they stood before the day-number columns, indexes and month buckets
+BASELINE_RANGE_QUERY = """
+SELECT lr.*, u.full_name, u.department
+FROM leave_requests lr
+JOIN users u ON lr.user_id = u.id
+WHERE lr.start_date <= ? AND lr.end_date >= ?
+"""
+BASELINE_USER_RANGE_QUERY = """
+SELECT lr.*, u.full_name, u.department
+FROM leave_requests lr
+JOIN users u ON lr.user_id = u.id
+WHERE lr.user_id = ? AND lr.start_date <= ? AND lr.end_date >= ?
+"""
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """A database with only the initial schema: no indexes, day numbers or month buckets"""
+    path = str(tmp_path / "baseline.db")
+    with sqlite3.connect(path) as conn:
+        version, description, migrate = app.MIGRATIONS[0]
+        migrate(conn.cursor())
+    return path
+
+
+def captured_queries(monkeypatch):
+    queries = []
+    read_sql_query = pd.read_sql_query
+    
+    def capture(query, conn, params=None, **kwargs):
+        queries.append((query, params or ()))
+        return read_sql_query(query, conn, params=params, **kwargs)
+    
+    monkeypatch.setattr(app.pd, "read_sql_query", capture)
+    return queries
+
+
+def test_calendar_range_reads_month_buckets(db, baseline_db, monkeypatch):
+    before = query_plan(baseline_db, BASELINE_RANGE_QUERY, ("2024-03-31", "2024-03-01"))
+    assert "SCAN lr" in before
+    
+    queries = captured_queries(monkeypatch)
+    app.leave_repository().leave_for_date_range("2024-03-01", "2024-03-31")
+    
+    plan = query_plan(db, *queries[-1])
+    assert "SEARCH leave_request_months USING PRIMARY KEY" in plan
+    assert "SCAN lr" not in plan
+
+
+def test_user_range_reads_user_day_index(db, baseline_db, monkeypatch):
+    before = query_plan(baseline_db, BASELINE_USER_RANGE_QUERY, (2, "2024-03-31", "2024-03-01"))
+    assert "SCAN lr" in before
+    
+    queries = captured_queries(monkeypatch)
+    app.leave_repository().leave_for_date_range("2024-03-01", "2024-03-31", user_id=2)
+    
+    assert "idx_leave_requests_user_days" in query_plan(db, *queries[-1])
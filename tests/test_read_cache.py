@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import app
+
+WRITER = textwrap.dedent("""
+    import app
+    app.init_db()
+    request_id = app.submit_leave_request(2, "2026-03-01", "2026-03-05", "Annual Leave", "Other process",
+                                          allow_overlap=True)
+    app.bulk_update_leave_status([request_id], 'approved', 'admin')
+""")
+
+
+def write_from_another_process(db_path):
+    env = dict(os.environ, LEAVE_PLANNER_DB=db_path, LEAVE_PLANNER_BACKEND="sqlite", LEAVE_PLANNER_SEED_DEMO="0")
+    subprocess.run([sys.executable, "-c", WRITER], env=env, check=True, capture_output=True,
+                   cwd=os.path.dirname(app.__file__))
+
+
+def test_other_process_writes_invalidate_the_read_cache(db, monkeypatch):
+    monkeypatch.setattr(app, "CHANGE_TOKEN_POLL_SECONDS", 0)
+    assert len(app.get_all_leave_requests()) == 6
+    assert app.get_leave_balance(2, 2026)['used'] == 0
+    
+    write_from_another_process(db)
+    
+    assert len(app.get_all_leave_requests()) == 7
+    assert app.get_leave_balance(2, 2026)['used'] == 5
+
+
+def test_data_version_is_polled_at_most_once_per_interval(db, monkeypatch):
+    monkeypatch.setattr(app, "CHANGE_TOKEN_POLL_SECONDS", 3600)
+    repository = app.leave_repository()
+    repository._token_checked = float('-inf')
+    token = repository.change_token()
+    
+    write_from_another_process(db)
+    
+    assert repository.change_token() == token
+    assert repository.data_version() != token
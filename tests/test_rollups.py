@@ -0,0 +1,33 @@
+from datetime import date
+
+from pandas.testing import assert_frame_equal
+
+import app
+from helpers import make_changes, rebuilt, table
+
+
+def test_incremental_rollups_match_rebuild(db):
+    make_changes()
+    
+    order_by = ", ".join(app.LEAVE_ROLLUP_KEYS)
+    assert_frame_equal(table(db, "leave_rollups", order_by), rebuilt(db, "leave_rollups", order_by))
+
+
+def test_request_counts_match_the_requests_overlapping_the_months(db):
+    make_changes()
+    first_month, last_month = app.month_key(date(2024, 11, 1)), app.month_key(date(2025, 1, 1))
+    
+    counts = app.rollup_request_counts(app.get_leave_rollups(first_month, last_month), first_month, 'status')
+    
+    requests = app.get_leave_for_date_range("2024-11-01", "2025-01-31")
+    assert counts[counts > 0].to_dict() == requests['status'].value_counts().to_dict()
+
+
+def test_decisions_are_counted_in_the_month_they_were_made(db):
+    request_id = app.submit_leave_request(2, "2024-12-30", "2025-01-03", "Annual Leave", "New year",
+                                          allow_overlap=True)
+    app.update_leave_status(request_id, 'approved', 'admin')
+    
+    this_month = app.month_key(date.today())
+    rollups = app.get_leave_rollups(this_month, this_month)
+    assert rollups.loc[rollups['status'] == 'approved', 'decisions'].sum() == 1
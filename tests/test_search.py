@@ -0,0 +1,34 @@
+from datetime import date
+
+import app
+from helpers import query_plan
+
+
+def search(text, **filters):
+    return app.search_leave_requests(app.leave_search_query(text), **filters)
+
+
+def test_search_matches_names_reasons_and_types_by_prefix(db):
+    assert set(search("ahm")['id']) == {1, 4}
+    assert search("wedd")['id'].tolist() == [4]
+    assert set(search("sick")['id']) == {3}
+    assert search("ahmed wedding")['id'].tolist() == [4]
+    assert app.count_leave_search(app.leave_search_query("annual")) == 5
+
+
+def test_search_follows_status_changes_and_filters(db):
+    app.bulk_update_leave_status([4], 'approved', 'admin')
+    
+    assert search("ahmed", status='approved')['id'].tolist() == [4, 1]
+    assert search("ahmed", status='pending').empty
+    november = (date(2024, 11, 1).toordinal(), date(2024, 11, 30).toordinal())
+    assert set(search("annual", start_day=november[0], end_day=november[1])['id']) == {2, 5}
+
+
+def test_search_window_reads_month_buckets(db):
+    source, params = app._leave_search_source("", None, None, date(2024, 3, 1).toordinal(),
+                                              date(2024, 3, 31).toordinal())
+    
+    plan = query_plan(db, f"SELECT lr.id {source}", params)
+    assert "SEARCH leave_request_months USING PRIMARY KEY" in plan
+    assert "SCAN lr" not in plan
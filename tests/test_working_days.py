@@ -0,0 +1,15 @@
+import app
+
+
+def test_leave_past_the_precomputed_years_skips_holidays():
+    first_year, last_year = app.WORKING_DAY_YEARS
+    calendar = app.get_working_day_calendar(app.HOLIDAY_REGION, first_year, last_year)
+    wide = app.WorkingDayCalendar(first_year, last_year + 5, app.SAUDI_WEEKEND,
+                                  app.build_holiday_calendar(app.HOLIDAY_REGION, first_year, last_year + 5).dates())
+    
+    # Saudi National Day, and a range straddling the end of the precomputed years
+    ranges = [(f"{last_year + 1}-09-20", f"{last_year + 1}-09-30"), (f"{last_year}-12-20", f"{last_year + 1}-01-10")]
+    starts, ends = zip(*ranges)
+    assert calendar.count_many(starts, ends).tolist() == wide.count_many(starts, ends).tolist()
+    weekends_only = app.WorkingDayCalendar(first_year, last_year, app.SAUDI_WEEKEND)
+    assert calendar.count(*ranges[0]) < weekends_only.count(*ranges[0])